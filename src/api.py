@@ -1,10 +1,20 @@
+import time
+STARTED_AT = time.perf_counter()  # Before the framework imports, so startup timings include them
+
 from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
+from urllib.parse import urlencode
+import asyncio
+import base64
+import binascii
+import json
 import sys
 import os
+import traceback
 # --- FIX FOR OMP ERROR #15 ---
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 # -----------------------------
@@ -12,11 +22,14 @@ os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.config import config
-from src.data_loader import DataLoader
-from src.behavior_analyzer import BehaviorAnalyzer
-from src.content_engine import ContentEngine
-from src.sales_agent import SalesAgent
+from src.user_profile import UserProfileStore
+from src.response_cache import ResponseCache, make_key
+from src.cache import normalize_query
+from src.startup import StartupTracker
 from src import db
+from src import executors
+from src.executors import run_db, run_events, run_model
+# pandas, FAISS, groq and the engine modules are imported by warmup(), after the port is bound
 
 app = FastAPI(title="ProfitGenAI")
 
@@ -25,9 +38,13 @@ templates = Jinja2Templates(directory="src/templates")
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
 
 # --- Global State ---
+startup = StartupTracker(STARTED_AT)
+warmup_task = None
 behavior_analyzer = None
 content_engine = None
 sales_agent = None
+profile_store = None
+response_cache = None
 
 # --- Pydantic Models ---
 class RecommendationRequest(BaseModel):
@@ -38,11 +55,23 @@ class SearchRequest(BaseModel):
     user_email: Optional[str] = None
     query: str = ""
     user_persona: str = "Standard Shopper"
+    # Optional filters; every returned item satisfies all of them
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    category_ids: Optional[List[int]] = None
+    min_stars: Optional[float] = None
+    # Pagination: page_size results per call; pass back next_cursor for the following page
+    page_size: Optional[int] = None
+    cursor: Optional[str] = None
 
 class CartActionRequest(BaseModel):
     email: str
     asin: str
 
+class BulkCartActionRequest(BaseModel):
+    email: str
+    asins: List[str]
+
 class CheckoutRequest(BaseModel):
     email: str
 
@@ -58,62 +87,236 @@ class PersonaUpdateRequest(BaseModel):
     email: str
     persona: str
 
+class ClickEvent(BaseModel):
+    session_id: int
+    order: int
+    price: float
+    page_1_main_category: int = Field(ge=0, le=62)  # behavior_analyzer.MAX_CATEGORY_ID (int64 bitmask)
+
+class ClickEventsRequest(BaseModel):
+    events: List[ClickEvent]
+
 # --- Startup Event ---
 @app.on_event("startup")
-def startup_event():
-    global behavior_analyzer, content_engine, sales_agent
+async def startup_event():
+    """
+    Staged startup: only the database and caches are set up before the server
+    accepts traffic. The heavy stages run in warmup(); /healthz answers right
+    away and /readyz turns 200 once search is available.
+    """
+    global profile_store, response_cache, warmup_task
     
     print("--- Starting ProfitGenAI System ---")
     
     # 1. Initialize Database (Persistent)
     print("Initializing SQLite Database...")
-    db.init_db()
-    
-    # 2. Load Data Models
-    
-    # --- [OLD APPROACH] High Memory Usage (Commented Out) ---
-    # products_df = DataLoader.load_amazon_catalog() # <--- This caused the crash on Render
-    # clickstream_df = DataLoader.load_clickstream()
-    
-    # print("Initializing Behavior Analyzer...")
-    # behavior_analyzer = BehaviorAnalyzer(clickstream_df)
-    
-    # print("Initializing Content Engine...")
-    # content_engine = ContentEngine(products_df) # <--- Processed embeddings in RAM
-    
-    # --- [NEW APPROACH] Optimized for Render Free Tier ---
-    # We still load clickstream data as it is small and needed for rules
-    clickstream_df = DataLoader.load_clickstream()
-    
-    print("Initializing Behavior Analyzer...")
-    behavior_analyzer = BehaviorAnalyzer(clickstream_df)
-    
-    print("Initializing Content Engine (Loading Artifacts)...")
-    # Initialize without arguments. 
-    # This triggers the new _load_artifacts() method in ContentEngine 
-    # to read your 'startups_data.pkl' file instead of calculating in RAM.
-    content_engine = ContentEngine() 
-    
-    print("Initializing Sales Agent...")
-    sales_agent = SalesAgent(behavior_analyzer.get_rules())
-    
-    print("--- System Ready ---")
+    with startup.stage("database"):
+        db.init_db()
+    profile_store = UserProfileStore()
+    response_cache = ResponseCache()
+    
+    warmup_task = asyncio.get_running_loop().create_task(warmup())
+
+def _load_behavior_analyzer():
+    # Persona rules come from the cached artifact; the clickstream is only
+    # re-streamed when its hash changed
+    from src import persona_rules
+    return persona_rules.load_or_build()
+
+def _load_content_engine():
+    # Mmap's the artifact bundle (or reads the legacy startups_data.pkl)
+    from src.content_engine import ContentEngine
+    return ContentEngine()
+
+def _load_sales_agent(rules):
+    from src.sales_agent import SalesAgent
+    return SalesAgent(rules)
+
+async def warmup():
+    """Loads the heavy state off the event loop, then optionally preloads the model."""
+    global behavior_analyzer, content_engine, sales_agent
+    try:
+        # 2. Load Data Models
+        print("Initializing Behavior Analyzer...")
+        with startup.stage("persona_rules"):
+            behavior_analyzer = await run_model(_load_behavior_analyzer)
+        print(f"Persona Rules: {behavior_analyzer.get_rules()}")
+        
+        print("Initializing Content Engine (Loading Artifacts)...")
+        with startup.stage("content_engine"):
+            engine = await run_model(_load_content_engine)
+        
+        print("Initializing Sales Agent...")
+        with startup.stage("sales_agent"):
+            agent = await run_model(_load_sales_agent, behavior_analyzer.get_rules())
+        
+        # Endpoints check these two, so they go live together
+        content_engine, sales_agent = engine, agent
+        startup.mark_ready()
+        print(f"--- System Ready ({startup.ready_after}s) ---")
+        
+        # 3. Model preload: searches meanwhile are served by BM25 (see ContentEngine._lexical_fast_path)
+        if config.PRELOAD_MODEL:
+            with startup.stage("model_preload"):
+                await run_model(content_engine.warmup)
+            print(f"Embedding model preloaded ({startup.stages['model_preload']}s).")
+    except Exception as e:
+        # /readyz keeps answering 503 with the error; the traceback goes to the log
+        startup.fail(e)
+        print(f"Startup failed: {startup.error}")
+        traceback.print_exc()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if content_engine:
+        content_engine.save_query_cache()
+    if response_cache:
+        response_cache.close()
+    executors.shutdown()
+    db.get_pool().close_all()
 
 # --- Helper Functions ---
-def get_user_by_email(email: str) -> Optional[dict]:
-    """Wrapper to fetch user data safely."""
-    user = db.get_user_by_email(email)
+async def get_user_by_email(email: str) -> Optional[dict]:
+    """Wrapper to fetch user data safely (off the event loop)."""
+    user = await run_db(db.get_user_by_email, email)
     return user
 
+async def record_activity(user_id: int, asins: List[str], weight: float = 1.0):
+    """Updates the user's online profile with the given cart adds / purchases."""
+    products = content_engine.get_products(asins, columns=['price', 'category_id'])
+    items = [(p['price'], p.get('category_id')) for p in products if p is not None]
+    if items:
+        await run_db(profile_store.record, user_id, items, weight)
+
+async def get_profile(user_id: Optional[int]):
+    return await run_db(profile_store.get, user_id) if user_id is not None else None
+
+def response_cache_key(kind: str, *parts, profile=None) -> str:
+    """
+    Keys change whenever the result could: a new artifact build, new persona
+    rules (events pushed to /events) or a profile update of this user.
+    """
+    personal = (profile.user_id, profile.version) if profile is not None and profile.events else None
+    return make_key(kind, content_engine.manifest.get("build_id"), behavior_analyzer.events_seen, personal, *parts)
+
+CURSOR_NAMESPACE = "search"
+
+def search_query_key(query: str, persona: str, filters) -> str:
+    """Identifies the search a cursor belongs to: normalized query, persona and filters."""
+    return make_key(CURSOR_NAMESPACE, normalize_query(query), persona, filters)
+
+def encode_cursor(query_key: str, list_key: str, offset: int) -> str:
+    """Opaque page cursor: the search it belongs to, which cached ranked list, and where the next page starts."""
+    raw = json.dumps({"n": CURSOR_NAMESPACE, "q": query_key, "k": list_key, "o": offset},
+                     separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, query_key: str):
+    """(list_key, offset). 400 unless the cursor is well-formed and was issued for this search."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        namespace, cursor_query, list_key, offset = data["n"], data["q"], str(data["k"]), max(int(data["o"]), 0)
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if namespace != CURSOR_NAMESPACE or cursor_query != query_key:
+        raise HTTPException(status_code=400, detail="Cursor does not belong to this search")
+    return list_key, offset
+
+def is_ranked_list(value, query_key: str) -> bool:
+    """True for a cached /search ranked list of this search (a cursor's key could point anywhere)."""
+    return isinstance(value, dict) and isinstance(value.get("results"), list) and value.get("query_key") == query_key
+
+def search_page(query: str, ranked: dict, list_key: str, offset: int, page_size: int) -> dict:
+    results = ranked["results"]
+    end = offset + page_size
+    return {
+        "query": query,
+        "search_mode": ranked["search_mode"],
+        "filters": ranked["filters"],
+        "results": results[offset:end],
+        "total": len(results),
+        "next_cursor": encode_cursor(ranked["query_key"], list_key, end) if end < len(results) else None,
+    }
+
+@app.middleware("http")
+async def time_first_requests(request: Request, call_next):
+    """Records the latency of the first request to each heavy endpoint after boot."""
+    start = time.perf_counter()
+    response = await call_next(request)
+    startup.record_request(request.url.path, (time.perf_counter() - start) * 1000)
+    return response
+
+@app.exception_handler(db.PoolTimeout)
+async def pool_timeout(request: Request, exc: db.PoolTimeout):
+    """A saturated connection pool is a transient overload, not a server bug."""
+    print(f"DB pool exhausted on {request.url.path}: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Database busy, please retry"})
+
 # --- Endpoints ---
 @app.api_route("/", methods=["GET", "HEAD"])
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and the event loop answers."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once artifacts, persona rules and the sales agent are loaded, else 503."""
+    report = startup.report()
+    report["model_loaded"] = content_engine is not None and content_engine.model is not None
+    if not startup.ready:
+        return JSONResponse(status_code=503, content=report)
+    return report
+
+@app.get("/stats")
+async def get_stats():
+    """Cache hit/miss counters for monitoring."""
+    if not content_engine:
+        raise HTTPException(status_code=503, detail="System not ready yet")
+    return {
+        "query_cache": content_engine.query_cache.stats(),
+        "encode_batching": content_engine.batch_encoder.stats(),
+        "text_search": {
+            "mode": content_engine.search_mode,
+            "lexical_fallbacks": content_engine.lexical_fallbacks,
+            "pending": content_engine.pending_searches,
+        },
+        "response_cache": response_cache.stats(),
+        "pitch_cache": {**sales_agent.pitch_cache.stats(), "fallbacks": sales_agent.fallbacks},
+        "startup": startup.report(),
+    }
+
+def _apply_events(events: List[dict]) -> dict:
+    """Runs on the single events thread, so concurrent POSTs update and persist one at a time."""
+    from src import persona_rules
+    rules = behavior_analyzer.update(events)
+    persona_rules.save(behavior_analyzer)
+    return rules
+
+@app.post("/events")
+async def push_events(req: ClickEventsRequest):
+    """Folds new clickstream events into the persona rules without reloading the file."""
+    if not behavior_analyzer or not sales_agent:
+        raise HTTPException(status_code=503, detail="System not ready yet")
+
+    rules = await run_events(_apply_events, [event.model_dump() for event in req.events])
+    sales_agent.rules = rules
+    return {
+        "events_seen": behavior_analyzer.events_seen,
+        "sessions": behavior_analyzer.sessions,
+        "persona_rules": rules,
+    }
+
 @app.post("/signup")
 async def signup(req: AuthRequest):
     try:
-        user = db.create_user_secure(req.email, req.password, req.persona)
+        user = await run_db(db.create_user_secure, req.email, req.password, req.persona)
         return {"message": "User created successfully", "email": user["email"]}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -122,13 +325,13 @@ async def signup(req: AuthRequest):
 async def login_user(req: AuthRequest):
     """Logs in an existing user."""
     # Verify login (checks password hash internally)
-    user = db.verify_login(req.email, req.password)
+    user = await run_db(db.verify_login, req.email, req.password)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     # Return user data (cart, history, etc.)
-    full_user = get_user_by_email(req.email)
+    full_user = await get_user_by_email(req.email)
     return {
         "message": "Login successful",
         "email": full_user["email"],
@@ -139,26 +342,27 @@ async def login_user(req: AuthRequest):
 @app.post("/update_persona")
 async def update_persona(req: PersonaUpdateRequest):
     """Updates user persona and persists it."""
-    user = get_user_by_email(req.email)
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.update_user_persona(req.email, req.persona)
+    await run_db(db.update_user_persona, req.email, req.persona)
     return {"message": f"Persona updated to {req.persona}", "persona": req.persona}
 
 @app.post("/get_user_data")
 async def get_user_data(req: UserDataRequest):
     """Returns current user state (cart, history)."""
-    user = get_user_by_email(req.email)
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    profile = await get_profile(user["id"])
+    return {**user, "profile": profile.summary()}
 
 
 @app.post("/get_history")
 async def get_history(req: CheckoutRequest):
     """Returns the purchase history for a user, enriched with product details."""
-    user = get_user_by_email(req.email)
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -167,14 +371,14 @@ async def get_history(req: CheckoutRequest):
     # Enrich history with product titles for better frontend display
     enriched_history = []
     if content_engine:
-        for asin in history_asins:
-            # Use content_engine.df (loaded from pickle)
-            product_details = content_engine.df[content_engine.df['asin'] == asin]
-            if not product_details.empty:
+        # One batched gather instead of a catalog scan per ASIN
+        products = content_engine.get_products(history_asins, columns=['title', 'price'])
+        for asin, product in zip(history_asins, products):
+            if product is not None:
                 enriched_history.append({
                     "asin": asin,
-                    "title": product_details.iloc[0]['title'],
-                    "price": product_details.iloc[0]['price']
+                    "title": product['title'],
+                    "price": product['price']
                 })
             else:
                 # Handle case where a historical ASIN might not be in the current catalog
@@ -186,7 +390,7 @@ async def get_history(req: CheckoutRequest):
 @app.post("/get_cart")
 async def get_cart(req: UserDataRequest):
     """Returns the user's current cart, enriched with product details."""
-    user = get_user_by_email(req.email)
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -194,13 +398,13 @@ async def get_cart(req: UserDataRequest):
     
     enriched_cart = []
     if content_engine:
-        for asin in cart_asins:
-            product_details = content_engine.df[content_engine.df['asin'] == asin]
-            if not product_details.empty:
+        products = content_engine.get_products(cart_asins, columns=['title', 'price'])
+        for asin, product in zip(cart_asins, products):
+            if product is not None:
                 enriched_cart.append({
                     "asin": asin,
-                    "title": product_details.iloc[0]['title'],
-                    "price": product_details.iloc[0]['price']
+                    "title": product['title'],
+                    "price": product['price']
                 })
     
     return {"cart": enriched_cart}
@@ -209,105 +413,182 @@ async def get_cart(req: UserDataRequest):
 @app.post("/add_to_cart")
 async def add_to_cart(req: CartActionRequest):
     """Adds item to user's cart."""
-    user = get_user_by_email(req.email)
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Check if product exists in catalog
-    if content_engine.df[content_engine.df['asin'] == req.asin].empty:
+    if not content_engine.has_asin(req.asin):
         raise HTTPException(status_code=404, detail="Product ASIN not found")
     
     # Add to cart
-    db.add_to_cart(user["id"], req.asin)
+    await run_db(db.add_to_cart, user["id"], req.asin)
+    await record_activity(user["id"], [req.asin])
     
     # Return updated user data
-    updated_user = get_user_by_email(req.email)
+    updated_user = await get_user_by_email(req.email)
     return {"message": "Item added to cart", "cart": updated_user["cart"]}
 
 @app.post("/remove_from_cart")
 async def remove_from_cart(req: CartActionRequest):
     """Removes item from user's cart."""
-    user = get_user_by_email(req.email)
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.remove_from_cart(user["id"], req.asin)
+    await run_db(db.remove_from_cart, user["id"], req.asin)
     
-    updated_user = get_user_by_email(req.email)
+    updated_user = await get_user_by_email(req.email)
     return {"message": "Item removed from cart", "cart": updated_user["cart"]}
 
 @app.post("/checkout")
 async def checkout(req: CheckoutRequest):
     """Purchases all items in cart."""
-    user = get_user_by_email(req.email)
-    if not user:
+    user_id = await run_db(db.get_user_id, req.email)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not user["cart"]:
+    # Atomic INSERT ... SELECT + DELETE; an empty result means the cart was empty
+    purchased = await run_db(db.checkout, user_id)
+    if not purchased:
         raise HTTPException(status_code=400, detail="Cart is empty")
+    await record_activity(user_id, [row["asin"] for row in purchased], config.PROFILE_PURCHASE_WEIGHT)
     
-    items_count = db.checkout(user["id"])
-    
-    return {"message": "Purchase successful!", "total_items": items_count}
+    return {"message": "Purchase successful!", "total_items": len(purchased), "items": purchased}
 
 @app.post("/buy_item")
 async def buy_single_item(req: CartActionRequest):
     """Immediately purchases a single item (no cart)."""
-    user = get_user_by_email(req.email)
+    user = await get_user_by_email(req.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if content_engine.df[content_engine.df['asin'] == req.asin].empty:
+    if not content_engine.has_asin(req.asin):
         raise HTTPException(status_code=404, detail="Product ASIN not found")
-    conn = db.get_db_connection() # Manual connection for direct insert
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO purchase_history (user_id, asin) VALUES (?, ?)", (user["id"], req.asin))
-    conn.commit()
-    conn.close()
+    await run_db(db.buy_item, user["id"], req.asin)
+    await record_activity(user["id"], [req.asin], config.PROFILE_PURCHASE_WEIGHT)
     
     # Return updated history
-    updated_user = get_user_by_email(req.email)
+    updated_user = await get_user_by_email(req.email)
     return {"message": "Item purchased!", "history": updated_user["history"]}
 
+def _unknown_asins(asins: List[str]) -> List[str]:
+    return [asin for asin in asins if not content_engine.has_asin(asin)]
+
+@app.post("/add_to_cart_bulk")
+async def add_to_cart_bulk(req: BulkCartActionRequest):
+    """Adds several items to the cart in one round trip."""
+    user_id = await run_db(db.get_user_id, req.email)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    unknown = _unknown_asins(req.asins)
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Product ASIN not found: {', '.join(unknown)}")
+    
+    await run_db(db.add_to_cart_many, user_id, req.asins)
+    await record_activity(user_id, req.asins)
+    
+    updated_user = await get_user_by_email(req.email)
+    return {"message": f"{len(req.asins)} items added to cart", "cart": updated_user["cart"]}
+
+@app.post("/buy_items")
+async def buy_items(req: BulkCartActionRequest):
+    """Immediately purchases several items (no cart) in one round trip."""
+    user_id = await run_db(db.get_user_id, req.email)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    unknown = _unknown_asins(req.asins)
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Product ASIN not found: {', '.join(unknown)}")
+    
+    await run_db(db.buy_items, user_id, req.asins)
+    await record_activity(user_id, req.asins, config.PROFILE_PURCHASE_WEIGHT)
+    
+    updated_user = await get_user_by_email(req.email)
+    return {"message": f"{len(req.asins)} items purchased!", "history": updated_user["history"]}
+
 @app.post("/search")
 async def search_products(req: SearchRequest):
-    """Searches catalog and returns ALL results."""
+    """
+    Searches the catalog and returns one page of the ranked results. The full
+    ranked list is cached server-side, so next_cursor pages are O(page) slices.
+    """
     if not content_engine or not sales_agent:
         raise HTTPException(status_code=503, detail="System not ready yet")
     
     if not req.query:
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
-    # 1. Search by Text (Increased k for full results)
+    page_size = min(max(req.page_size or config.SEARCH_PAGE_SIZE, 1), config.SEARCH_MAX_PAGE_SIZE)
+    from src.content_engine import SearchFilters
+    filters = SearchFilters(
+        min_price=req.min_price,
+        max_price=req.max_price,
+        category_ids=tuple(sorted(set(req.category_ids))) if req.category_ids else None,
+        min_stars=req.min_stars,
+    )
+    query_key = search_query_key(req.query, req.user_persona, filters)
+
+    offset = 0
+    if req.cursor:
+        list_key, offset = decode_cursor(req.cursor, query_key)
+        ranked = await response_cache.get(list_key)
+        if ranked is not None:
+            if not is_ranked_list(ranked, query_key):
+                raise HTTPException(status_code=400, detail="Cursor does not belong to this search")
+            return search_page(req.query, ranked, list_key, offset, page_size)
+        # The ranked list expired: rank again below and serve the same offset from it
+
+    user_id = await run_db(db.get_user_id, req.user_email) if req.user_email else None
+    profile = await get_profile(user_id)
+
+    cache_key = response_cache_key("search", normalize_query(req.query), req.user_persona, filters, profile=profile)
+    ranked = await response_cache.get(cache_key)
+    if is_ranked_list(ranked, query_key):
+        return search_page(req.query, ranked, cache_key, offset, page_size)
+
+    # 1. Search by Text (SEARCH_K candidates: every page of this query session)
     # Optimized ContentEngine handles the query encoding internally
-    raw_results = content_engine.search_by_text(req.query, k=50)
+    raw_results = await content_engine.search_by_text_async(req.query, k=config.SEARCH_K, filters=filters)
+    search_mode = raw_results.attrs.get("search_mode", content_engine.search_mode)
     
     if raw_results.empty:
-        return {"results": []}
-
-    # 2. Rerank - NO LIMIT (Show all)
+        return {"query": req.query, "search_mode": search_mode, "results": [], "total": 0, "next_cursor": None}
+
+    # 2. Rerank drops candidates above max(upsell cap, persona / personal cap). When some would be
+    # dropped, search again with that same cap as a pre-filter, so the list is full of items it keeps
+    current_price = raw_results['price'].mean()
+    price_cap = sales_agent.effective_price_cap(current_price, req.user_persona, profile)
+    if (raw_results['price'] > price_cap).any():
+        capped = filters._replace(max_price=price_cap if filters.max_price is None else min(filters.max_price, price_cap))
+        raw_results = await content_engine.search_by_text_async(req.query, k=config.SEARCH_K, filters=capped)
+        search_mode = raw_results.attrs.get("search_mode", search_mode)
+
+    # 3. Rerank - NO LIMIT (the whole list is paged), personalized when the user is known
     ranked_items = sales_agent.rerank(
         candidates=raw_results,
-        current_price=raw_results['price'].mean(), 
+        current_price=current_price,
         persona=req.user_persona,
-        limit=None 
+        limit=None,
+        profile=profile
     )
 
-    # 3. Format Response
-    recommendations = [
-        {
-            "asin": row["asin"],
-            "title": row["title"],
-            "price": row["price"],
-            "final_score": row["final_score"]
-        }
-        for _, row in ranked_items.iterrows()
-    ]
-    
-    return {
-        "query": req.query,
-        "results": recommendations
+    # 4. Cache the ranked list for the following pages
+    ranked = {
+        "query_key": query_key,
+        "search_mode": search_mode,
+        "filters": filters._asdict(),
+        "results": ranked_items[["asin", "title", "price", "final_score"]].to_dict("records"),
     }
+    list_key = cache_key
+    if search_mode == "lexical" and config.SEARCH_MODE != "lexical":
+        # Lexical-only answers (model loading / saturated) must not be served as the first
+        # page of later searches, but their cursors still need the list
+        list_key = make_key(cache_key, "lexical")
+    await response_cache.set(list_key, ranked)
+    return search_page(req.query, ranked, list_key, offset, page_size)
 
 @app.post("/recommend")
 async def get_recommendation(req: RecommendationRequest):
@@ -317,7 +598,7 @@ async def get_recommendation(req: RecommendationRequest):
 
     # Identify user ID
     email = req.user_email if req.user_email else None
-    user = get_user_by_email(email) if email else None
+    user = await get_user_by_email(email) if email else None
     
     # CONTEXT SELECTION LOGIC
     context_asin = req.asin
@@ -331,33 +612,34 @@ async def get_recommendation(req: RecommendationRequest):
         context_asin = user["history"][-1]
     
     # Fetch Context Product
-    # Using the pre-loaded dataframe in ContentEngine
-    context_row = content_engine.df[content_engine.df['asin'] == context_asin]
-    if context_row.empty:
+    # O(1) lookup through the ContentEngine ASIN index
+    context_item = content_engine.get_product(context_asin)
+    if context_item is None:
         raise HTTPException(status_code=404, detail="Product ASIN not found")
     
-    context_item = context_row.iloc[0].to_dict()
     context_price = context_item['price']
+    persona = user["persona"] if user else "Standard Shopper"
+    profile = await get_profile(user["id"]) if user else None
+
+    # Hot products are served straight from the response cache
+    cache_key = response_cache_key("recommend", context_asin, persona, profile=profile)
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return with_pitch(cached, persona)
     
     # Get Similar Items
-    similar_items = content_engine.search_by_asin(context_asin, k=20)
+    similar_items = await run_model(content_engine.search_by_asin, context_asin, k=20)
     
     # Rerank - LIMIT to 3 (Upsell)
     ranked_items = sales_agent.rerank(
         candidates=similar_items,
         current_price=context_price,
-        persona=user["persona"] if user else "Standard Shopper",
-        limit=3
-    )
-    
-    # Generate Pitch
-    pitch = sales_agent.generate_pitch(
-        context=context_item,
-        recs=ranked_items,
-        persona=user["persona"] if user else "Standard Shopper"
+        persona=persona,
+        limit=3,
+        profile=profile
     )
     
-    # Format Response
+    # Format Response (the pitch is fetched separately, see /pitch/stream)
     recommendations = [
         {
             "asin": row["asin"],
@@ -368,12 +650,57 @@ async def get_recommendation(req: RecommendationRequest):
         for _, row in ranked_items.iterrows()
     ]
 
-    return {
+    response = {
         "context_product": {
             "asin": context_item['asin'],
             "title": context_item['title'],
             "price": context_item['price']
         },
-        "sales_pitch": pitch,
-        "recommendations": recommendations
-    }
\ No newline at end of file
+        "recommendations": recommendations,
+    }
+    if sales_agent.client:
+        # LLM pitches are generated off the request path; without a client the template pitch is inline
+        response["pitch_url"] = "/pitch/stream?" + urlencode({
+            "context_asin": context_item['asin'],
+            "asins": ",".join(r["asin"] for r in recommendations),
+            "persona": persona,
+        })
+    await response_cache.set(cache_key, response)
+    return with_pitch(response, persona)
+
+def with_pitch(response: dict, persona: str) -> dict:
+    """Adds the pitch if it is ready (template or cached); otherwise the client streams it from pitch_url."""
+    pitch = sales_agent.inline_pitch(response["context_product"], response["recommendations"], persona)
+    return {**response, "sales_pitch": pitch}
+
+def _pitch_inputs(context_asin: str, asins: str):
+    context_item = content_engine.get_product(context_asin)
+    if context_item is None:
+        raise HTTPException(status_code=404, detail="Product ASIN not found")
+    rec_asins = [a for a in asins.split(",") if a]
+    products = content_engine.get_products(rec_asins, columns=['asin', 'title', 'price'])
+    import pandas as pd
+    recs = pd.DataFrame([p for p in products if p is not None], columns=['asin', 'title', 'price'])
+    return context_item, recs
+
+@app.get("/pitch")
+async def get_pitch(context_asin: str, asins: str = "", persona: str = "Standard Shopper"):
+    """Sales pitch for a /recommend result, within the PITCH_TIMEOUT_SECONDS budget."""
+    if not content_engine or not sales_agent:
+        raise HTTPException(status_code=503, detail="System not ready yet")
+    context_item, recs = _pitch_inputs(context_asin, asins)
+    return {"sales_pitch": await sales_agent.generate_pitch(context_item, recs, persona)}
+
+@app.get("/pitch/stream")
+async def stream_pitch(context_asin: str, asins: str = "", persona: str = "Standard Shopper"):
+    """Streams the sales pitch as Server-Sent Events ({"text": ...} chunks, then a 'done' event)."""
+    if not content_engine or not sales_agent:
+        raise HTTPException(status_code=503, detail="System not ready yet")
+    context_item, recs = _pitch_inputs(context_asin, asins)
+
+    async def events():
+        async for text in sales_agent.stream_pitch(context_item, recs, persona):
+            yield f"data: {json.dumps({'text': text})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
\ No newline at end of file
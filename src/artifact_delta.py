@@ -0,0 +1,210 @@
+"""
+Delta rebuilds for the artifact bundle. Every product carries a content hash
+of its search_text and a stable vector_id; a rebuild only encodes rows whose
+hash is new or changed, and patches the FAISS index in place with
+remove_ids / add_with_ids.
+"""
+import hashlib
+import os
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import faiss
+
+from src.config import config
+from src import artifacts
+from src import vector_index
+from src.lexical_index import LexicalIndex
+
+
+def content_hashes(texts: pd.Series) -> np.ndarray:
+    """64-bit BLAKE2b digest of each text, as int64."""
+    digests = b"".join(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest() for t in texts)
+    return np.frombuffer(digests, dtype="<i8").copy()
+
+
+def load_previous(index_type: str) -> Optional[Dict]:
+    """Loads the current bundle if it can seed a delta build, else None (full rebuild)."""
+    bundle_dir = artifacts.resolve_bundle_dir()
+    if not bundle_dir:
+        return None
+
+    manifest = artifacts.read_manifest(bundle_dir)
+    df = artifacts.load_catalog(bundle_dir)
+
+    if manifest.get("embedding_model") != config.EMBEDDING_MODEL:
+        print("   Previous bundle used a different embedding model; doing a full rebuild.")
+        return None
+    if df.empty or not {"content_hash", "vector_id"} <= set(df.columns):
+        print("   Previous bundle has no content hashes; doing a full rebuild.")
+        return None
+
+    # Read the index fully into memory: mmap'd indexes are read-only
+    index = faiss.read_index(os.path.join(bundle_dir, artifacts.INDEX_FILE))
+    same_layout = (manifest.get("index_type", "flat") == index_type
+                   and manifest.get("vector_dtype", "float32") == config.VECTOR_DTYPE)
+    return {
+        "manifest": manifest,
+        "df": df[["asin", "content_hash", "vector_id"]],
+        "embeddings": np.asarray(artifacts.load_embeddings(bundle_dir)),
+        "index": index if same_layout else None,
+        "neighbours": artifacts.load_neighbours(bundle_dir),
+        "lexical": artifacts.load_lexical(bundle_dir),
+    }
+
+
+def apply_delta(previous: Dict, df: pd.DataFrame, encode: Callable, index_type: str):
+    """
+    Reuses embeddings of unchanged rows, encodes new/changed rows only and
+    patches the index. Sets df['vector_id'] and returns (embeddings, index, stats).
+    """
+    prev_df = previous["df"]
+    prev_hashes = prev_df["content_hash"].to_numpy(dtype=np.int64)
+    prev_ids = prev_df["vector_id"].to_numpy(dtype=np.int64)
+    prev_pos = pd.Series(np.arange(len(prev_df)), index=prev_df["asin"])
+    prev_pos = prev_pos[~prev_pos.index.duplicated()]
+
+    # Match rows by ASIN (a duplicated ASIN only inherits the old row once)
+    matched = prev_pos.reindex(df["asin"]).to_numpy()
+    known = ~np.isnan(matched) & ~df["asin"].duplicated().to_numpy()
+    matched = np.where(known, matched, 0).astype(np.int64)
+
+    hashes = df["content_hash"].to_numpy(dtype=np.int64)
+    unchanged = known & (prev_hashes[matched] == hashes)
+    changed = known & ~unchanged
+    new = ~known
+
+    # Stable ids: keep existing ones, allocate fresh ids after the previous max
+    vector_ids = np.where(known, prev_ids[matched], -1)
+    next_id = int(prev_ids.max()) + 1 if len(prev_ids) else 0
+    vector_ids[new] = np.arange(next_id, next_id + new.sum())
+    df["vector_id"] = vector_ids
+
+    # Embeddings: gather unchanged rows from the previous bundle, encode the rest
+    embeddings = np.empty((len(df), previous["embeddings"].shape[1]), dtype=np.float32)
+    embeddings[unchanged] = previous["embeddings"][matched[unchanged]]
+
+    encode_rows = np.flatnonzero(changed | new)
+    if len(encode_rows):
+        embeddings[encode_rows] = encode(df["search_text"].iloc[encode_rows].tolist())
+
+    deleted_ids = np.setdiff1d(prev_ids, vector_ids)
+    stale_ids = np.concatenate([deleted_ids, vector_ids[changed]])
+
+    stats = {
+        "unchanged": int(unchanged.sum()),
+        "changed": int(changed.sum()),
+        "new": int(new.sum()),
+        "deleted": int(len(deleted_ids)),
+    }
+
+    # Patch the index in place when it supports it
+    index = previous["index"]
+    try:
+        if index is None or not vector_index.supports_remove(index):
+            # Older bundles wrapped IVF in IDMap2, where remove_ids silently mislabels vectors
+            raise RuntimeError("previous index has a different type or cannot remove ids safely")
+        if len(stale_ids):
+            index.remove_ids(stale_ids)
+        if len(encode_rows):
+            index.add_with_ids(embeddings[encode_rows], vector_ids[encode_rows])
+        vector_index.apply_search_params(index)
+        stats["index"] = "patched"
+    except RuntimeError as e:
+        # e.g. HNSW has no remove_ids: rebuild the index, still without re-encoding
+        print(f"   In-place index update not possible ({e}); rebuilding index from embeddings.")
+        index = vector_index.build_index(embeddings, index_type, ids=vector_ids)
+        stats["index"] = "rebuilt"
+
+    return embeddings, index, stats
+
+
+def row_mapping(previous: Dict, df: pd.DataFrame):
+    """
+    (prev_to_new, fresh): the new row of every previous row whose vector is reused
+    as-is (-1 for deleted / changed rows), and a mask of the new rows that were encoded.
+    Call after apply_delta has set df['vector_id'].
+    """
+    prev_ids = previous["df"]["vector_id"].to_numpy(dtype=np.int64)
+    prev_hashes = previous["df"]["content_hash"].to_numpy(dtype=np.int64)
+    lookup = vector_index.positions_lookup(df["vector_id"].to_numpy())
+    prev_to_new = lookup[np.minimum(prev_ids, len(lookup) - 1)]  # Last slot is always -1
+    same = prev_to_new >= 0
+    same[same] = df["content_hash"].to_numpy(dtype=np.int64)[prev_to_new[same]] == prev_hashes[same]
+    prev_to_new = np.where(same, prev_to_new, -1)
+
+    fresh = np.ones(len(df), dtype=bool)
+    fresh[prev_to_new[same]] = False
+    return prev_to_new, fresh
+
+
+def patch_neighbours(previous: Dict, df: pd.DataFrame, index, embeddings: np.ndarray, stats: Dict):
+    """
+    Neighbour table for the new catalog, re-searching only rows whose neighbourhood can
+    have changed: encoded rows, and rows whose stored list held a deleted / changed
+    row. Every other row keeps its list, merged with its top-k among the encoded rows.
+    """
+    k = config.NEIGHBOUR_K
+    row_ids = df["vector_id"].to_numpy()
+    if previous["neighbours"] is None or previous["neighbours"][0].shape[1] != k:
+        stats["neighbours"] = "rebuilt"
+        return vector_index.compute_neighbours(index, embeddings, k, config.NEIGHBOUR_BATCH_SIZE, row_ids=row_ids)
+
+    prev_to_new, fresh = row_mapping(previous, df)
+    prev_ids = np.asarray(previous["neighbours"][0], dtype=np.int64)
+    prev_scores = np.asarray(previous["neighbours"][1])
+
+    # 1. Stored lists in new row positions; a slot pointing at a dropped row makes the list stale
+    moved = np.where(prev_ids >= 0, prev_to_new[np.maximum(prev_ids, 0)], -1)
+    stale = ((prev_ids >= 0) & (moved < 0)).any(axis=1)
+
+    ids = np.full((len(df), k), -1, dtype=np.int32)
+    scores = np.zeros((len(df), k), dtype=np.float16)
+    kept = np.flatnonzero((prev_to_new >= 0) & ~stale)
+    ids[prev_to_new[kept]] = moved[kept]
+    scores[prev_to_new[kept]] = prev_scores[kept]
+
+    # 2. Full search for encoded rows and stale lists
+    research = np.flatnonzero(fresh)
+    stale_rows = prev_to_new[(prev_to_new >= 0) & stale]
+    research = np.union1d(research, stale_rows)
+    if len(research):
+        ids[research], scores[research] = vector_index.compute_neighbours(
+            index, embeddings, k, config.NEIGHBOUR_BATCH_SIZE, row_ids=row_ids, rows=research
+        )
+
+    # 3. Kept lists: merge in closer encoded rows (exact scores against only those rows)
+    encoded = np.flatnonzero(fresh)
+    targets = prev_to_new[kept]
+    if len(encoded) and len(targets):
+        fresh_index = faiss.IndexFlatIP(embeddings.shape[1])
+        fresh_index.add(np.ascontiguousarray(embeddings[encoded], dtype=np.float32))
+        top = min(k, len(encoded))
+        for start in range(0, len(targets), config.NEIGHBOUR_BATCH_SIZE):
+            rows = targets[start:start + config.NEIGHBOUR_BATCH_SIZE]
+            new_scores, new_ids = fresh_index.search(np.ascontiguousarray(embeddings[rows], dtype=np.float32), top)
+            cand_ids = np.concatenate([ids[rows], encoded[new_ids].astype(np.int32)], axis=1)
+            cand_scores = np.concatenate([scores[rows].astype(np.float32), new_scores], axis=1)
+            cand_scores[cand_ids < 0] = -np.inf
+            order = np.argsort(-cand_scores, axis=1, kind="stable")[:, :k]
+            ids[rows] = np.take_along_axis(cand_ids, order, axis=1)
+            scores[rows] = np.take_along_axis(cand_scores, order, axis=1)
+    scores[ids < 0] = 0
+
+    stats["neighbours"] = {"searched": int(len(research)), "merged": int(len(targets))}
+    return ids, scores
+
+
+def patch_lexical(previous: Dict, df: pd.DataFrame, stats: Dict) -> LexicalIndex:
+    """BM25 postings for the new catalog, tokenizing only the encoded rows when the previous postings allow it."""
+    lexical = previous["lexical"]
+    if lexical is None or lexical.tf is None:
+        stats["lexical"] = "rebuilt"
+        return LexicalIndex.build(df["search_text"].tolist())
+
+    prev_to_new, fresh = row_mapping(previous, df)
+    fresh_rows = np.flatnonzero(fresh)
+    stats["lexical"] = {"tokenized": int(len(fresh_rows))}
+    return lexical.patch(prev_to_new, fresh_rows, df["search_text"].iloc[fresh_rows].tolist(), len(df))
+
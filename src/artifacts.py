@@ -0,0 +1,149 @@
+import json
+import os
+import shutil
+import uuid
+import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from src.config import config
+
+# Bump when the bundle layout changes in a way older loaders cannot read
+BUNDLE_VERSION = 1
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+INDEX_FILE = "index.faiss"
+CATALOG_FILE = "catalog.parquet"
+NEIGHBOUR_IDS_FILE = "neighbour_ids.npy"
+NEIGHBOUR_SCORES_FILE = "neighbour_scores.npy"
+LEXICAL_FILE = "lexical.npz"
+
+
+def resolve_bundle_dir() -> Optional[str]:
+    """Finds the artifact bundle (cwd first, then repo root). Returns None if absent."""
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    candidates = [config.ARTIFACTS_DIR, os.path.join(repo_root, config.ARTIFACTS_DIR)]
+
+    for path in candidates:
+        if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+            return path
+    return None
+
+
+def read_manifest(bundle_dir: str) -> Dict:
+    with open(os.path.join(bundle_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+
+    if manifest.get("bundle_version") != BUNDLE_VERSION:
+        raise ValueError(
+            f"Unsupported artifact bundle version {manifest.get('bundle_version')} "
+            f"(expected {BUNDLE_VERSION}). Re-run generate_artifacts.py."
+        )
+    return manifest
+
+
+def write_bundle(bundle_dir: str, df: pd.DataFrame, embeddings: np.ndarray, index,
+                 neighbours: Optional[Tuple[np.ndarray, np.ndarray]] = None, lexical=None,
+                 extra: Optional[Dict] = None) -> Dict:
+    """
+    Writes catalog, embeddings and FAISS index as a versioned bundle.
+    Files go to a staging directory first and are swapped in at the end,
+    so a crashed build never leaves a half-written bundle behind.
+    """
+    import faiss
+
+    staging_dir = bundle_dir.rstrip("/") + ".tmp"
+    if os.path.exists(staging_dir):
+        shutil.rmtree(staging_dir)
+    os.makedirs(staging_dir)
+
+    # 1. Columnar catalog
+    df.reset_index(drop=True).to_parquet(os.path.join(staging_dir, CATALOG_FILE), index=False)
+
+    # 2. Raw float32 embeddings (memory-mappable)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    np.save(os.path.join(staging_dir, EMBEDDINGS_FILE), embeddings)
+
+    # 3. Serialized FAISS index
+    faiss.write_index(index, os.path.join(staging_dir, INDEX_FILE))
+
+    # 4. Precomputed item-to-item neighbour table (int32 ids, float16 scores)
+    if neighbours is not None:
+        neighbour_ids, neighbour_scores = neighbours
+        np.save(os.path.join(staging_dir, NEIGHBOUR_IDS_FILE), neighbour_ids.astype(np.int32))
+        np.save(os.path.join(staging_dir, NEIGHBOUR_SCORES_FILE), neighbour_scores.astype(np.float16))
+
+    # 5. BM25 postings (lexical_index.LexicalIndex)
+    if lexical is not None:
+        lexical.save(os.path.join(staging_dir, LEXICAL_FILE))
+
+    manifest = {
+        "bundle_version": BUNDLE_VERSION,
+        "build_id": uuid.uuid4().hex[:12],
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "embedding_model": config.EMBEDDING_MODEL,
+        "num_products": int(len(df)),
+        "dim": int(embeddings.shape[1]),
+        "normalized": True,
+        "neighbour_k": int(neighbours[0].shape[1]) if neighbours is not None else 0,
+        "lexical": lexical is not None,
+    }
+    manifest.update(extra or {})
+
+    with open(os.path.join(staging_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the new bundle in
+    old_dir = bundle_dir.rstrip("/") + ".old"
+    if os.path.exists(bundle_dir):
+        os.rename(bundle_dir, old_dir)
+    os.rename(staging_dir, bundle_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+    return manifest
+
+
+def load_embeddings(bundle_dir: str) -> np.ndarray:
+    """Opens the embedding matrix read-only via mmap (pages are loaded on demand)."""
+    return np.load(os.path.join(bundle_dir, EMBEDDINGS_FILE), mmap_mode="r")
+
+
+def load_index(bundle_dir: str):
+    """Reads the FAISS index, memory-mapping its codes when the FAISS build supports it."""
+    import faiss
+
+    path = os.path.join(bundle_dir, INDEX_FILE)
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    try:
+        return faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError as e:
+        print(f"mmap index load failed ({e}), reading into memory instead.")
+        return faiss.read_index(path)
+
+
+def load_neighbours(bundle_dir: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """mmap's the neighbour table, or returns None for bundles built without one."""
+    ids_path = os.path.join(bundle_dir, NEIGHBOUR_IDS_FILE)
+    if not os.path.exists(ids_path):
+        return None
+    return (
+        np.load(ids_path, mmap_mode="r"),
+        np.load(os.path.join(bundle_dir, NEIGHBOUR_SCORES_FILE), mmap_mode="r"),
+    )
+
+
+def load_lexical(bundle_dir: str):
+    """Loads the BM25 postings, or returns None for bundles built without them."""
+    from src.lexical_index import LexicalIndex
+
+    path = os.path.join(bundle_dir, LEXICAL_FILE)
+    if not os.path.exists(path):
+        return None
+    return LexicalIndex.load(path)
+
+
+def load_catalog(bundle_dir: str) -> pd.DataFrame:
+    return pd.read_parquet(os.path.join(bundle_dir, CATALOG_FILE))
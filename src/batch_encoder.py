@@ -0,0 +1,83 @@
+import asyncio
+from typing import List, Tuple
+
+import numpy as np
+
+
+class BatchEncoder:
+    """
+    Micro-batches concurrent text searches. Requests arriving within a short
+    window (max_wait_ms, or until max_batch_size is reached) share one
+    SentenceTransformer forward pass and one batched index.search (one per
+    distinct filter set); results are then fanned back out to each waiting request.
+    """
+
+    def __init__(self, engine, max_batch_size: int = 32, max_wait_ms: float = 5.0, executor=None):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+        self.queries = 0
+
+    def _ensure_worker(self):
+        # Bound lazily to the running loop (the engine is built before uvicorn starts it)
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def search(self, query: str, k: int, filters=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns (distances, positions) for a single query, shape (k,)."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, k, filters, future))
+        return await future
+
+    async def _collect(self) -> List:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            queries = [query for query, _, _, _ in batch]
+            filters = [f for _, _, f, _ in batch]
+            max_k = max(k for _, k, _, _ in batch)
+
+            try:
+                distances, positions = await loop.run_in_executor(
+                    self.executor, self.engine.search_vectors_for_texts, queries, max_k, filters
+                )
+            except Exception as e:
+                for _, _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.queries += len(batch)
+            for row, (_, k, _, future) in enumerate(batch):
+                if not future.done():  # Caller may have been cancelled
+                    future.set_result((distances[row, :k], positions[row, :k]))
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+        }
@@ -1,39 +1,223 @@
+import os
 import pandas as pd
 import numpy as np
+from src.config import config
+
+# Categories are bits of an int64 mask per session, so ids must fit in bits 0..62
+MAX_CATEGORY_ID = 62
+
+
+class PriceHistogram:
+    """
+    Fixed-bin histogram of session average prices, with per-bin sums.
+    Unlike t-digest / P² it supports removing values, which the analyzer
+    needs because a session's average moves as its events arrive.
+    Quantiles are exact to within one bin width.
+    """
+
+    def __init__(self, lo: float, hi: float, bins: int):
+        self.edges = np.linspace(lo, hi, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.sums = np.zeros(bins, dtype=np.float64)
+
+    def _bins(self, values: np.ndarray) -> np.ndarray:
+        idx = np.searchsorted(self.edges, values, side="right") - 1
+        return np.clip(idx, 0, len(self.counts) - 1)
+
+    def add(self, values: np.ndarray, sign: int = 1):
+        idx = self._bins(values)
+        n = len(self.counts)
+        self.counts += sign * np.bincount(idx, minlength=n)
+        self.sums += sign * np.bincount(idx, weights=values, minlength=n)
+
+    def remove(self, values: np.ndarray):
+        self.add(values, sign=-1)
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def quantile(self, q: float) -> float:
+        """Linear interpolation inside the bin holding the q-th value."""
+        cumulative = np.cumsum(self.counts)
+        target = q * cumulative[-1]
+        b = int(np.searchsorted(cumulative, target, side="left"))
+        before = cumulative[b - 1] if b else 0
+        fraction = (target - before) / self.counts[b] if self.counts[b] else 0.0
+        return float(self.edges[b] + fraction * (self.edges[b + 1] - self.edges[b]))
+
+    def summarize(self, lo: float, hi: float) -> dict:
+        """Count, mean and max of the values in [lo, hi], splitting boundary bins proportionally."""
+        left, right = self.edges[:-1], self.edges[1:]
+        overlap = np.clip(np.minimum(right, hi) - np.maximum(left, lo), 0, None)
+        share = overlap / (right - left)
+
+        count = (self.counts * share).sum()
+        if count <= 0:
+            return {"count": 0, "mean": float("nan"), "max": float("nan")}
+        top = np.flatnonzero((self.counts > 0) & (share > 0))[-1]
+        return {
+            "count": int(round(count)),
+            "mean": float((self.sums * share).sum() / count),
+            # The top bin's mean is within one bin width of the true max (exact for repeated values)
+            "max": float(min(self.sums[top] / self.counts[top], hi)),
+        }
+
 
 class BehaviorAnalyzer:
-    def __init__(self, clickstream_df: pd.DataFrame):
-        self.df = clickstream_df
-        self.persona_rules = self._analyze()
-
-    def _analyze(self):
-        # Aggregate by session
-        session_stats = self.df.groupby('session_id').agg(
-            session_length=('order', 'max'),
-            avg_price=('price', 'mean'),
-            distinct_cats=('page_1_main_category', 'nunique')
-        ).reset_index()
-        
+    """
+    Streaming persona rules over the clickstream. update(events) folds new
+    events into per-session running aggregates (max order, price sum/count,
+    category bitmask) and the price histogram, then refreshes the rules.
+    """
+
+    def __init__(self, clickstream_df: pd.DataFrame = None):
+        self._slots = {}  # session_id -> row in the aggregate arrays
+        self.max_order = np.zeros(0, dtype=np.int32)
+        self.price_sum = np.zeros(0, dtype=np.float64)
+        self.event_count = np.zeros(0, dtype=np.int64)
+        self.category_mask = np.zeros(0, dtype=np.int64)
+        self.histogram = PriceHistogram(0.0, config.BEHAVIOR_PRICE_MAX, config.BEHAVIOR_PRICE_BINS)
+        self.events_seen = 0
+        self.persona_rules = {}
+        if clickstream_df is not None:
+            self.update(clickstream_df)
+
+    def _slots_for(self, session_ids: np.ndarray) -> np.ndarray:
+        slots = np.fromiter(
+            (self._slots.setdefault(s, len(self._slots)) for s in session_ids.tolist()),
+            dtype=np.int64, count=len(session_ids)
+        )
+        size = len(self._slots)
+        if size > len(self.max_order):
+            # Grow geometrically so streaming many small batches stays amortized O(1)
+            capacity = max(size, 2 * len(self.max_order), 1024)
+            for name in ("max_order", "price_sum", "event_count", "category_mask"):
+                old = getattr(self, name)
+                grown = np.zeros(capacity, dtype=old.dtype)
+                grown[:len(old)] = old
+                setattr(self, name, grown)
+        return slots
+
+    def update(self, events) -> dict:
+        """Folds a batch of clickstream events (DataFrame or list of dicts) into the rules."""
+        events = events if isinstance(events, pd.DataFrame) else pd.DataFrame(list(events))
+        if events.empty:
+            return self.persona_rules
+
+        categories = events['page_1_main_category'].to_numpy(dtype=np.int64)
+        if ((categories < 0) | (categories > MAX_CATEGORY_ID)).any():
+            raise ValueError(f"page_1_main_category must be between 0 and {MAX_CATEGORY_ID}")
+
+        # 1. Per-session partial aggregates for this batch
+        events = events.assign(category_bit=np.left_shift(1, categories))
+        batch = events.groupby('session_id').agg(
+            max_order=('order', 'max'),
+            price_sum=('price', 'sum'),
+            event_count=('price', 'size'),
+        )
+        # OR of the distinct category bits == sum of the distinct bits
+        masks = (
+            events[['session_id', 'category_bit']]
+            .drop_duplicates()
+            .groupby('session_id')['category_bit'].sum()
+        )
+        slots = self._slots_for(batch.index.to_numpy())
+
+        # 2. Retract the old averages of sessions we have seen before
+        seen = self.event_count[slots] > 0
+        if seen.any():
+            old = slots[seen]
+            self.histogram.remove(self.price_sum[old] / self.event_count[old])
+
+        # 3. Merge running aggregates
+        self.max_order[slots] = np.maximum(self.max_order[slots], batch['max_order'].to_numpy())
+        self.price_sum[slots] += batch['price_sum'].to_numpy()
+        self.event_count[slots] += batch['event_count'].to_numpy()
+        self.category_mask[slots] |= masks.reindex(batch.index).to_numpy(dtype=np.int64)
+
+        # 4. Add the new averages and refresh the rules
+        self.histogram.add(self.price_sum[slots] / self.event_count[slots])
+        self.events_seen += len(events)
+        self.persona_rules = self._rules()
+        return self.persona_rules
+
+    def _rules(self):
+        if self.histogram.total == 0:
+            return {}
+
         # Define Personas based on Price Quantiles
-        q33 = session_stats['avg_price'].quantile(0.33)
-        q66 = session_stats['avg_price'].quantile(0.66)
-        
-        def get_persona(avg):
-            if avg <= q33: return "Budget Conscious"
-            if avg >= q66: return "Premium Shopper"
-            return "Standard Shopper"
-        
-        session_stats['persona'] = session_stats['avg_price'].apply(get_persona)
-        
+        q33 = self.histogram.quantile(0.33)
+        q66 = self.histogram.quantile(0.66)
+        bounds = {
+            "Budget Conscious": (0.0, q33),
+            "Standard Shopper": (q33, q66),
+            "Premium Shopper": (q66, self.histogram.edges[-1]),
+        }
+
         # Calculate rules (max recommended price per persona)
-        rules = session_stats.groupby('persona')['avg_price'].agg(['mean', 'max']).to_dict('index')
-        
+        rules = {}
+        for persona, (lo, hi) in bounds.items():
+            summary = self.histogram.summarize(lo, hi)
+            if summary["count"]:
+                rules[persona] = {"mean": summary["mean"], "max": summary["max"]}
+
         # Add a buffer to max price (upsell potential)
         for p in rules:
             rules[p]['max_suggested_price'] = rules[p]['max'] * 1.2
-            
-        print(f"Persona Rules Generated: {rules}")
+
         return rules
 
+    @property
+    def sessions(self) -> int:
+        return len(self._slots)
+
+    def session_stats(self) -> pd.DataFrame:
+        """Running per-session aggregates (same columns as the old batch groupby)."""
+        n = len(self._slots)
+        counts = self.event_count[:n]
+        return pd.DataFrame({
+            'session_id': list(self._slots),
+            'session_length': self.max_order[:n],
+            'avg_price': self.price_sum[:n] / np.maximum(counts, 1),
+            'distinct_cats': [bin(int(m)).count('1') for m in self.category_mask[:n]],
+        })
+
+    def save_state(self, path: str):
+        """Writes the running aggregates and histogram to an .npz (atomically)."""
+        n = len(self._slots)
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            session_ids=np.array(list(self._slots)),
+            max_order=self.max_order[:n],
+            price_sum=self.price_sum[:n],
+            event_count=self.event_count[:n],
+            category_mask=self.category_mask[:n],
+            histogram_edges=self.histogram.edges,
+            histogram_counts=self.histogram.counts,
+            histogram_sums=self.histogram.sums,
+            events_seen=self.events_seen,
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_state(cls, path: str) -> "BehaviorAnalyzer":
+        """Restores an analyzer saved with save_state and recomputes its rules."""
+        analyzer = cls()
+        with np.load(path) as state:
+            if not np.array_equal(state["histogram_edges"], analyzer.histogram.edges):
+                raise ValueError("Saved behavior state uses different histogram bins.")
+            analyzer._slots = {s: i for i, s in enumerate(state["session_ids"].tolist())}
+            analyzer.max_order = state["max_order"]
+            analyzer.price_sum = state["price_sum"]
+            analyzer.event_count = state["event_count"]
+            analyzer.category_mask = state["category_mask"]
+            analyzer.histogram.counts = state["histogram_counts"]
+            analyzer.histogram.sums = state["histogram_sums"]
+            analyzer.events_seen = int(state["events_seen"])
+        analyzer.persona_rules = analyzer._rules()
+        return analyzer
+
     def get_rules(self):
-        return self.persona_rules
\ No newline at end of file
+        return self.persona_rules
@@ -0,0 +1,129 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+
+class LRUCache:
+    """Thread-safe bounded LRU cache with optional per-entry TTL and hit/miss counters."""
+
+    def __init__(self, maxsize: int = 1024, ttl_seconds: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds or None
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl_seconds: Optional[float] = None):
+        ttl = ttl_seconds or self.ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Live (non-expired) entries, least recently used first."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (exp, v) in self._data.items() if exp is None or exp >= now]
+
+    def __contains__(self, key) -> bool:
+        """Membership test that neither counts as a hit/miss nor refreshes recency."""
+        with self._lock:
+            entry = self._data.get(key)
+        return entry is not None and (entry[0] is None or entry[0] >= time.monotonic())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size, hits, misses, evictions = len(self._data), self.hits, self.misses, self.evictions
+        total = hits + misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+# --- Query embedding cache ---
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a search query: case- and whitespace-insensitive."""
+    return _WHITESPACE.sub(" ", query.strip().lower())
+
+
+def save_warm_set(cache: LRUCache, path: str, model_name: str, limit: int):
+    """Persists the `limit` most recently used query embeddings to an .npz file."""
+    entries = cache.items()[-limit:]
+    if not path or not entries:
+        return
+
+    keys = np.array([k for k, _ in entries])
+    vectors = np.vstack([v for _, v in entries]).astype(np.float32)
+
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, keys=keys, vectors=vectors, model=np.array(model_name))
+    os.replace(tmp_path, path)
+    print(f"Saved {len(keys)} query embeddings to {path}.")
+
+
+def load_warm_set(cache: LRUCache, path: str, model_name: str):
+    """Pre-populates the cache from a warm set written by save_warm_set."""
+    if not path or not os.path.exists(path):
+        return
+
+    try:
+        data = np.load(path)
+        if str(data["model"]) != model_name:
+            print(f"Ignoring query warm set {path}: built with a different embedding model.")
+            return
+        for key, vector in zip(data["keys"].tolist(), data["vectors"]):
+            cache.set(key, vector)
+        print(f"Loaded {len(data['keys'])} query embeddings from {path}.")
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Could not load query warm set {path}: {e}")
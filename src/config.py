@@ -10,10 +10,73 @@ class Settings(BaseSettings):
     AMAZON_PRODUCTS_PATH: str = "data/amazon_products.csv"
     AMAZON_CATEGORIES_PATH: str = "data/amazon_categories.csv"
     CLICKSTREAM_PATH: str = "data/e-shop clothing 2008.csv"
+    ARTIFACTS_DIR: str = "artifacts"  # Versioned bundle written by generate_artifacts.py
     
     # Model Settings
     EMBEDDING_MODEL: str = 'all-MiniLM-L6-v2'
     SAMPLE_SIZE: int = 50000  # Keep this manageable for Render's free tier RAM
+    CATALOG_STORE_PATH: str = "data/amazon_catalog.parquet"  # Full catalog (streaming ingest)
+    INGEST_CHUNK_SIZE: int = 100000
+    CLICKSTREAM_CHUNK_SIZE: int = 50000
+    
+    # Behavior Analyzer: histogram sketch of session average prices (persona thresholds)
+    BEHAVIOR_PRICE_MAX: float = 500.0  # Averages above this fall into the last bin
+    BEHAVIOR_PRICE_BINS: int = 5000  # 0.1 price units per bin
+    PERSONA_RULES_DIR: str = "persona_artifacts"  # Cached rules + analyzer state, keyed by clickstream hash
+    
+    # Vector Index (trained in generate_artifacts.py)
+    INDEX_TYPE: str = "flat"  # flat | ivf_flat | ivf_pq | hnsw
+    IVF_NLIST: int = 0  # 0 = auto (~4*sqrt(N))
+    IVF_NPROBE: int = 16
+    PQ_M: int = 48  # Sub-quantizers; must divide the embedding dim (384)
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    VECTOR_DTYPE: str = "float32"  # float32 | float16 | int8 (scalar-quantized codes; ignored by ivf_pq)
+    RESCORE_FACTOR: int = 0  # >0: fetch k*N candidates and re-rank them with the exact float32 embeddings
+    INDEX_TRAIN_SAMPLE: int = 100000
+    NEIGHBOUR_K: int = 50  # Precomputed item-to-item neighbours per product (/recommend)
+    NEIGHBOUR_BATCH_SIZE: int = 4096
+    
+    # Filtered search (price / category / stars)
+    SEARCH_K: int = 200  # Candidates ranked per /search query session (all of its pages)
+    SEARCH_PAGE_SIZE: int = 24
+    SEARCH_MAX_PAGE_SIZE: int = 100
+    FILTER_EXACT_MAX_ROWS: int = 20000  # Filters matching at most this many rows are scored exactly
+    FILTER_MAX_EXPANSIONS: int = 3  # Times nprobe / efSearch are doubled while a filtered search is short of k
+    
+    # Artifact Build: sharded, resumable embedding generation
+    BUILD_WORK_DIR: str = ".build"  # Memmapped embeddings + checkpoint while encoding
+    ENCODE_WORKERS: int = 1  # Encoding processes (one model copy each)
+    ENCODE_SHARD_SIZE: int = 20000  # Rows per checkpointed shard
+    ENCODE_BATCH_SIZE: int = 64
+    
+    # Hybrid retrieval: BM25 over title + category, fused with vector results
+    SEARCH_MODE: str = "hybrid"  # hybrid | semantic | lexical
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    RRF_K: int = 60  # Reciprocal rank fusion constant
+    LEXICAL_FALLBACK_PENDING: int = 64  # In-flight text searches above which /search answers lexical-only
+    
+    # Query Embedding Cache
+    QUERY_CACHE_SIZE: int = 4096
+    QUERY_CACHE_TTL_SECONDS: float = 3600
+    QUERY_CACHE_WARM_PATH: str = ""  # e.g. "query_cache.npz"; empty disables the on-disk warm set
+    QUERY_CACHE_WARM_SIZE: int = 1024
+    
+    # Response Cache (/recommend, /search)
+    RESPONSE_CACHE_SIZE: int = 2048
+    RESPONSE_CACHE_TTL_SECONDS: float = 300
+    RESPONSE_CACHE_SHARED_PATH: str = ""  # e.g. "response_cache.db": SQLite tier shared by all workers; empty disables
+    
+    # Startup: load the embedding model (plus a dummy encode) right after the service is ready,
+    # instead of on the first /search
+    PRELOAD_MODEL: bool = True
+    
+    # Micro-batching of concurrent /search encodes
+    ENCODE_BATCHING: bool = True
+    ENCODE_BATCH_MAX_SIZE: int = 32
+    ENCODE_BATCH_MAX_WAIT_MS: float = 5.0
     
     # Business Logic
     MARGIN_WEIGHT: float = 0.3
@@ -21,9 +84,36 @@ class Settings(BaseSettings):
     BEHAVIOR_WEIGHT: float = 0.2
     MAX_UPSELL_RATIO: float = 1.5
     
+    # Per-user profiles (user_profile.py)
+    PROFILE_CACHE_SIZE: int = 10000
+    PROFILE_PURCHASE_WEIGHT: float = 3.0  # A purchase counts as this many cart adds
+    PROFILE_MIN_EVENTS: int = 3  # Below this the persona rules cap applies
+    PROFILE_CAP_STDS: float = 2.0  # Personal price cap = mean + N * std
+    
+    # Execution Model (thread pools for blocking work)
+    DB_THREADS: int = 8  # sqlite3 + bcrypt
+    MODEL_THREADS: int = 2  # SentenceTransformer + FAISS (each call is already multi-threaded)
+    
+    # SQLite Connection Pool
+    DB_POOL_SIZE: int = 8  # Match DB_THREADS so every DB worker can hold a connection
+    DB_POOL_TIMEOUT_SECONDS: float = 10.0  # Wait for a free connection, then fail with db.PoolTimeout (503)
+    DB_CACHE_SIZE_KB: int = 16384
+    DB_MMAP_SIZE_MB: int = 128
+    DB_BUSY_TIMEOUT_MS: int = 5000
+    DB_STATEMENT_CACHE_SIZE: int = 128
+    
     # API Keys
     GROQ_API_KEY: str = ""
     LLM_MODEL: str = "meta-llama/llama-4-maverick-17b-128e-instruct"
+    GROQ_BASE_URL: str = ""  # e.g. "http://127.0.0.1:9000" for src/llm_stub.py; empty = Groq cloud
+    
+    # Sales Pitch (generated outside the /recommend request path)
+    PITCH_TIMEOUT_SECONDS: float = 3.0  # Whole budget, retries included; then _mock_pitch
+    PITCH_RETRIES: int = 1
+    PITCH_RETRY_BACKOFF_SECONDS: float = 0.2
+    PITCH_CACHE_SIZE: int = 4096
+    PITCH_CACHE_TTL_SECONDS: float = 86400
+    PITCH_FALLBACK_TTL_SECONDS: float = 30  # Fallback pitches are cached briefly so a slow LLM isn't hammered
 
     class Config:
         env_file = ".env"
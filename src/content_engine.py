@@ -1,17 +1,94 @@
+import asyncio
 import pickle
+import threading
 import faiss
+import numpy as np
 import pandas as pd
 import os
+from typing import NamedTuple, Optional, Tuple
 from src.config import config
+from src import artifacts
+from src import vector_index
+from src.cache import LRUCache, normalize_query, load_warm_set, save_warm_set
+from src.batch_encoder import BatchEncoder
+from src.product_store import ProductStore
+from src.executors import MODEL_EXECUTOR, run_model
+
+class SearchFilters(NamedTuple):
+    """Optional attribute filters for text search (None = unrestricted). Hashable, so usable as a cache key."""
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    category_ids: Optional[Tuple[int, ...]] = None
+    min_stars: Optional[float] = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in self)
+
 
 class ContentEngine:
     def __init__(self, products_df=None):
         self.index = None
-        self.df = None
+        self.products = None  # ProductStore: slim columnar catalog, gathered by row position
         self.model = None  # Initialize as None
+        self.embeddings = None
+        self.neighbour_ids = None  # (N, K) int32, precomputed by generate_artifacts.py
+        self.neighbour_scores = None  # (N, K) float16
+        self.manifest = {}
+        self.lexical = None  # LexicalIndex (BM25 postings), when the bundle has one
+        self.pending_searches = 0  # Text searches awaiting the model, for the lexical fast path
+        self.lexical_fallbacks = 0
+        self._model_lock = threading.Lock()
+        self.id_lookup = None  # vector_id -> row position, for ID-mapped indexes
+        self.row_ids = None  # row position -> vector_id, for ID-mapped indexes
+        # Columnar attributes by row position, for filtered search (views into the store)
+        self.prices = None
+        self.category_ids = None  # int32, -1 when unknown
+        self.stars = None
+        # Normalized query -> L2-normalized embedding (skips the transformer on repeats)
+        self.query_cache = LRUCache(config.QUERY_CACHE_SIZE, config.QUERY_CACHE_TTL_SECONDS)
+        self.batch_encoder = BatchEncoder(
+            self, config.ENCODE_BATCH_MAX_SIZE, config.ENCODE_BATCH_MAX_WAIT_MS, executor=MODEL_EXECUTOR
+        )
         self._load_artifacts()
+        self._build_id_lookup()
+        self._build_attribute_columns()
+        load_warm_set(self.query_cache, config.QUERY_CACHE_WARM_PATH, config.EMBEDDING_MODEL)
 
     def _load_artifacts(self):
+        bundle_dir = artifacts.resolve_bundle_dir()
+        if bundle_dir:
+            self._load_bundle(bundle_dir)
+        else:
+            print("No artifact bundle found, falling back to startups_data.pkl...")
+            self._load_pickle()
+
+    def _load_bundle(self, bundle_dir: str):
+        """Zero-copy boot: mmap'd embeddings + mmap'd FAISS index + Parquet catalog."""
+        print(f"Loading artifact bundle from {bundle_dir}...")
+        self.manifest = artifacts.read_manifest(bundle_dir)
+        self.products = ProductStore.from_parquet(os.path.join(bundle_dir, artifacts.CATALOG_FILE))
+        self.embeddings = artifacts.load_embeddings(bundle_dir)
+        self.index = artifacts.load_index(bundle_dir)
+
+        neighbours = artifacts.load_neighbours(bundle_dir)
+        if neighbours is not None:
+            self.neighbour_ids, self.neighbour_scores = neighbours
+        self.lexical = artifacts.load_lexical(bundle_dir)
+        if self.lexical is None and config.SEARCH_MODE != "semantic":
+            print("Bundle has no BM25 postings; text search is semantic-only. Re-run generate_artifacts.py.")
+
+        index_type = self.manifest.get('index_type', 'flat')
+        if index_type != config.INDEX_TYPE:
+            print(f"Warning: bundle was built with INDEX_TYPE={index_type}, config asks for "
+                  f"{config.INDEX_TYPE}. Re-run generate_artifacts.py to switch.")
+        vector_dtype = self.manifest.get('vector_dtype', 'float32')
+        if vector_dtype != config.VECTOR_DTYPE:
+            print(f"Warning: bundle was built with VECTOR_DTYPE={vector_dtype}, config asks for "
+                  f"{config.VECTOR_DTYPE}. Re-run generate_artifacts.py to switch.")
+        vector_index.apply_search_params(self.index)
+        print(f"Engine Ready (bundle {self.manifest['build_id']}, {index_type}/{vector_dtype} index, {self.index.ntotal} vectors).")
+
+    def _load_pickle(self):
         # Robust path finding for Render
         file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startups_data.pkl')
         
@@ -19,13 +96,13 @@ class ContentEngine:
              # Fallback check
              file_path = 'startups_data.pkl'
              if not os.path.exists(file_path):
-                 raise FileNotFoundError(f"Could not find startups_data.pkl in src/ or root.")
+                 raise FileNotFoundError(f"Could not find an artifact bundle or startups_data.pkl in src/ or root.")
             
         print(f"Loading pre-computed artifacts from {file_path}...")
         with open(file_path, 'rb') as f:
             data = pickle.load(f)
             
-        self.df = data['df']
+        self.products = ProductStore.from_frame(data['df'])
         embeddings = data['embeddings']
         
         print("Building FAISS Index...")
@@ -33,50 +110,250 @@ class ContentEngine:
         
         d = embeddings.shape[1]
         self.index = faiss.IndexFlatIP(d)
-        self.index.add(embeddings)
+        if 'vector_id' in self.products.numeric:
+            # Delta builds leave gaps in vector_id; label the vectors with them, like the bundle index
+            self.index = faiss.IndexIDMap2(self.index)
+            self.index.add_with_ids(embeddings, self.products.numeric['vector_id'])
+        else:
+            self.index.add(embeddings)
+        self.embeddings = embeddings
         print("Engine Ready.")
 
+    def _build_id_lookup(self):
+        """Maps vector ids to row positions when the index is ID-mapped (else labels are positions)."""
+        if vector_index.is_id_mapped(self.index) and 'vector_id' in self.products.numeric:
+            self.row_ids = self.products.numeric['vector_id']
+            self.id_lookup = vector_index.positions_lookup(self.row_ids)
+
+    def _build_attribute_columns(self):
+        """Price / category / stars arrays, so filters are vectorized masks."""
+        self.prices = self.products.column('price')
+        self.category_ids = self.products.column('category_id')
+        self.stars = self.products.column('stars')
+        print(f"Catalog: {len(self.products)} products, {self.products.nbytes() / 2**20:.1f} MB resident.")
+
+    def filter_mask(self, filters: SearchFilters) -> np.ndarray:
+        """Boolean mask over row positions of the products passing every filter."""
+        mask = np.ones(len(self.products), dtype=bool)
+        if filters.min_price is not None:
+            mask &= self.prices >= filters.min_price
+        if filters.max_price is not None:
+            mask &= self.prices <= filters.max_price
+        if filters.category_ids is not None:
+            mask &= np.isin(self.category_ids, np.asarray(filters.category_ids, dtype=np.int32))
+        if filters.min_stars is not None:
+            mask &= self.stars >= filters.min_stars
+        return mask
+
+    def get_position(self, asin: str) -> int:
+        """Returns the row position of an ASIN, or -1 if it is not in the catalog."""
+        return self.products.position(asin)
+
+    def has_asin(self, asin: str) -> bool:
+        return self.get_position(asin) >= 0
+
+    def get_product(self, asin: str) -> dict:
+        """Returns a single product as a dict, or None if the ASIN is unknown."""
+        pos = self.get_position(asin)
+        if pos < 0:
+            return None
+        return self.products.records([pos])[0]
+
+    def get_products(self, asins, columns=None) -> list:
+        """
+        Batched lookup: one dict per requested ASIN (None when missing),
+        gathered from the store in one vectorized take per column.
+        """
+        positions = self.products.positions(asins)
+        found = positions >= 0
+        records = iter(self.products.records(positions[found], columns))
+
+        return [next(records) if ok else None for ok in found]
+
     def search_by_asin(self, asin: str, k: int = 20):
-        product_row = self.df[self.df['asin'] == asin]
-        if product_row.empty:
+        idx = self.get_position(asin)
+        if idx < 0:
             return pd.DataFrame()
+
+        # Serve from the precomputed neighbour table in O(k) when it covers the request
+        if self.neighbour_ids is not None and k <= self.neighbour_ids.shape[1]:
+            ids = self.neighbour_ids[idx, :k]
+            if ids[0] >= 0:
+                return self._results_frame(self.neighbour_scores[idx, :k].astype(np.float32), ids)
         
-        idx = product_row.index[0]
-        
-        # FIX: Explicit int cast for FAISS
-        query_vec = self.index.reconstruct(int(idx)).reshape(1, -1)
-        
-        distances, indices = self.index.search(query_vec, k + 1)
+        # Live search fallback. Embeddings are stored L2-normalized, so the row is the query vector
+        query_vec = np.array(self.embeddings[idx], dtype=np.float32).reshape(1, -1)
         
-        results = []
-        for i in range(len(indices[0])):
-            original_idx = indices[0][i]
-            if original_idx == int(idx): continue 
-            item = self.df.iloc[original_idx].to_dict()
-            item['similarity_score'] = float(distances[0][i])
-            results.append(item)
-            
-        return pd.DataFrame(results)
-
-    def search_by_text(self, query: str, k: int = 20):
-        # --- OPTIMIZATION START ---
-        # Only load the model if it hasn't been loaded yet
-        if self.model is None:
-            print("Loading Embedding Model (One-time operation)...")
-            from sentence_transformers import SentenceTransformer
-            self.model = SentenceTransformer(config.EMBEDDING_MODEL)
-        # --- OPTIMIZATION END ---
+        distances, positions = self._search(query_vec, k + 1)
         
-        query_vec = self.model.encode([query])
+        keep = positions[0] != idx
+        return self._results_frame(distances[0][keep], positions[0][keep])
+
+    def _load_model(self):
+        # Only load the model if it hasn't been loaded yet (the lock stops two threads loading it twice)
+        with self._model_lock:
+            if self.model is None:
+                print("Loading Embedding Model (One-time operation)...")
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(config.EMBEDDING_MODEL)
+        return self.model
+
+    def warmup(self):
+        """
+        Loads the model and runs one dummy query end to end, so the first real
+        request pays neither for the model, lazy kernels, nor cold index pages.
+        """
+        self.products.text('title')
+        if self.lexical is not None:
+            self.lexical.search(["warmup"], 1)
+        query_vec = np.ascontiguousarray(self._load_model().encode(["warmup"]), dtype=np.float32)
         faiss.normalize_L2(query_vec)
-        
-        distances, indices = self.index.search(query_vec, k)
-        
-        results = []
-        for i in range(len(indices[0])):
-            original_idx = indices[0][i]
-            item = self.df.iloc[original_idx].to_dict()
-            item['similarity_score'] = float(distances[0][i])
-            results.append(item)
-            
-        return pd.DataFrame(results)
\ No newline at end of file
+        self._search(query_vec, 1)
+
+    def encode_queries(self, queries: list) -> np.ndarray:
+        """
+        Returns normalized query vectors, shape (len(queries), d).
+        Cache hits are reused; all misses are encoded in a single forward pass.
+        """
+        keys = [normalize_query(q) for q in queries]
+        vectors = [self.query_cache.get(key) for key in keys]
+
+        missing = sorted({key for key, vec in zip(keys, vectors) if vec is None})
+        if missing:
+            encoded = np.ascontiguousarray(self._load_model().encode(missing), dtype=np.float32)
+            faiss.normalize_L2(encoded)
+            fresh = dict(zip(missing, encoded))
+            for key, vec in fresh.items():
+                self.query_cache.set(key, vec)
+            vectors = [fresh[key] if vec is None else vec for key, vec in zip(keys, vectors)]
+
+        return np.vstack(vectors)
+
+    def encode_query(self, query: str) -> np.ndarray:
+        """Returns the normalized (1, d) query vector, served from the query cache when possible."""
+        return self.encode_queries([query])
+
+    def _search(self, query_vecs: np.ndarray, k: int, allowed: np.ndarray = None):
+        """index.search mapped to row positions, re-scored in float32 when RESCORE_FACTOR is set."""
+        if allowed is None:
+            return vector_index.search(self.index, query_vecs, k, self.id_lookup, self.embeddings)
+        return vector_index.filtered_search(
+            self.index, query_vecs, k, allowed, self.id_lookup, self.embeddings, self.row_ids
+        )
+
+    @staticmethod
+    def _fuse(semantic: np.ndarray, lexical: np.ndarray, k: int):
+        """
+        Reciprocal rank fusion of two (q, k) position lists (-1 padded). Scores are
+        scaled so that the top of every non-empty list scores 1.0.
+        """
+        distances = np.zeros((len(semantic), k), dtype=np.float32)
+        positions = np.full((len(semantic), k), -1, dtype=np.int64)
+        for row in range(len(semantic)):
+            fused = {}
+            lists = [ranked[ranked >= 0] for ranked in (semantic[row], lexical[row])]
+            lists = [ranked for ranked in lists if len(ranked)]
+            for ranked in lists:
+                for rank, pos in enumerate(ranked.tolist()):
+                    fused[pos] = fused.get(pos, 0.0) + 1.0 / (config.RRF_K + rank + 1)
+
+            best = sorted(fused.items(), key=lambda item: -item[1])[:k]
+            scale = (config.RRF_K + 1) / max(len(lists), 1)
+            for col, (pos, score) in enumerate(best):
+                positions[row, col] = pos
+                distances[row, col] = score * scale
+        return distances, positions
+
+    def _hybrid(self) -> bool:
+        return self.lexical is not None and config.SEARCH_MODE == "hybrid"
+
+    @property
+    def search_mode(self) -> str:
+        """Mode of model-backed text searches: 'hybrid' when BM25 postings are loaded, else 'semantic'."""
+        return "hybrid" if self._hybrid() else "semantic"
+
+    def search_vectors_for_texts(self, queries: list, k: int, filters: list = None):
+        """
+        Encodes a batch of queries and runs one batched index search per distinct
+        filter set (`filters` holds one SearchFilters or None per query). In hybrid
+        mode the results are fused with BM25 hits over the same filter.
+        """
+        query_vecs = self.encode_queries(queries)
+        groups = {}
+        for row, f in enumerate(filters or [None] * len(queries)):
+            groups.setdefault(None if f is None or f.is_empty() else f, []).append(row)
+
+        distances = np.zeros((len(queries), k), dtype=np.float32)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        for f, rows in groups.items():
+            allowed = self.filter_mask(f) if f is not None else None
+            d, p = self._search(query_vecs[rows], k, allowed)
+            if self._hybrid():
+                _, lexical = self.lexical.search([queries[r] for r in rows], k, allowed)
+                d, p = self._fuse(p, lexical, k)
+            distances[rows], positions[rows] = d, p
+        return distances, positions
+
+    def save_query_cache(self):
+        """Persists the hottest query embeddings so the next boot starts warm."""
+        save_warm_set(self.query_cache, config.QUERY_CACHE_WARM_PATH,
+                      config.EMBEDDING_MODEL, config.QUERY_CACHE_WARM_SIZE)
+
+    def _results_frame(self, distances, positions) -> pd.DataFrame:
+        """Catalog rows of the hits, gathered column-wise, plus their similarity_score."""
+        positions = np.asarray(positions)
+        found = positions >= 0  # ANN indexes pad with -1 when short of k hits
+        frame = self.products.frame(positions[found])
+        frame['similarity_score'] = np.asarray(distances, dtype=np.float64)[found]
+        return frame
+
+    def search_by_text(self, query: str, k: int = 20, filters: SearchFilters = None):
+        """Top-k products for a query; with filters, k products that all pass them (when that many exist)."""
+        distances, positions = self.search_vectors_for_texts([query], k, [filters])
+        return self._results_frame(distances[0], positions[0])
+
+    def search_lexical(self, query: str, k: int = 20, filters: SearchFilters = None):
+        """BM25-only search (no model). Scores are rank-based like hybrid results."""
+        allowed = self.filter_mask(filters) if filters is not None and not filters.is_empty() else None
+        _, positions = self.lexical.search([query], k, allowed)
+        distances, positions = self._fuse(positions, np.full_like(positions, -1), k)
+        frame = self._results_frame(distances[0], positions[0])
+        frame.attrs["search_mode"] = "lexical"
+        return frame
+
+    def _lexical_fast_path(self, query: str) -> bool:
+        """
+        True when a text search should skip the model: lexical mode, the model is
+        not loaded yet (it starts loading in the background), or too many searches
+        are already waiting on it.
+        """
+        if self.lexical is None or config.SEARCH_MODE == "semantic":
+            return False
+        if config.SEARCH_MODE == "lexical":
+            return True
+        if self.model is None and normalize_query(query) not in self.query_cache:
+            if not self._model_lock.locked():
+                MODEL_EXECUTOR.submit(self._load_model)
+            return True
+        return self.pending_searches >= config.LEXICAL_FALLBACK_PENDING
+
+    async def search_by_text_async(self, query: str, k: int = 20, filters: SearchFilters = None):
+        """
+        Like search_by_text, but micro-batched with other concurrent requests.
+        Falls back to BM25 alone while the model is unavailable or saturated;
+        such frames carry attrs["search_mode"] == "lexical".
+        """
+        if self._lexical_fast_path(query):
+            if config.SEARCH_MODE != "lexical":
+                self.lexical_fallbacks += 1
+            # Off the model pool on purpose: it is the thing that is busy
+            return await asyncio.to_thread(self.search_lexical, query, k, filters)
+
+        self.pending_searches += 1
+        try:
+            if not config.ENCODE_BATCHING:
+                return await run_model(self.search_by_text, query, k, filters)
+            distances, positions = await self.batch_encoder.search(query, k, filters)
+            return self._results_frame(distances, positions)
+        finally:
+            self.pending_searches -= 1
@@ -1,3 +1,5 @@
+import json
+import os
 import pandas as pd
 import numpy as np
 import logging
@@ -6,6 +8,23 @@ from src.config import config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Compact dtypes for streaming ingest of the full Amazon dump.
+# Stars stay float32: they are half-star ratings (4.5), which int8 would truncate.
+CATALOG_DTYPES = {
+    'asin': 'string',
+    'title': 'string',
+    'stars': 'float32',
+    'reviews': 'float32',  # float while parsing so blanks become NaN; cast after cleaning
+    'price': 'float32',
+    'listPrice': 'float32',
+    'category_id': 'float32',
+    'isBestSeller': 'boolean',
+    'boughtInLastMonth': 'float32',
+}
+
+# Stars are rated in 0.1 steps on a 0-5 scale; a fixed histogram gives an exact median in O(1) memory
+_STARS_BINS = 51
+
 class DataLoader:
     @staticmethod
     def load_amazon_catalog():
@@ -43,11 +62,105 @@ class DataLoader:
         return merged.reset_index(drop=True)
 
     @staticmethod
-    def load_clickstream():
-        logger.info("Loading UCI Clickstream...")
-        # UCI data is typically semicolon separated
-        df = pd.read_csv(config.CLICKSTREAM_PATH, sep=';')
-        
+    def stream_amazon_catalog(out_path: str = None, chunksize: int = None) -> str:
+        """
+        Ingests the full amazon_products.csv in chunks with bounded memory.
+        Each chunk is cleaned, joined with its category and appended to a
+        Parquet store. Stars are left unfilled; the median needed to fill
+        them is written to a sidecar JSON and applied by load_catalog_store.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        out_path = out_path or config.CATALOG_STORE_PATH
+        chunksize = chunksize or config.INGEST_CHUNK_SIZE
+        logger.info(f"Streaming Amazon catalog into {out_path} ({chunksize} rows/chunk)...")
+
+        # Categories are small: map id -> name through a fixed categorical so every
+        # chunk shares one Parquet dictionary
+        categories = pd.read_csv(config.AMAZON_CATEGORIES_PATH)
+        category_dtype = pd.CategoricalDtype(categories['category_name'].unique())
+        category_names = pd.Series(
+            categories['category_name'].astype(category_dtype).values,
+            index=categories['id'].astype('int32')
+        )
+
+        stars_hist = np.zeros(_STARS_BINS, dtype=np.int64)
+        writer = None
+        schema = None
+        total = 0
+        tmp_path = out_path + ".tmp"
+
+        reader = pd.read_csv(
+            config.AMAZON_PRODUCTS_PATH,
+            usecols=lambda c: c in CATALOG_DTYPES,
+            dtype=CATALOG_DTYPES,
+            chunksize=chunksize,
+        )
+        try:
+            for chunk in reader:
+                # Cleaning (same rules as load_amazon_catalog)
+                chunk = chunk.dropna(subset=['title', 'price', 'category_id'])
+                chunk = chunk[chunk['price'] > 0]
+
+                chunk['category_id'] = chunk['category_id'].astype('int32')
+                chunk['category_name'] = category_names.reindex(chunk['category_id']).values
+                for col in ('reviews', 'boughtInLastMonth'):
+                    if col in chunk:
+                        chunk[col] = chunk[col].fillna(0).astype('int32')
+
+                # Feature Engineering: Cost Price Proxy (Assume 30% margin baseline)
+                chunk['cost_price'] = (chunk['price'] * 0.7).astype('float32')
+
+                stars = chunk['stars'].dropna().to_numpy()
+                stars_hist += np.bincount(np.clip(np.rint(stars * 10), 0, _STARS_BINS - 1).astype(np.int64),
+                                          minlength=_STARS_BINS)
+
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                if writer is None:
+                    schema = table.schema
+                    writer = pq.ParquetWriter(tmp_path, schema)
+                writer.write_table(table)
+
+                total += len(chunk)
+                logger.info(f"   {total} products ingested...")
+        finally:
+            if writer is not None:
+                writer.close()
+
+        if writer is None:
+            raise ValueError(f"No products found in {config.AMAZON_PRODUCTS_PATH}")
+        os.replace(tmp_path, out_path)
+
+        # Exact median from the histogram (lower median, like the 0.1-step ratings themselves)
+        cumulative = np.cumsum(stars_hist)
+        median_stars = float(np.searchsorted(cumulative, (cumulative[-1] + 1) // 2) / 10) if cumulative[-1] else 0.0
+
+        with open(out_path + ".json", "w") as f:
+            json.dump({"products": total, "median_stars": median_stars}, f)
+
+        logger.info(f"Catalog store written: {total} products.")
+        return out_path
+
+    @staticmethod
+    def load_catalog_store(path: str = None, columns=None) -> pd.DataFrame:
+        """Loads a store written by stream_amazon_catalog, finishing the per-catalog features."""
+        path = path or config.CATALOG_STORE_PATH
+        with open(path + ".json") as f:
+            stats = json.load(f)
+
+        df = pd.read_parquet(path, columns=columns)
+
+        # 2. Quality Score (Normalized Stars), filling missing stars with the catalog median
+        if 'stars' in df:
+            df['stars'] = df['stars'].fillna(stats['median_stars']).astype('float32')
+            df['quality_score'] = (df['stars'] / 5.0).astype('float32')
+
+        logger.info(f"Catalog store loaded: {len(df)} products.")
+        return df
+
+    @staticmethod
+    def _normalize_clickstream_columns(df: pd.DataFrame) -> pd.DataFrame:
         # Normalize column names (Lowercase, remove spaces)
         df.columns = (
             df.columns
@@ -57,6 +170,23 @@ class DataLoader:
             .str.replace('(', '')
             .str.replace(')', '')
         )
+        return df
+
+    @staticmethod
+    def load_clickstream():
+        logger.info("Loading UCI Clickstream...")
+        # UCI data is typically semicolon separated
+        df = pd.read_csv(config.CLICKSTREAM_PATH, sep=';')
+        df = DataLoader._normalize_clickstream_columns(df)
         
         logger.info(f"Clickstream loaded: {len(df)} records.")
-        return df
\ No newline at end of file
+        return df
+
+    @staticmethod
+    def iter_clickstream(chunksize: int = None, path: str = None):
+        """Yields the clickstream in chunks (normalized columns), for BehaviorAnalyzer.update."""
+        chunksize = chunksize or config.CLICKSTREAM_CHUNK_SIZE
+        path = path or config.CLICKSTREAM_PATH
+        logger.info(f"Streaming UCI Clickstream in chunks of {chunksize}...")
+        for chunk in pd.read_csv(path, sep=';', chunksize=chunksize):
+            yield DataLoader._normalize_clickstream_columns(chunk)
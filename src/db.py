@@ -1,21 +1,152 @@
 import sqlite3
 import bcrypt
 import datetime
+import json
+import queue
+import threading
+from contextlib import contextmanager
 from typing import List, Optional, Dict
 import os
+from src.config import config
 
 DB_NAME = os.getenv("DB_PATH", "profitgenai.db")
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row # Access columns by name
-    return conn
+# --- CONNECTION POOL ---
 
-def init_db():
-    """Initializes database and creates tables."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+class PoolTimeout(sqlite3.OperationalError):
+    """No pooled connection was returned within DB_POOL_TIMEOUT_SECONDS."""
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived sqlite3 connections.
+    Connections run in WAL mode (readers never block the writer) and keep
+    their prepared-statement cache across requests.
+    """
+
+    def __init__(self, db_path: str, size: int):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,  # Connections move between pool threads
+            isolation_level=None,  # Transactions are managed explicitly by transaction()
+            cached_statements=config.DB_STATEMENT_CACHE_SIZE,
+        )
+        conn.row_factory = sqlite3.Row # Access columns by name
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{config.DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={config.DB_MMAP_SIZE_MB * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                # Count the slot only once the connection exists, so a failed connect can't leak it
+                conn = self._connect()
+                self._created += 1
+                return conn
+
+        # Pool exhausted: wait for a connection to be returned, but not forever
+        try:
+            return self._idle.get(timeout=config.DB_POOL_TIMEOUT_SECONDS)
+        except queue.Empty:
+            raise PoolTimeout(
+                f"All {self.size} pooled connections to {self.db_path} are in use; "
+                f"none was returned within {config.DB_POOL_TIMEOUT_SECONDS}s"
+            ) from None
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_NAME, config.DB_POOL_SIZE)
+    return _pool
+
+@contextmanager
+def connection():
+    """Borrows a pooled connection (autocommit; use transaction() for writes)."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+@contextmanager
+def transaction(immediate: bool = False):
+    """
+    Borrows a pooled connection inside BEGIN ... COMMIT (ROLLBACK on error).
+    immediate=True takes the write lock up front (BEGIN IMMEDIATE), for
+    read-then-write transactions that must not interleave with other writers.
+    """
+    with connection() as conn:
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1. Per-user covering indexes for cart / history reads (id keeps insertion order on ties)
+    [
+        "CREATE INDEX IF NOT EXISTS idx_cart_items_user_added ON cart_items (user_id, added_at, id, asin)",
+        "CREATE INDEX IF NOT EXISTS idx_purchase_history_user_purchased ON purchase_history (user_id, purchased_at, id, asin)",
+    ],
+    # 2. Online per-user profiles (running price stats + category affinity, see user_profile.py)
+    [
+        """
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            user_id INTEGER PRIMARY KEY,
+            events INTEGER NOT NULL DEFAULT 0,
+            weight REAL NOT NULL DEFAULT 0,
+            price_mean REAL NOT NULL DEFAULT 0,
+            price_m2 REAL NOT NULL DEFAULT 0,
+            categories TEXT NOT NULL DEFAULT '{}',
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+        """,
+    ],
+]
+
+def _create_tables(cursor):
     # 1. Create Secure Users Table (Check IF NOT EXISTS)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -27,7 +158,7 @@ def init_db():
             last_login TIMESTAMP
         )
     ''')
-    
+
     # 2. Create Cart Table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS cart_items (
@@ -38,7 +169,7 @@ def init_db():
             FOREIGN KEY(user_id) REFERENCES users(id)
         )
     ''')
-    
+
     # 3. Create Purchase History Table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS purchase_history (
@@ -49,67 +180,71 @@ def init_db():
             FOREIGN KEY(user_id) REFERENCES users(id)
         )
     ''')
+
+def _migrate(conn):
+    """Applies pending MIGRATIONS. Returns the resulting schema version."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        for sql in statements:
+            conn.execute(sql)
+        conn.execute(f"PRAGMA user_version = {target}")
+        print(f"Applied database migration {target}.")
+    return len(MIGRATIONS)
+
+def init_db():
+    """Initializes database, creates tables and applies pending migrations."""
+    with transaction() as conn:
+        _create_tables(conn.cursor())
+        _migrate(conn)
     
-    conn.commit()
-    conn.close()
     print("Database initialized successfully.")
 
 # --- AUTH OPERATIONS ---
 
 def create_user_secure(email: str, plain_password: str, persona: str):
     """Creates a user with hashed password."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 1. Hash password
+    # 1. Hash password (before borrowing a connection; bcrypt is slow on purpose)
     password_hash = bcrypt.hashpw(
-        plain_password.encode('utf-8'), 
+        plain_password.encode('utf-8'),
         bcrypt.gensalt()
     ).decode('utf-8') # Store as string
-    
+
     try:
-        cursor.execute(
-            "INSERT INTO users (email, password_hash, persona) VALUES (?, ?, ?)",
-            (email, password_hash, persona)
-        )
-        conn.commit()
-        user_id = cursor.lastrowid
+        with transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO users (email, password_hash, persona) VALUES (?, ?, ?)",
+                (email, password_hash, persona)
+            )
+            user_id = cursor.lastrowid
         return {"id": user_id, "email": email, "persona": persona}
     except sqlite3.IntegrityError:
-        conn.close()
         raise ValueError("Email already exists")
-    finally:
-        conn.close()
 
 def verify_login(email: str, plain_password: str) -> Optional[Dict]:
     """Verifies email and password."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # 1. Fetch user by email
-    cursor.execute("SELECT id, email, password_hash, persona, last_login FROM users WHERE email = ?", (email,))
-    user = cursor.fetchone()
-    
+    with connection() as conn:
+        user = conn.execute(
+            "SELECT id, email, password_hash, persona, last_login FROM users WHERE email = ?", (email,)
+        ).fetchone()
+
     if not user:
-        conn.close()
         return None
-    
+
     # 2. Verify Password Hash
     if not bcrypt.checkpw(
-        plain_password.encode('utf-8'), 
+        plain_password.encode('utf-8'),
         user["password_hash"].encode('utf-8')
     ):
-        conn.close()
         return None
-    
+
     # 3. Update Last Login (Activity Tracking)
-    cursor.execute(
-        "UPDATE users SET last_login = ? WHERE id = ?",
-        (datetime.datetime.now(), user["id"])
-    )
-    conn.commit()
-    conn.close()
-    
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE users SET last_login = ? WHERE id = ?",
+            (datetime.datetime.now(), user["id"])
+        )
+
     return {
         "id": user["id"],
         "email": user["email"],
@@ -117,85 +252,126 @@ def verify_login(email: str, plain_password: str) -> Optional[Dict]:
         "last_login": user["last_login"]
     }
 
+# One round trip: user row plus cart (oldest first) and history (newest first)
+# as JSON arrays, each read straight off its covering index.
+USER_STATE_SQL = """
+    SELECT
+        u.id, u.email, u.persona,
+        (SELECT json_group_array(asin) FROM (
+            SELECT asin FROM cart_items WHERE user_id = u.id ORDER BY added_at, id
+        )) AS cart,
+        (SELECT json_group_array(asin) FROM (
+            SELECT asin FROM purchase_history WHERE user_id = u.id ORDER BY purchased_at DESC, id DESC
+        )) AS history
+    FROM users u
+    WHERE u.email = ?
+"""
+
 def get_user_by_email(email: str) -> Optional[Dict]:
     """Fetches user data (including cart/history)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get User Details
-    cursor.execute("SELECT id, email, persona FROM users WHERE email = ?", (email,))
-    user_row = cursor.fetchone()
-    
+    with connection() as conn:
+        user_row = conn.execute(USER_STATE_SQL, (email,)).fetchone()
+
     if not user_row:
-        conn.close()
         return None
-    
-    user_id = user_row["id"]
-    
-    # Get Cart
-    cursor.execute("SELECT asin FROM cart_items WHERE user_id = ?", (user_id,))
-    cart_rows = cursor.fetchall()
-    cart = [row["asin"] for row in cart_rows]
-    
-    # Get History
-    cursor.execute("SELECT asin FROM purchase_history WHERE user_id = ? ORDER BY purchased_at DESC", (user_id,))
-    history_rows = cursor.fetchall()
-    history = [row["asin"] for row in history_rows]
-    
-    conn.close()
-    
+
     return {
-        "id": user_id,
+        "id": user_row["id"],
         "email": user_row["email"],
         "persona": user_row["persona"],
-        "cart": cart,
-        "history": history
+        "cart": json.loads(user_row["cart"]),
+        "history": json.loads(user_row["history"])
     }
 
+def get_user_id(email: str) -> Optional[int]:
+    """Cheap id-only lookup for endpoints that don't need cart/history."""
+    with connection() as conn:
+        row = conn.execute("SELECT id FROM users WHERE email = ?", (email,)).fetchone()
+    return row["id"] if row else None
+
 def update_user_persona(email: str, new_persona: str):
     """Updates the user's shopper persona."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE users SET persona = ? WHERE email = ?",
-        (new_persona, email)
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            "UPDATE users SET persona = ? WHERE email = ?",
+            (new_persona, email)
+        )
+
+# --- PROFILE OPERATIONS ---
+
+def get_user_profile(user_id: int) -> Optional[Dict]:
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT user_id, events, weight, price_mean, price_m2, categories, version FROM user_profiles WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+    return dict(row) if row else None
+
+def save_user_profile(profile: Dict):
+    """Upserts a profile row (see UserProfile.to_row)."""
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO user_profiles (user_id, events, weight, price_mean, price_m2, categories, version, updated_at)
+            VALUES (:user_id, :events, :weight, :price_mean, :price_m2, :categories, :version, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                events = excluded.events,
+                weight = excluded.weight,
+                price_mean = excluded.price_mean,
+                price_m2 = excluded.price_m2,
+                categories = excluded.categories,
+                version = excluded.version,
+                updated_at = excluded.updated_at
+            """,
+            profile
+        )
 
 # --- CART OPERATIONS ---
 
 def add_to_cart(user_id: int, asin: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO cart_items (user_id, asin) VALUES (?, ?)", (user_id, asin))
-    conn.commit()
-    conn.close()
+    add_to_cart_many(user_id, [asin])
+
+def add_to_cart_many(user_id: int, asins: List[str]):
+    """Adds several items to the cart in one transaction."""
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO cart_items (user_id, asin) VALUES (?, ?)",
+            [(user_id, asin) for asin in asins]
+        )
 
 def remove_from_cart(user_id: int, asin: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM cart_items WHERE user_id = ? AND asin = ?", (user_id, asin))
-    conn.commit()
-    conn.close()
-
-def checkout(user_id: int) -> int:
-    """Moves cart items to history and clears cart."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 1. Get Cart Items
-    cursor.execute("SELECT asin FROM cart_items WHERE user_id = ?", (user_id,))
-    cart_items = cursor.fetchall()
-    count = len(cart_items)
-    
-    # 2. Insert into History
-    for item in cart_items:
-        cursor.execute("INSERT INTO purchase_history (user_id, asin) VALUES (?, ?)", (user_id, item["asin"]))
-    
-    # 3. Clear Cart
-    cursor.execute("DELETE FROM cart_items WHERE user_id = ?", (user_id,))
-    
-    conn.commit()
-    conn.close()
-    return count
\ No newline at end of file
+    with transaction() as conn:
+        conn.execute("DELETE FROM cart_items WHERE user_id = ? AND asin = ?", (user_id, asin))
+
+def buy_item(user_id: int, asin: str):
+    """Records a direct purchase (no cart)."""
+    buy_items(user_id, [asin])
+
+def buy_items(user_id: int, asins: List[str]):
+    """Records several direct purchases in one transaction."""
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO purchase_history (user_id, asin) VALUES (?, ?)",
+            [(user_id, asin) for asin in asins]
+        )
+
+def checkout(user_id: int) -> List[Dict]:
+    """
+    Moves cart items to history and clears cart, atomically.
+    Returns the inserted purchase rows (empty if the cart was empty).
+    """
+    with transaction(immediate=True) as conn:
+        # 1. Copy the cart into history set-based, in cart order
+        purchased = conn.execute(
+            """
+            INSERT INTO purchase_history (user_id, asin)
+            SELECT user_id, asin FROM cart_items WHERE user_id = ? ORDER BY added_at, id
+            RETURNING id, asin, purchased_at
+            """,
+            (user_id,)
+        ).fetchall()
+
+        # 2. Clear Cart
+        conn.execute("DELETE FROM cart_items WHERE user_id = ?", (user_id,))
+
+    return [dict(row) for row in purchased]
@@ -0,0 +1,93 @@
+"""
+User-state fetch benchmark on a synthetic database (1M purchase rows by
+default). Compares the original three-query fetch without indexes against
+the migrated schema and the single round-trip USER_STATE_SQL.
+
+    python -m src.db_benchmark --purchases 1000000 --users 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import db
+
+
+def legacy_fetch(conn, email: str):
+    """The pre-migration get_user_by_email: three sequential queries."""
+    user_row = conn.execute("SELECT id, email, persona FROM users WHERE email = ?", (email,)).fetchone()
+    user_id = user_row["id"]
+    cart = [r["asin"] for r in conn.execute("SELECT asin FROM cart_items WHERE user_id = ?", (user_id,))]
+    history = [r["asin"] for r in conn.execute(
+        "SELECT asin FROM purchase_history WHERE user_id = ? ORDER BY purchased_at DESC", (user_id,))]
+    return cart, history
+
+
+def populate(conn, n_users: int, n_purchases: int, n_cart: int):
+    rng = random.Random(0)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO users (email, password_hash) VALUES (?, 'x')",
+        ((f"user{i}@example.com",) for i in range(n_users))
+    )
+    conn.executemany(
+        "INSERT INTO purchase_history (user_id, asin, purchased_at) VALUES (?, ?, datetime('2024-01-01', ?))",
+        ((rng.randint(1, n_users), f"B{rng.randrange(10**9):09d}", f"+{i} seconds") for i in range(n_purchases))
+    )
+    conn.executemany(
+        "INSERT INTO cart_items (user_id, asin) VALUES (?, ?)",
+        ((rng.randint(1, n_users), f"B{rng.randrange(10**9):09d}") for _ in range(n_cart))
+    )
+    conn.commit()
+
+
+def _time_per_call(fn, emails) -> float:
+    t0 = time.perf_counter()
+    for email in emails:
+        fn(email)
+    return (time.perf_counter() - t0) * 1000 / len(emails)
+
+
+def run(n_users: int, n_purchases: int, n_cart: int, n_lookups: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "bench.db")
+        rng = random.Random(1)
+        emails = [f"user{rng.randrange(n_users)}@example.com" for _ in range(n_lookups)]
+
+        with db.connection() as conn:
+            db._create_tables(conn.cursor())
+            print(f"Populating {n_purchases:,} purchases / {n_cart:,} cart rows for {n_users:,} users...")
+            t0 = time.perf_counter()
+            populate(conn, n_users, n_purchases, n_cart)
+            print(f"   done in {time.perf_counter() - t0:.1f}s")
+
+            before = _time_per_call(lambda e: legacy_fetch(conn, e), emails)
+
+            t0 = time.perf_counter()
+            conn.execute("BEGIN")
+            db._migrate(conn)
+            conn.commit()
+            print(f"Migrations applied in {time.perf_counter() - t0:.1f}s")
+
+            indexed = _time_per_call(lambda e: legacy_fetch(conn, e), emails)
+
+        single = _time_per_call(db.get_user_by_email, emails)
+        db.get_pool().close_all()
+
+    print(f"\n{'fetch':40s} {'ms/call':>9}")
+    print(f"{'3 queries, no indexes':40s} {before:>9.3f}")
+    print(f"{'3 queries, covering indexes':40s} {indexed:>9.3f}")
+    print(f"{'single round trip (get_user_by_email)':40s} {single:>9.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the user-state fetch.")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--purchases", type=int, default=1000000)
+    parser.add_argument("--cart", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+    run(args.users, args.purchases, args.cart, args.lookups)
@@ -0,0 +1,147 @@
+"""
+Sharded, resumable embedding generation for generate_artifacts.py.
+
+Texts are split into shards of ENCODE_SHARD_SIZE rows and encoded by a
+process pool (ENCODE_WORKERS, one SentenceTransformer per worker). Each
+finished shard is written into a memory-mapped .npy and recorded in a JSON
+checkpoint, so an interrupted build picks up at the first missing shard.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import numpy as np
+
+from src.config import config
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # Split the cores between workers instead of letting each one grab them all
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_shard(shard_id: int, texts: list, batch_size: int):
+    import faiss
+
+    embeddings = _worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    faiss.normalize_L2(embeddings)
+    return shard_id, embeddings
+
+
+def _fingerprint(texts: list) -> str:
+    digest = hashlib.blake2b(config.EMBEDDING_MODEL.encode("utf-8"), digest_size=16)
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _load_checkpoint(path: str, fingerprint: str, shard_size: int):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("fingerprint") != fingerprint or checkpoint.get("shard_size") != shard_size:
+        print("   Found a checkpoint for different inputs; starting over.")
+        return None
+    return checkpoint
+
+
+def _save_checkpoint(path: str, checkpoint: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def encode_sharded(texts: list, out_path: str, workers: int = None, shard_size: int = None,
+                   batch_size: int = None) -> np.ndarray:
+    """
+    Encodes `texts` into L2-normalized float32 embeddings stored at `out_path` (.npy).
+    Returns the result as a read-only memmap.
+    """
+    workers = workers or config.ENCODE_WORKERS
+    shard_size = shard_size or config.ENCODE_SHARD_SIZE
+    batch_size = batch_size or config.ENCODE_BATCH_SIZE
+    checkpoint_path = out_path + ".progress.json"
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    n = len(texts)
+    n_shards = (n + shard_size - 1) // shard_size
+    fingerprint = _fingerprint(texts)
+
+    checkpoint = _load_checkpoint(checkpoint_path, fingerprint, shard_size)
+    if checkpoint and os.path.exists(out_path):
+        output = np.load(out_path, mmap_mode="r+")
+        print(f"   Resuming: {len(checkpoint['done'])}/{n_shards} shards already encoded.")
+    else:
+        checkpoint = {"fingerprint": fingerprint, "shard_size": shard_size, "rows": n, "done": []}
+        output = None
+
+    done = set(checkpoint["done"])
+    pending = [s for s in range(n_shards) if s not in done]
+    rows_todo = sum(min(shard_size, n - s * shard_size) for s in pending)
+    started = time.perf_counter()
+    rows_done = 0
+
+    def record(shard_id: int, embeddings: np.ndarray):
+        nonlocal output, rows_done
+        if output is None:
+            # Shape is known once the first shard reports the embedding dim
+            output = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.float32, shape=(n, embeddings.shape[1]))
+        start = shard_id * shard_size
+        output[start:start + len(embeddings)] = embeddings
+        output.flush()
+
+        checkpoint["done"].append(shard_id)
+        _save_checkpoint(checkpoint_path, checkpoint)
+
+        rows_done += len(embeddings)
+        elapsed = time.perf_counter() - started
+        print(f"   shard {shard_id + 1}/{n_shards} done | {rows_done}/{rows_todo} rows | "
+              f"{rows_done / elapsed:.0f} rows/sec")
+
+    if pending:
+        shard_texts = lambda s: texts[s * shard_size:(s + 1) * shard_size]
+        if workers <= 1:
+            _init_worker(config.EMBEDDING_MODEL, os.cpu_count() or 1)
+            for shard_id in pending:
+                record(*_encode_shard(shard_id, shard_texts(shard_id), batch_size))
+        else:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn: torch does not survive fork() once its thread pools exist
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(config.EMBEDDING_MODEL, threads),
+            ) as pool:
+                futures = [pool.submit(_encode_shard, s, shard_texts(s), batch_size) for s in pending]
+                for future in as_completed(futures):
+                    record(*future.result())
+
+        elapsed = time.perf_counter() - started
+        print(f"   Encoded {rows_todo} rows in {elapsed:.1f}s ({rows_todo / elapsed:.0f} rows/sec, {workers} worker(s)).")
+
+    if output is None:
+        # Nothing to encode (n == 0) or everything was already done
+        output = np.load(out_path, mmap_mode="r") if n else np.zeros((0, 0), dtype=np.float32)
+    return output
+
+
+def cleanup(out_path: str):
+    """Removes the working file and checkpoint once the bundle has been written."""
+    for path in (out_path, out_path + ".progress.json"):
+        if os.path.exists(path):
+            os.remove(path)
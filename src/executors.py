@@ -0,0 +1,35 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from src.config import config
+
+# Dedicated, bounded pools so blocking work never runs on the event loop and
+# a burst of one kind of work (e.g. bcrypt) cannot starve the other.
+DB_EXECUTOR = ThreadPoolExecutor(max_workers=config.DB_THREADS, thread_name_prefix="db")
+MODEL_EXECUTOR = ThreadPoolExecutor(max_workers=config.MODEL_THREADS, thread_name_prefix="model")
+# One thread: /events updates of the shared BehaviorAnalyzer are applied and persisted in order
+EVENTS_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="events")
+
+
+async def run_db(fn, *args, **kwargs):
+    """Runs sqlite3 / bcrypt work on the DB pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DB_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+
+async def run_model(fn, *args, **kwargs):
+    """Runs SentenceTransformer / FAISS work on the inference pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(MODEL_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+
+async def run_events(fn, *args, **kwargs):
+    """Runs clickstream updates on the single events thread (serialized, off the event loop)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(EVENTS_EXECUTOR, functools.partial(fn, *args, **kwargs))
+
+
+def shutdown():
+    DB_EXECUTOR.shutdown(wait=False)
+    MODEL_EXECUTOR.shutdown(wait=False)
+    EVENTS_EXECUTOR.shutdown(wait=False)
@@ -1,42 +1,140 @@
 # generate_artifacts.py
+import argparse
+import json
 import pandas as pd
 import pickle
 import sys
 import os
-from sentence_transformers import SentenceTransformer
+import faiss
+import numpy as np
 
 # Setup imports from your existing project
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from src.config import config
 from src.data_loader import DataLoader
+from src import artifacts
+from src import vector_index
+from src import index_benchmark
+from src import artifact_delta
+from src import embedding_pipeline
+from src import persona_rules
+from src.lexical_index import LexicalIndex
+
+def _encoder():
+    """Returns encode(texts) -> normalized float32 embeddings, via the sharded pipeline."""
+    work_path = os.path.join(config.BUILD_WORK_DIR, "embeddings.npy")
+
+    def encode(texts):
+        # Normalized inside the pipeline so ContentEngine can mmap the vectors without copying
+        return embedding_pipeline.encode_sharded(texts, work_path)
+
+    encode.work_path = work_path
+    return encode
+
+def generate(write_pickle: bool = False, index_type: str = None, report: bool = False,
+             full_catalog: bool = False, incremental: bool = False):
+    index_type = index_type or config.INDEX_TYPE
+    if full_catalog:
+        print("1. Streaming Full Catalog into the Columnar Store...")
+        DataLoader.stream_amazon_catalog()
+        df = DataLoader.load_catalog_store()
+    else:
+        print(f"1. Loading Catalog (First {config.SAMPLE_SIZE} rows)...")
+        # Reuse your existing robust loader
+        df = DataLoader.load_amazon_catalog()
 
-def generate():
-    print("1. Loading Catalog (Full 50k rows)...")
-    # Temporarily override config to ensure full load if needed
-    # config.SAMPLE_SIZE = 50000 
-    
-    # Reuse your existing robust loader
-    df = DataLoader.load_amazon_catalog()
-    
     print(f"   Loaded {len(df)} products.")
 
-    print("2. Generating Embeddings (This may take a minute)...")
-    model = SentenceTransformer(config.EMBEDDING_MODEL)
-    
     # Create the search text field exactly like before
     df['search_text'] = (
-        df['title'].fillna('') + " " + 
-        df['category_name'].fillna('')
+        df['title'].fillna('') + " " +
+        df['category_name'].astype('string').fillna('')
+    )
+    df['content_hash'] = artifact_delta.content_hashes(df['search_text'])
+    encode = _encoder()
+
+    previous = artifact_delta.load_previous(index_type) if incremental else None
+    if previous is not None:
+        print(f"2. Delta Rebuild against bundle {previous['manifest']['build_id']}...")
+        embeddings, index, stats = artifact_delta.apply_delta(previous, df, encode, index_type)
+        print(f"   {stats}")
+    else:
+        print("2. Generating Embeddings (This may take a minute)...")
+        embeddings = encode(df['search_text'].tolist())
+        df['vector_id'] = np.arange(len(df), dtype=np.int64)
+
+        print(f"3. Building and Training FAISS Index ({index_type}, {config.VECTOR_DTYPE} vectors)...")
+        index = vector_index.build_index(embeddings, index_type, ids=df['vector_id'].to_numpy())
+
+    print(f"4. Precomputing Top-{config.NEIGHBOUR_K} Neighbour Table...")
+    if previous is not None:
+        # Only rows whose neighbourhood can have changed are searched again
+        neighbours = artifact_delta.patch_neighbours(previous, df, index, embeddings, stats)
+    else:
+        neighbours = vector_index.compute_neighbours(
+            index, embeddings, config.NEIGHBOUR_K, config.NEIGHBOUR_BATCH_SIZE,
+            row_ids=df['vector_id'].to_numpy()
+        )
+
+    print("   Building BM25 Postings...")
+    if previous is not None:
+        lexical = artifact_delta.patch_lexical(previous, df, stats)
+        print(f"   Delta: {stats}")
+    else:
+        lexical = LexicalIndex.build(df['search_text'].tolist())
+    print(f"   {lexical.stats()}")
+
+    print(f"5. Saving Artifact Bundle to '{config.ARTIFACTS_DIR}/'...")
+    manifest = artifacts.write_bundle(
+        config.ARTIFACTS_DIR, df, embeddings, index,
+        neighbours=neighbours,
+        lexical=lexical,
+        extra={
+            "index_type": index_type,
+            "vector_dtype": config.VECTOR_DTYPE,
+            "index_factory": vector_index.factory_string(index_type, *embeddings.shape),
+        }
     )
-    
-    embeddings = model.encode(df['search_text'].tolist(), show_progress_bar=True)
-    
-    print("3. Saving Artifacts...")
-    # We save a dictionary containing the Dataframe and the Embeddings
-    with open('startups_data.pkl', 'wb') as f:
-        pickle.dump({'df': df, 'embeddings': embeddings}, f)
-        
-    print("Done! 'startups_data.pkl' is ready to upload.")
+    print(f"   Bundle {manifest['build_id']} written ({manifest['num_products']} products).")
+
+    if report:
+        print("6. Measuring recall@k vs latency against the flat baseline...")
+        results = index_benchmark.run_report(embeddings)
+        with open(os.path.join(config.ARTIFACTS_DIR, index_benchmark.REPORT_FILE), 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if write_pickle:
+        # Legacy format, still understood by ContentEngine as a fallback
+        with open('startups_data.pkl', 'wb') as f:
+            pickle.dump({'df': df, 'embeddings': embeddings}, f)
+        print("   Legacy 'startups_data.pkl' written.")
+
+    if os.path.exists(config.CLICKSTREAM_PATH):
+        print(f"7. Persona Rules ('{config.PERSONA_RULES_DIR}/')...")
+        persona_rules.load_or_build()
+
+    embedding_pipeline.cleanup(encode.work_path)
+    print("Done! Artifacts are ready to upload.")
 
 if __name__ == "__main__":
-    generate()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build ProfitGenAI search artifacts.")
+    parser.add_argument("--pickle", action="store_true", help="Also write the legacy startups_data.pkl")
+    parser.add_argument("--index-type", choices=vector_index.INDEX_TYPES, default=None,
+                        help="Override Settings.INDEX_TYPE for this build")
+    parser.add_argument("--full-catalog", action="store_true",
+                        help="Stream the whole amazon_products.csv (ignores SAMPLE_SIZE)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only encode new/changed products and patch the existing bundle's index")
+    parser.add_argument("--vector-dtype", choices=tuple(vector_index.VECTOR_CODES), default=None,
+                        help="Override Settings.VECTOR_DTYPE (float16 / int8 scalar-quantized index)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Override Settings.ENCODE_WORKERS (encoding processes)")
+    parser.add_argument("--report", action="store_true",
+                        help="Write a recall@k vs latency report (index_report.json) into the bundle")
+    args = parser.parse_args()
+    if args.workers:
+        config.ENCODE_WORKERS = args.workers
+    if args.vector_dtype:
+        config.VECTOR_DTYPE = args.vector_dtype
+    generate(write_pickle=args.pickle, index_type=args.index_type, report=args.report,
+             full_catalog=args.full_catalog, incremental=args.incremental)
@@ -0,0 +1,129 @@
+"""
+Recall@k vs. latency vs. memory report for the ANN index modes and vector
+dtypes (float32 / float16 / int8), measured against the exact IndexFlatIP
+baseline, with and without float32 re-scoring. Run after generate_artifacts.py:
+
+    python -m src.index_benchmark --k 20 --queries 1000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+import faiss
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import config
+from src import artifacts
+from src import vector_index
+
+# Query-time settings swept for each index type
+SWEEPS = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": p} for p in (1, 4, 8, 16, 32, 64)],
+    "ivf_pq": [{"nprobe": p} for p in (1, 4, 8, 16, 32, 64)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 32, 64, 128, 256)],
+}
+
+# Candidate multipliers tried for float32 re-scoring (0 = off)
+RESCORE_FACTORS = (0, 4)
+
+REPORT_FILE = "index_report.json"
+
+
+def _recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(np.intersect1d(f[f >= 0], t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def _index_mb(index) -> float:
+    # Serialized size tracks resident size for these index types
+    return faiss.serialize_index(index).nbytes / 2**20
+
+
+def run_report(embeddings: np.ndarray, k: int = 20, n_queries: int = 1000, index_types=None, vector_dtypes=None):
+    """Holds out n_queries vectors as queries and evaluates every index type / dtype on the rest."""
+    index_types = index_types or vector_index.INDEX_TYPES
+    vector_dtypes = vector_dtypes or tuple(vector_index.VECTOR_CODES)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    rng = np.random.default_rng(42)
+    query_rows = rng.choice(len(embeddings), min(n_queries, len(embeddings) // 10), replace=False)
+    mask = np.ones(len(embeddings), dtype=bool)
+    mask[query_rows] = False
+    base, queries = embeddings[mask], embeddings[query_rows]
+
+    # Exact ground truth
+    exact = faiss.IndexFlatIP(base.shape[1])
+    exact.add(base)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for index_type in index_types:
+        for vector_dtype in vector_dtypes:
+            if index_type == "ivf_pq" and vector_dtype != "float32":
+                continue  # PQ codes are already compressed; VECTOR_DTYPE does not apply
+
+            t0 = time.perf_counter()
+            index = vector_index.build_index(base, index_type, vector_dtype=vector_dtype)
+            build_s = time.perf_counter() - t0
+            index_mb = _index_mb(index)
+
+            # Re-scoring only changes results when the index stores approximate vectors
+            lossless = vector_dtype == "float32" and index_type != "ivf_pq"
+            factors = (0,) if lossless else RESCORE_FACTORS
+
+            for params in SWEEPS[index_type]:
+                vector_index.apply_search_params(index, **params)
+                for factor in factors:
+                    # Single-query latency, as served by the API
+                    t0 = time.perf_counter()
+                    found = np.vstack([
+                        vector_index.search(index, q.reshape(1, -1), k, embeddings=base, rescore_factor=factor)[1]
+                        for q in queries
+                    ])
+                    latency_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+                    rows.append({
+                        "index_type": index_type,
+                        "vector_dtype": vector_dtype,
+                        "params": params,
+                        "rescore_factor": factor,
+                        "recall_at_k": round(_recall_at_k(found, truth), 4),
+                        "latency_ms": round(latency_ms, 4),
+                        "index_mb": round(index_mb, 2),
+                        "build_s": round(build_s, 2),
+                    })
+                    print(f"{index_type:9s} {vector_dtype:8s} {json.dumps(params):20s} rescore={factor:<2d} "
+                          f"recall@{k}={rows[-1]['recall_at_k']:.4f} latency={rows[-1]['latency_ms']:.3f}ms "
+                          f"index={index_mb:.1f}MB")
+
+    return {
+        "k": k,
+        "n_base": int(len(base)),
+        "n_queries": int(len(queries)),
+        "float32_mb": round(base.nbytes / 2**20, 2),
+        "results": rows,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs latency report for FAISS index modes.")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--types", nargs="*", choices=vector_index.INDEX_TYPES)
+    parser.add_argument("--dtypes", nargs="*", choices=tuple(vector_index.VECTOR_CODES))
+    args = parser.parse_args()
+
+    bundle_dir = artifacts.resolve_bundle_dir()
+    if not bundle_dir:
+        raise SystemExit("No artifact bundle found. Run generate_artifacts.py first.")
+
+    report = run_report(artifacts.load_embeddings(bundle_dir), k=args.k, n_queries=args.queries,
+                        index_types=args.types, vector_dtypes=args.dtypes)
+
+    out_path = os.path.join(bundle_dir, REPORT_FILE)
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {out_path}")
@@ -0,0 +1,178 @@
+"""
+BM25 inverted index over the product search text (title + category name).
+Built at artifact time and stored in the bundle as CSR postings: a sorted
+vocabulary, per-term offsets, int32 row positions and float16 precomputed
+BM25 impacts. Scoring a query is a sum of impacts over its terms' postings,
+so it needs no embedding model.
+"""
+import re
+from array import array
+from typing import List, Tuple
+
+import numpy as np
+
+from src.config import config
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-./][a-z0-9]+)*")
+_SEPARATORS = re.compile(r"[-./]")
+# The vocabulary is a fixed-width bytes array, so one freak token must not widen every entry
+MAX_TOKEN_LENGTH = 32
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased alphanumeric tokens. Compounds such as model numbers
+    ('WH-1000XM4') yield their parts plus the joined form ('wh1000xm4').
+    """
+    tokens = []
+    for match in _TOKEN.findall(text.lower()):
+        parts = _SEPARATORS.split(match)
+        tokens.extend(parts)
+        if len(parts) > 1:
+            tokens.append("".join(parts))
+    return [t[:MAX_TOKEN_LENGTH] for t in tokens]
+
+
+class LexicalIndex:
+    def __init__(self, terms: np.ndarray, offsets: np.ndarray, doc_ids: np.ndarray, impacts: np.ndarray,
+                 num_docs: int, tf: np.ndarray = None, lengths: np.ndarray = None):
+        self.terms = terms  # sorted vocabulary, UTF-8 bytes
+        self.offsets = offsets  # postings of terms[i] are [offsets[i], offsets[i+1])
+        self.doc_ids = doc_ids  # int32 row positions
+        self.impacts = impacts  # float16 BM25 contribution of the term to the row
+        self.num_docs = num_docs
+        # Raw term frequencies and row lengths, kept so delta builds can re-weight without re-tokenizing
+        self.tf = tf  # uint16, aligned with doc_ids
+        self.lengths = lengths  # int32 tokens per row
+
+    @staticmethod
+    def _tokenize_rows(texts):
+        """(sorted vocabulary, term id per distinct (term, row), row, tf, row lengths) for the given texts."""
+        # 1. Tokenize into flat (term id, row) arrays; array('q') keeps this compact for big catalogs
+        vocabulary = {}
+        token_ids = array("q")
+        lengths = array("q")
+        for text in texts:
+            tokens = tokenize(text or "")
+            token_ids.extend(vocabulary.setdefault(t, len(vocabulary)) for t in tokens)
+            lengths.append(len(tokens))
+
+        num_docs = len(lengths)
+        lengths = np.frombuffer(lengths, dtype=np.int64)
+        token_ids = np.frombuffer(token_ids, dtype=np.int64)
+        rows = np.repeat(np.arange(num_docs, dtype=np.int64), lengths)
+
+        # 2. Renumber terms in sorted order, so queries can binary-search the vocabulary
+        terms = np.array([t.encode("utf-8") for t in vocabulary], dtype=bytes)
+        order = np.argsort(terms, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        terms = terms[order]
+
+        # 3. Term frequencies: one entry per distinct (term, row), sorted by term then row
+        pairs, tf = np.unique(rank[token_ids] * max(num_docs, 1) + rows, return_counts=True)
+        return terms, pairs // max(num_docs, 1), pairs % max(num_docs, 1), tf, lengths
+
+    @classmethod
+    def _from_postings(cls, terms, posting_terms, doc_ids, tf, lengths, k1, b) -> "LexicalIndex":
+        """Precomputes the BM25 impact of every posting; postings must be sorted by term, then row."""
+        num_docs = len(lengths)
+        df = np.bincount(posting_terms, minlength=len(terms))
+        idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+        avgdl = lengths.mean() if num_docs else 1.0
+        norm = k1 * (1 - b + b * lengths[doc_ids] / max(avgdl, 1e-9))
+        impacts = (idf[posting_terms] * tf * (k1 + 1) / (tf + norm)).astype(np.float16)
+
+        offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        return cls(terms, offsets, doc_ids.astype(np.int32), impacts, num_docs,
+                   np.minimum(tf, np.iinfo(np.uint16).max).astype(np.uint16), lengths.astype(np.int32))
+
+    @classmethod
+    def build(cls, texts, k1: float = None, b: float = None) -> "LexicalIndex":
+        k1 = config.BM25_K1 if k1 is None else k1
+        b = config.BM25_B if b is None else b
+        terms, posting_terms, doc_ids, tf, lengths = cls._tokenize_rows(texts)
+        return cls._from_postings(terms, posting_terms, doc_ids, tf, lengths, k1, b)
+
+    def patch(self, prev_to_new: np.ndarray, fresh_rows: np.ndarray, fresh_texts, num_docs: int,
+              k1: float = None, b: float = None) -> "LexicalIndex":
+        """
+        Postings for a new catalog of `num_docs` rows: rows of this index move to
+        prev_to_new (-1 = dropped), and only `fresh_texts` (at `fresh_rows`) are
+        tokenized. BM25 weights are recomputed for every posting, since df and the
+        average length change with any edit. Needs tf / lengths (built by this version).
+        """
+        k1 = config.BM25_K1 if k1 is None else k1
+        b = config.BM25_B if b is None else b
+
+        # 1. Kept postings, moved to their new rows
+        old_terms = np.repeat(np.arange(len(self.terms), dtype=np.int64), np.diff(self.offsets))
+        new_docs = prev_to_new[self.doc_ids]
+        kept = new_docs >= 0
+
+        # 2. Fresh rows, tokenized on their own, then both vocabularies merged
+        fresh_terms, fresh_term_ids, fresh_docs, fresh_tf, fresh_lengths = self._tokenize_rows(fresh_texts)
+        terms = np.union1d(self.terms, fresh_terms)
+        posting_terms = np.concatenate([
+            np.searchsorted(terms, self.terms)[old_terms[kept]],
+            np.searchsorted(terms, fresh_terms)[fresh_term_ids],
+        ])
+        doc_ids = np.concatenate([new_docs[kept], np.asarray(fresh_rows, dtype=np.int64)[fresh_docs]])
+        tf = np.concatenate([self.tf[kept].astype(np.int64), fresh_tf])
+
+        lengths = np.zeros(num_docs, dtype=np.int64)
+        moved = prev_to_new >= 0
+        lengths[prev_to_new[moved]] = self.lengths[moved]
+        lengths[fresh_rows] = fresh_lengths
+
+        # 3. Back to term-then-row order, dropping terms no row uses any more
+        order = np.argsort(posting_terms * max(num_docs, 1) + doc_ids, kind="stable")
+        used, posting_terms = np.unique(posting_terms[order], return_inverse=True)
+        return self._from_postings(terms[used], posting_terms, doc_ids[order], tf[order], lengths, k1, b)
+
+    def save(self, path: str):
+        extra = {} if self.tf is None else {"tf": self.tf, "lengths": self.lengths}
+        np.savez(path, terms=self.terms, offsets=self.offsets, doc_ids=self.doc_ids,
+                 impacts=self.impacts, num_docs=self.num_docs, **extra)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        with np.load(path) as data:
+            return cls(data["terms"], data["offsets"], data["doc_ids"], data["impacts"], int(data["num_docs"]),
+                       data["tf"] if "tf" in data else None, data["lengths"] if "lengths" in data else None)
+
+    def _term_ids(self, query: str) -> np.ndarray:
+        tokens = np.array(sorted({t.encode("utf-8") for t in tokenize(query)}), dtype=bytes)
+        if not len(tokens) or not len(self.terms):
+            return np.zeros(0, dtype=np.int64)
+        found = np.searchsorted(self.terms, tokens)
+        found = np.minimum(found, len(self.terms) - 1)
+        return found[self.terms[found] == tokens]
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every row for the query (dense float32, 0 = no matching term)."""
+        term_ids = self._term_ids(query)
+        if not len(term_ids):
+            return np.zeros(self.num_docs, dtype=np.float32)
+        postings = np.concatenate([np.arange(self.offsets[t], self.offsets[t + 1]) for t in term_ids])
+        return np.bincount(self.doc_ids[postings], weights=self.impacts[postings].astype(np.float32),
+                           minlength=self.num_docs).astype(np.float32)
+
+    def search(self, queries: List[str], k: int, allowed: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k rows per query by BM25, optionally restricted to a boolean row mask. -1 padded."""
+        distances = np.zeros((len(queries), k), dtype=np.float32)
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, query in enumerate(queries):
+            scores = self.scores(query)
+            if allowed is not None:
+                scores[~allowed] = 0
+            hits = np.flatnonzero(scores > 0)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            hits = hits[np.argsort(-scores[hits], kind="stable")]
+            distances[row, :len(hits)] = scores[hits]
+            positions[row, :len(hits)] = hits
+        return distances, positions
+
+    def stats(self):
+        return {"terms": int(len(self.terms)), "postings": int(len(self.doc_ids)), "docs": self.num_docs}
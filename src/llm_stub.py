@@ -0,0 +1,78 @@
+"""
+Local stand-in for the Groq chat completions API, to exercise pitch latency
+budgets, retries and streaming without a real key:
+
+    uvicorn src.llm_stub:app --port 9000
+    GROQ_BASE_URL=http://127.0.0.1:9000 GROQ_API_KEY=stub uvicorn src.api:app
+
+STUB_LLM_TOKEN_DELAY_MS (time per token) and STUB_LLM_FAILURE_RATE (share of
+requests answered with a 503) shape its behaviour.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TOKEN_DELAY = float(os.getenv("STUB_LLM_TOKEN_DELAY_MS", "30")) / 1000
+FAILURE_RATE = float(os.getenv("STUB_LLM_FAILURE_RATE", "0"))
+
+app = FastAPI(title="LLM Stub")
+
+
+def _pitch_tokens(prompt: str) -> list:
+    viewing = re.search(r"User is viewing: (.+?) \(", prompt)
+    first_rec = re.search(r"^\s*- (.+?) \(", prompt, re.MULTILINE)
+    text = (
+        f"Since you like {viewing.group(1) if viewing else 'this item'}, "
+        f"{first_rec.group(1) if first_rec else 'our picks'} is a perfect match. "
+        "It is a great deal you will not want to miss."
+    )
+    return re.findall(r"\S+\s*", text)
+
+
+def _envelope(model: str, object_type: str, choice: dict) -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": object_type,
+        "created": int(time.time()),
+        "model": model,
+        "choices": [choice],
+    }
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if random.random() < FAILURE_RATE:
+        return JSONResponse(status_code=503, content={"error": {"message": "stub overloaded", "type": "server_error"}})
+
+    model = body.get("model", "stub")
+    tokens = _pitch_tokens(body["messages"][-1]["content"])
+
+    if body.get("stream"):
+        async def events():
+            for token in tokens:
+                await asyncio.sleep(TOKEN_DELAY)
+                chunk = _envelope(model, "chat.completion.chunk",
+                                  {"index": 0, "delta": {"content": token}, "finish_reason": None})
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = _envelope(model, "chat.completion.chunk", {"index": 0, "delta": {}, "finish_reason": "stop"})
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(TOKEN_DELAY * len(tokens))
+    completion = _envelope(model, "chat.completion", {
+        "index": 0,
+        "message": {"role": "assistant", "content": "".join(tokens)},
+        "finish_reason": "stop",
+    })
+    completion["usage"] = {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+    return completion
@@ -0,0 +1,77 @@
+"""
+Mixed-traffic load test against a running server. Reports p50/p95/p99 latency
+per endpoint at increasing concurrency; p99 should stay roughly flat as
+concurrency grows if nothing blocks the event loop.
+
+    uvicorn src.api:app --port 8000 &
+    python -m src.load_test --url http://127.0.0.1:8000 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+QUERIES = ["wireless headphones", "running shoes", "coffee maker", "usb c cable",
+           "kids toys", "yoga mat", "phone case", "gaming mouse", "desk lamp", "backpack"]
+PASSWORD = "load-test-password"
+
+
+async def _timed(stats, name, coro):
+    t0 = time.perf_counter()
+    response = await coro
+    stats[name].append((time.perf_counter() - t0) * 1000)
+    return response
+
+
+async def _user_session(client: httpx.AsyncClient, stats, duration_s: float, asins):
+    email = f"load-{uuid.uuid4().hex[:10]}@example.com"
+    await _timed(stats, "signup", client.post("/signup", json={"email": email, "password": PASSWORD}))
+
+    deadline = time.perf_counter() + duration_s
+    while time.perf_counter() < deadline:
+        action = random.random()
+        if action < 0.4:
+            r = await _timed(stats, "search", client.post("/search", json={"query": random.choice(QUERIES)}))
+            if r.status_code == 200 and r.json().get("results"):
+                asins.append(r.json()["results"][0]["asin"])
+        elif action < 0.6 and asins:
+            await _timed(stats, "recommend", client.post("/recommend", json={"user_email": email, "asin": random.choice(asins)}))
+        elif action < 0.75 and asins:
+            await _timed(stats, "add_to_cart", client.post("/add_to_cart", json={"email": email, "asin": random.choice(asins)}))
+        elif action < 0.9:
+            await _timed(stats, "get_cart", client.post("/get_cart", json={"email": email}))
+        else:
+            # bcrypt-heavy
+            await _timed(stats, "login", client.post("/login", json={"email": email, "password": PASSWORD}))
+
+
+async def run_level(url: str, concurrency: int, duration_s: float):
+    stats = defaultdict(list)
+    asins = []
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await asyncio.gather(*[_user_session(client, stats, duration_s, asins) for _ in range(concurrency)])
+    return stats
+
+
+def _print_level(concurrency: int, stats):
+    print(f"\n=== concurrency={concurrency} ===")
+    print(f"{'endpoint':12s} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, samples in sorted(stats.items()):
+        p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+        print(f"{name:12s} {len(samples):>6} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mixed-traffic latency test for ProfitGenAI.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per concurrency level")
+    args = parser.parse_args()
+
+    for level in args.concurrency:
+        _print_level(level, asyncio.run(run_level(args.url, level, args.duration)))
@@ -0,0 +1,144 @@
+"""
+Cached persona rules. The rules and the BehaviorAnalyzer state are computed
+once from the clickstream and stored next to a fingerprint of the source file
+(SHA-256, plus size/mtime as a fast path). Startup loads them in milliseconds
+and only re-streams the CSV when the file changed. Rebuild explicitly with:
+
+    python -m src.persona_rules
+"""
+import datetime
+import hashlib
+import json
+import os
+import sys
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.config import config
+from src.behavior_analyzer import BehaviorAnalyzer
+from src.data_loader import DataLoader
+
+# Bump when the rules / state layout changes
+PERSONA_RULES_VERSION = 1
+
+RULES_FILE = "persona_rules.json"
+STATE_FILE = "behavior_state.npz"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _histogram_settings() -> Dict:
+    return {"price_max": config.BEHAVIOR_PRICE_MAX, "price_bins": config.BEHAVIOR_PRICE_BINS}
+
+
+def _read_meta(rules_dir: str) -> Optional[Dict]:
+    path = os.path.join(rules_dir, RULES_FILE)
+    if not os.path.exists(path) or not os.path.exists(os.path.join(rules_dir, STATE_FILE)):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    if meta.get("version") != PERSONA_RULES_VERSION or meta.get("histogram") != _histogram_settings():
+        return None
+    return meta
+
+
+def _write_meta(rules_dir: str, meta: Dict):
+    tmp_path = os.path.join(rules_dir, RULES_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(rules_dir, RULES_FILE))
+
+
+def is_fresh(meta: Dict, clickstream_path: str) -> bool:
+    """True if the cached rules were computed from the current clickstream file."""
+    source = meta["source"]
+    stat = os.stat(clickstream_path)
+    # 1. Fast path: same size and mtime, no need to hash
+    if stat.st_size == source["size"] and stat.st_mtime_ns == source["mtime_ns"]:
+        return True
+    # 2. Touched but maybe unchanged (e.g. fresh checkout): compare content hashes
+    return stat.st_size == source["size"] and file_sha256(clickstream_path) == source["sha256"]
+
+
+def build(clickstream_path: str = None, rules_dir: str = None) -> BehaviorAnalyzer:
+    """Streams the clickstream into a BehaviorAnalyzer and stores rules + state."""
+    clickstream_path = clickstream_path or config.CLICKSTREAM_PATH
+    rules_dir = rules_dir or config.PERSONA_RULES_DIR
+    os.makedirs(rules_dir, exist_ok=True)
+
+    analyzer = BehaviorAnalyzer()
+    for chunk in DataLoader.iter_clickstream(path=clickstream_path):
+        analyzer.update(chunk)
+
+    stat = os.stat(clickstream_path)
+    analyzer.save_state(os.path.join(rules_dir, STATE_FILE))
+    _write_meta(rules_dir, {
+        "version": PERSONA_RULES_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "source": {
+            "path": os.path.basename(clickstream_path),
+            "sha256": file_sha256(clickstream_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        },
+        "histogram": _histogram_settings(),
+        "events": analyzer.events_seen,
+        "sessions": analyzer.sessions,
+        "rules": analyzer.get_rules(),
+    })
+    return analyzer
+
+
+def save(analyzer: BehaviorAnalyzer, rules_dir: str = None) -> bool:
+    """
+    Writes back an analyzer updated online (POST /events). The clickstream
+    fingerprint is kept, so the events survive restarts until the clickstream
+    file itself changes. Returns False when there is no cached artifact to update.
+    """
+    rules_dir = rules_dir or config.PERSONA_RULES_DIR
+    meta = _read_meta(rules_dir)
+    if meta is None:
+        return False
+
+    analyzer.save_state(os.path.join(rules_dir, STATE_FILE))
+    meta.update({
+        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "events": analyzer.events_seen,
+        "sessions": analyzer.sessions,
+        "rules": analyzer.get_rules(),
+    })
+    _write_meta(rules_dir, meta)
+    return True
+
+
+def load_or_build(clickstream_path: str = None, rules_dir: str = None) -> BehaviorAnalyzer:
+    """Returns the cached analyzer when it matches the clickstream, else rebuilds it."""
+    clickstream_path = clickstream_path or config.CLICKSTREAM_PATH
+    rules_dir = rules_dir or config.PERSONA_RULES_DIR
+
+    meta = _read_meta(rules_dir)
+    if meta is not None and is_fresh(meta, clickstream_path):
+        try:
+            analyzer = BehaviorAnalyzer.from_state(os.path.join(rules_dir, STATE_FILE))
+            print(f"Loaded cached persona rules ({meta['sessions']} sessions).")
+            if meta["source"]["mtime_ns"] != os.stat(clickstream_path).st_mtime_ns:
+                # Same content, new mtime: refresh the fast-path fingerprint
+                meta["source"]["mtime_ns"] = os.stat(clickstream_path).st_mtime_ns
+                _write_meta(rules_dir, meta)
+            return analyzer
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Cached behavior state unreadable ({e}); rebuilding.")
+
+    print("Computing persona rules from the clickstream...")
+    return build(clickstream_path, rules_dir)
+
+
+if __name__ == "__main__":
+    analyzer = build()
+    print(f"Persona rules written to {config.PERSONA_RULES_DIR}/: {analyzer.get_rules()}")
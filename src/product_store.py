@@ -0,0 +1,124 @@
+"""
+Slim columnar catalog for ContentEngine. Only the fields the API serves are
+kept: numeric columns as NumPy arrays, text columns as Arrow string arrays
+(one UTF-8 buffer + offsets) read from the Parquet catalog on first use.
+Rows are gathered by position in one vectorized take per column.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Numeric column -> (dtype, fill for missing values); None keeps the stored dtype
+NUMERIC_COLUMNS = {
+    "price": (None, np.nan),
+    "cost_price": (None, np.nan),
+    "category_id": (np.int32, -1),
+    "stars": (None, np.nan),
+    "vector_id": (np.int64, -1),
+}
+TEXT_COLUMNS = ("asin", "title")
+
+
+def _numeric(values, dtype, fill) -> np.ndarray:
+    values = pd.to_numeric(pd.Series(values), errors="coerce")
+    if dtype is None:
+        return values.to_numpy()
+    return values.fillna(fill).to_numpy(dtype=dtype)
+
+
+class ProductStore:
+    def __init__(self, numeric: Dict[str, np.ndarray], text: Dict[str, pa.Array], path: Optional[str] = None,
+                 num_rows: int = 0):
+        self.numeric = numeric
+        self._text = text
+        self._path = path  # Parquet catalog the remaining text columns are read from
+        self.num_rows = num_rows
+        self._build_asin_lookup()
+
+    @classmethod
+    def from_parquet(cls, path: str) -> "ProductStore":
+        """Reads the numeric columns and ASINs now; other text columns on first access."""
+        available = set(pq.read_schema(path).names)
+        table = pq.read_table(path, columns=[c for c in NUMERIC_COLUMNS if c in available] + ["asin"],
+                              memory_map=True)
+        numeric = {
+            name: _numeric(table.column(name).to_numpy(), dtype, fill)
+            for name, (dtype, fill) in NUMERIC_COLUMNS.items() if name in available
+        }
+        text = {"asin": table.column("asin").combine_chunks()}
+        return cls(numeric, text, path, table.num_rows)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ProductStore":
+        """Builds the store from an in-memory catalog (legacy pickle)."""
+        numeric = {
+            name: _numeric(df[name].to_numpy(), dtype, fill)
+            for name, (dtype, fill) in NUMERIC_COLUMNS.items() if name in df
+        }
+        text = {name: pa.array(df[name].astype("string").fillna("").to_numpy(dtype=object), pa.string())
+                for name in TEXT_COLUMNS}
+        return cls(numeric, text, None, len(df))
+
+    def _build_asin_lookup(self):
+        # Sorted fixed-width bytes + binary search: ~14 bytes per product instead of a dict entry
+        asins = self.text("asin").to_numpy(zero_copy_only=False).astype(bytes)
+        self._asin_order = np.argsort(asins, kind="stable").astype(np.int64)
+        self._sorted_asins = asins[self._asin_order]
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    @property
+    def columns(self) -> List[str]:
+        return list(TEXT_COLUMNS) + list(self.numeric)
+
+    def column(self, name: str) -> np.ndarray:
+        """A numeric column (not copied); the fill value everywhere when the catalog lacks it."""
+        if name in self.numeric:
+            return self.numeric[name]
+        dtype, fill = NUMERIC_COLUMNS[name]
+        return np.full(self.num_rows, fill, dtype=dtype or np.float64)
+
+    def text(self, name: str) -> pa.Array:
+        if name not in self._text:
+            table = pq.read_table(self._path, columns=[name], memory_map=True)
+            self._text[name] = table.column(name).combine_chunks()
+        return self._text[name]
+
+    def positions(self, asins) -> np.ndarray:
+        """Row position of each ASIN (-1 when unknown; first row wins for duplicates)."""
+        keys = np.array([a.encode("utf-8") for a in asins], dtype=bytes)
+        if not len(keys) or not len(self._sorted_asins):
+            return np.full(len(keys), -1, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self._sorted_asins, keys), len(self._sorted_asins) - 1)
+        return np.where(self._sorted_asins[found] == keys, self._asin_order[found], -1)
+
+    def position(self, asin: str) -> int:
+        return int(self.positions([asin])[0])
+
+    def gather(self, positions: np.ndarray, columns=None) -> Dict[str, np.ndarray]:
+        """Column name -> values at `positions` (all >= 0), one take per column."""
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = columns or self.columns
+        taken = pa.array(positions, pa.int64())
+        return {
+            name: (self.numeric[name][positions] if name in self.numeric
+                   else self.text(name).take(taken).to_numpy(zero_copy_only=False))
+            for name in columns
+        }
+
+    def frame(self, positions: np.ndarray, columns=None) -> pd.DataFrame:
+        return pd.DataFrame(self.gather(positions, columns))
+
+    def records(self, positions: np.ndarray, columns=None) -> List[Dict]:
+        """One dict of plain Python values per position."""
+        gathered = self.gather(positions, columns)
+        names = list(gathered)
+        return [dict(zip(names, row)) for row in zip(*(gathered[n].tolist() for n in names))]
+
+    def nbytes(self) -> int:
+        size = sum(a.nbytes for a in self.numeric.values()) + sum(a.nbytes for a in self._text.values())
+        return size + self._asin_order.nbytes + self._sorted_asins.nbytes
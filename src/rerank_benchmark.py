@@ -0,0 +1,45 @@
+"""
+Micro-benchmark for SalesAgent.rerank against the original iterrows()
+implementation, across candidate sizes. Ordering parity is checked by
+tests/test_sales_agent.py, which holds the legacy reference.
+
+    python -m src.rerank_benchmark
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.sales_agent import SalesAgent
+from tests.test_sales_agent import BENCHMARK_RULES as RULES, legacy_rerank, make_candidates
+
+SIZES = (20, 50, 100, 500, 1000, 5000)
+
+
+def _best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(sizes=SIZES, repeats: int = 5):
+    rng = np.random.default_rng(0)
+    agent = SalesAgent(RULES)
+
+    print(f"{'n':>6} {'limit':>6} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for n in sizes:
+        candidates = make_candidates(n, rng)
+        current_price = candidates['price'].mean()
+
+        for limit in (None, 3):
+            t_old = _best_of(lambda: legacy_rerank(RULES, candidates, current_price, "Standard Shopper", limit), repeats)
+            t_new = _best_of(lambda: agent.rerank(candidates, current_price, "Standard Shopper", limit), repeats)
+            print(f"{n:>6} {str(limit):>6} {t_old * 1000:>10.3f} {t_new * 1000:>10.3f} {t_old / t_new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    run()
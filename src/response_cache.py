@@ -0,0 +1,130 @@
+"""
+Response cache for /recommend and /search. A bounded in-process LRU sits in
+front of an optional SQLite tier that all uvicorn workers share. Keys include
+the artifact build id, so a rebuilt bundle never serves stale results.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from src.config import config
+from src.cache import LRUCache
+from src.executors import run_db
+
+
+def _json_default(value):
+    # numpy scalars coming out of DataFrames (float32 prices, int64 ids)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def make_key(*parts) -> str:
+    """Stable key for a tuple of JSON-serializable parts."""
+    raw = json.dumps(parts, default=_json_default, separators=(",", ":"))
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SharedCacheTier:
+    """SQLite-backed key/value store with expiry, safe to share between processes."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._sets = 0
+        self.purge_expired()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM response_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any):
+        payload = json.dumps(value, default=_json_default)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, payload, time.time() + self.ttl_seconds)
+            )
+            self._sets += 1
+            purge = self._sets % 1000 == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """LRU tier + optional shared tier, with per-tier hit counters."""
+
+    def __init__(self, maxsize: int = None, ttl_seconds: float = None, shared_path: str = None):
+        ttl_seconds = ttl_seconds or config.RESPONSE_CACHE_TTL_SECONDS
+        shared_path = config.RESPONSE_CACHE_SHARED_PATH if shared_path is None else shared_path
+        self.local = LRUCache(maxsize or config.RESPONSE_CACHE_SIZE, ttl_seconds)
+        self.shared = SharedCacheTier(shared_path, ttl_seconds) if shared_path else None
+        self.shared_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        if self.shared is not None:
+            value = await run_db(self.shared.get, key)
+            if value is not None:
+                self.shared_hits += 1
+                self.local.set(key, value)  # Promote into the local tier
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        self.local.set(key, value)
+        if self.shared is not None:
+            await run_db(self.shared.set, key, value)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def close(self):
+        if self.shared is not None:
+            self.shared.close()
+
+    def stats(self) -> Dict[str, Any]:
+        local_hits = self.local.hits
+        total = local_hits + self.shared_hits + self.misses
+        return {
+            "local": self.local.stats(),
+            "shared_enabled": self.shared is not None,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((local_hits + self.shared_hits) / total, 4) if total else 0.0,
+        }
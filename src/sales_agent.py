@@ -1,63 +1,106 @@
+import asyncio
+from typing import AsyncIterator, Optional
+import numpy as np
 import pandas as pd
-from groq import Groq
+from groq import AsyncGroq
 from src.config import config
+from src.cache import LRUCache
 
 class SalesAgent:
     def __init__(self, persona_rules):
         self.rules = persona_rules
-        self.client = Groq(api_key=config.GROQ_API_KEY) if config.GROQ_API_KEY else None
+        self.client = AsyncGroq(
+            api_key=config.GROQ_API_KEY,
+            base_url=config.GROQ_BASE_URL or None,
+            max_retries=0,  # Retries are budgeted by _complete / _stream_completion
+        ) if config.GROQ_API_KEY else None
+        # (context asin, rec asins, persona) -> pitch text
+        self.pitch_cache = LRUCache(config.PITCH_CACHE_SIZE, config.PITCH_CACHE_TTL_SECONDS)
+        self._inflight = {}  # pitch key -> asyncio.Task, so identical requests share one LLM call
+        self.fallbacks = 0
 
-    def rerank(self, candidates: pd.DataFrame, current_price: float, persona: str, limit: int = None):
-        """Re-ranks items based on Profit, Similarity, and Constraints."""
-        scored = []
-        
-        # 1. Get Persona Constraints
+    def price_cap(self, persona: str, profile=None) -> float:
+        """Suggested price ceiling: the personal cap once the profile has enough history, else the persona's."""
+        personal_cap = profile.price_cap() if profile is not None else None
+        if personal_cap is not None:
+            return personal_cap
         p_rules = self.rules.get(persona, self.rules.get("Standard Shopper"))
-        max_price_suggestion = p_rules['max_suggested_price']
-        
-        # 2. Global Upsell Cap
-        global_cap = current_price * config.MAX_UPSELL_RATIO
-        
-        for _, row in candidates.iterrows():
-            # Constraint: Price Cap
-            if row['price'] > max(global_cap, max_price_suggestion):
-                continue
-                
-            # Calculate Profit Score
-            margin = row['price'] - row['cost_price']
-            margin_pct = (margin / row['price']) * 100
-            
-            # Normalize Profit (0-1 range, assuming 80% is max high margin)
-            norm_profit = min(margin_pct / 80.0, 1.0)
-            
-            # Calculate Similarity Score
-            norm_sim = row['similarity_score']
-            
-            # Final Weighted Score
-            final_score = (
-                (norm_sim * config.SIMILARITY_WEIGHT) + 
-                (norm_profit * config.MARGIN_WEIGHT)
-            )
-            
-            row['final_score'] = final_score
-            scored.append(row)
-            
-        # Sort by score descending
-        sorted_df = pd.DataFrame(scored).sort_values(by='final_score', ascending=False)
-        
-        # Apply Limit if provided
+        return p_rules['max_suggested_price']
+
+    def effective_price_cap(self, current_price: float, persona: str, profile=None) -> float:
+        """The ceiling rerank enforces: the larger of the global upsell cap and the persona / personal cap."""
+        return max(current_price * config.MAX_UPSELL_RATIO, self.price_cap(persona, profile))
+
+    def rerank(self, candidates: pd.DataFrame, current_price: float, persona: str, limit: int = None,
+               profile=None):
+        """
+        Re-ranks items based on Profit, Similarity, and Constraints (vectorized).
+        An optional UserProfile adds a personal price cap and a behaviour score.
+        """
+        # 1. Price cap: max(global upsell cap, persona cap); a profile with enough history overrides the persona cap
+        price_cap = self.effective_price_cap(current_price, persona, profile)
+
+        if candidates.empty:
+            return candidates.assign(final_score=pd.Series(dtype=float))
+
+        price = candidates['price'].to_numpy(dtype=float)
+        cost = candidates['cost_price'].to_numpy(dtype=float)
+        sim = candidates['similarity_score'].to_numpy(dtype=float)
+
+        # Constraint: Price Cap (NaN prices are kept, as a scalar '>' would)
+        keep = ~(price > price_cap)
+
+        # Profit Score, normalized to 0-1 assuming 80% is a max high margin
+        margin_pct = (price - cost) / price * 100
+        norm_profit = np.minimum(margin_pct / 80.0, 1.0)
+
+        # Final Weighted Score
+        final_score = (sim * config.SIMILARITY_WEIGHT) + (norm_profit * config.MARGIN_WEIGHT)
+        if profile is not None and profile.events:
+            categories = candidates['category_id'] if 'category_id' in candidates else None
+            final_score = final_score + profile.behavior_scores(price, categories) * config.BEHAVIOR_WEIGHT
+
+        positions = np.flatnonzero(keep)
+        scores = final_score[positions]
+
+        # 2. Top-k: partition first, then sort only the survivors.
+        # Ties at the cutoff are kept so the stable sort below sees all of them.
+        if limit and limit < len(positions):
+            kth = np.partition(-scores, limit - 1)[limit - 1]
+            if not np.isnan(kth):
+                top = np.flatnonzero(-scores <= kth)
+                positions, scores = positions[top], scores[top]
+
+        # Sort by score descending; stable, so ties keep candidate order
+        order = np.argsort(-scores, kind='stable')
         if limit:
-            return sorted_df.head(limit)
-        
-        return sorted_df
+            order = order[:limit]
 
-    def generate_pitch(self, context, recs, persona):
+        ranked = candidates.iloc[positions[order]].copy()
+        ranked['final_score'] = scores[order]
+        return ranked
+
+    @staticmethod
+    def pitch_key(context_asin: str, rec_asins, persona: str):
+        return (context_asin, tuple(rec_asins), persona)
+
+    def cached_pitch(self, context_asin: str, rec_asins, persona: str) -> Optional[str]:
+        return self.pitch_cache.get(self.pitch_key(context_asin, rec_asins, persona))
+
+    def inline_pitch(self, context: dict, recommendations: list, persona: str) -> Optional[str]:
+        """
+        Pitch returned with /recommend: the template pitch when no LLM is configured
+        (instant, so always inline), else the cached LLM pitch or None.
+        """
         if not self.client:
+            recs = pd.DataFrame(recommendations, columns=['asin', 'title', 'price'])
             return self._mock_pitch(context, recs, persona)
-            
+        return self.cached_pitch(context['asin'], [r['asin'] for r in recommendations], persona)
+
+    def _prompt(self, context, recs, persona) -> str:
         recs_text = "\n".join([f"- {r['title']} (${r['price']})" for _, r in recs.iterrows()])
         
-        prompt = f"""
+        return f"""
         You are a helpful Sales Executive.
         User Persona: {persona}.
         User is viewing: {context['title']} (${context['price']}).
@@ -67,18 +110,149 @@ class SalesAgent:
         
         Write a persuasive, 2-sentence pitch for these items.
         """
-        
-        try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=config.LLM_MODEL,
-                temperature=0.5
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"LLM Error: {e}")
+
+    def _fallback(self, key, context, recs, persona) -> str:
+        self.fallbacks += 1
+        pitch = self._mock_pitch(context, recs, persona)
+        self.pitch_cache.set(key, pitch, ttl_seconds=config.PITCH_FALLBACK_TTL_SECONDS)
+        return pitch
+
+    async def _complete(self, prompt: str) -> Optional[str]:
+        """One completion within PITCH_TIMEOUT_SECONDS (retries included). None on failure."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.PITCH_TIMEOUT_SECONDS
+
+        for attempt in range(config.PITCH_RETRIES + 1):
+            try:
+                response = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        messages=[{"role": "user", "content": prompt}],
+                        model=config.LLM_MODEL,
+                        temperature=0.5
+                    ),
+                    timeout=deadline - loop.time()
+                )
+                return response.choices[0].message.content
+            except asyncio.TimeoutError:
+                print(f"LLM Error: no pitch within {config.PITCH_TIMEOUT_SECONDS}s")
+                return None
+            except Exception as e:
+                print(f"LLM Error: {e}")
+                backoff = config.PITCH_RETRY_BACKOFF_SECONDS * 2 ** attempt
+                if attempt == config.PITCH_RETRIES or loop.time() + backoff >= deadline:
+                    return None
+                await asyncio.sleep(backoff)
+        return None
+
+    async def _produce_pitch(self, key, context, recs, persona) -> str:
+        pitch = await self._complete(self._prompt(context, recs, persona))
+        if pitch is None:
+            return self._fallback(key, context, recs, persona)
+        self.pitch_cache.set(key, pitch)
+        return pitch
+
+    def _start(self, key, coro) -> asyncio.Task:
+        # Detached task: a client that disconnects doesn't cancel the call for other waiters
+        task = asyncio.get_running_loop().create_task(coro)
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def generate_pitch(self, context, recs, persona):
+        """Cached pitch, else one (deduplicated) LLM call within the latency budget."""
+        if not self.client:
             return self._mock_pitch(context, recs, persona)
 
+        key = self.pitch_key(context['asin'], recs['asin'] if not recs.empty else [], persona)
+        pitch = self.pitch_cache.get(key)
+        if pitch is not None:
+            return pitch
+
+        task = self._inflight.get(key) or self._start(key, self._produce_pitch(key, context, recs, persona))
+        return await asyncio.shield(task)
+
+    async def _stream_completion(self, prompt: str) -> AsyncIterator[str]:
+        """Yields completion tokens; retries only before the first token, all within the budget."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.PITCH_TIMEOUT_SECONDS
+        started = False
+
+        for attempt in range(config.PITCH_RETRIES + 1):
+            try:
+                stream = await asyncio.wait_for(
+                    self.client.chat.completions.create(
+                        messages=[{"role": "user", "content": prompt}],
+                        model=config.LLM_MODEL,
+                        temperature=0.5,
+                        stream=True
+                    ),
+                    timeout=deadline - loop.time()
+                )
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline - loop.time())
+                    except StopAsyncIteration:
+                        return
+                    text = chunk.choices[0].delta.content if chunk.choices else None
+                    if text:
+                        started = True
+                        yield text
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                backoff = config.PITCH_RETRY_BACKOFF_SECONDS * 2 ** attempt
+                if started or attempt == config.PITCH_RETRIES or loop.time() + backoff >= deadline:
+                    raise
+                print(f"LLM Error: {e}; retrying")
+                await asyncio.sleep(backoff)
+
+    async def _produce_streamed(self, key, context, recs, persona, queue: asyncio.Queue) -> str:
+        """Streams tokens into `queue` (None terminates) and caches the finished pitch."""
+        parts = []
+        try:
+            try:
+                async for text in self._stream_completion(self._prompt(context, recs, persona)):
+                    parts.append(text)
+                    queue.put_nowait(text)
+            except Exception as e:  # Includes asyncio.TimeoutError
+                print(f"LLM Error: {str(e) or type(e).__name__}")
+                if parts:
+                    return "".join(parts)  # Partial pitch: already shown, but not cached
+
+            if not parts:
+                pitch = self._fallback(key, context, recs, persona)
+                queue.put_nowait(pitch)
+                return pitch
+            pitch = "".join(parts)
+            self.pitch_cache.set(key, pitch)
+            return pitch
+        finally:
+            queue.put_nowait(None)
+
+    async def stream_pitch(self, context, recs, persona) -> AsyncIterator[str]:
+        """
+        Yields the pitch in pieces: a cached or in-flight pitch at once, otherwise
+        tokens as the LLM produces them. Falls back to _mock_pitch on errors or
+        when the budget runs out before the first token.
+        """
+        key = self.pitch_key(context['asin'], recs['asin'] if not recs.empty else [], persona)
+        pitch = self.pitch_cache.get(key)
+        if pitch is not None:
+            yield pitch
+            return
+        if not self.client:
+            yield self._mock_pitch(context, recs, persona)
+            return
+        if key in self._inflight:
+            yield await asyncio.shield(self._inflight[key])
+            return
+
+        queue = asyncio.Queue()
+        self._start(key, self._produce_streamed(key, context, recs, persona, queue))
+        while (text := await queue.get()) is not None:
+            yield text
+
     def _mock_pitch(self, context, recs, persona):
         if recs.empty:
             return "I'm looking for the best options for you right now."
@@ -0,0 +1,49 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Paths whose first request after boot is timed (the ones that pay for cold caches / the model)
+FIRST_REQUEST_PATHS = ("/search", "/recommend", "/pitch", "/pitch/stream")
+
+
+class StartupTracker:
+    """Stage timings of the staged startup, readiness, and first-request latencies."""
+
+    def __init__(self, started_at: Optional[float] = None):
+        self.started_at = started_at or time.perf_counter()
+        self.stages: Dict[str, float] = {}  # stage -> seconds
+        self.ready_after: Optional[float] = None  # seconds from started_at
+        self.error: Optional[str] = None
+        self.first_requests: Dict[str, float] = {}  # path -> milliseconds
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = round(time.perf_counter() - start, 3)
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+    def mark_ready(self):
+        self.ready_after = round(time.perf_counter() - self.started_at, 3)
+
+    def fail(self, error: Exception):
+        self.error = f"{type(error).__name__}: {error}"
+
+    def record_request(self, path: str, elapsed_ms: float):
+        if path in FIRST_REQUEST_PATHS and path not in self.first_requests:
+            self.first_requests[path] = round(elapsed_ms, 1)
+
+    def report(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "ready_after_seconds": self.ready_after,
+            "uptime_seconds": round(time.perf_counter() - self.started_at, 3),
+            "stages": self.stages,
+            "first_request_ms": self.first_requests,
+            "error": self.error,
+        }
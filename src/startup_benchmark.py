@@ -0,0 +1,112 @@
+"""
+Startup latency report: boots the API in a subprocess and measures time until
+the port answers (/healthz), time until it is ready (/readyz), and the latency
+of the first and repeated /search requests. The server's own stage timings
+(from /readyz) are included. Run from the repo root:
+
+    python -m src.startup_benchmark --query "wireless headphones"
+    python -m src.startup_benchmark --no-preload   # model loaded on demand
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+REPORT_FILE = "startup_report.json"
+
+
+def _request(url: str, body: dict = None, timeout: float = 120.0):
+    """(status, parsed JSON or None). Connection errors return status 0."""
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return 0, None
+
+
+def _wait_for(url: str, started: float, timeout: float) -> float:
+    """Seconds from `started` until `url` answers 200."""
+    while time.perf_counter() - started < timeout:
+        status, _ = _request(url, timeout=5)
+        if status == 200:
+            return round(time.perf_counter() - started, 3)
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def _timed_search(base_url: str, query: str):
+    start = time.perf_counter()
+    status, data = _request(f"{base_url}/search", {"query": query})
+    return {
+        "status": status,
+        "ms": round((time.perf_counter() - start) * 1000, 1),
+        "search_mode": (data or {}).get("search_mode"),
+    }
+
+
+def run_report(query: str, port: int = 8799, preload: bool = True, timeout: float = 600.0,
+               wait_for_model: bool = True) -> dict:
+    env = {**os.environ, "PRELOAD_MODEL": "true" if preload else "false"}
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api:app", "--port", str(port)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        # 1. Process start -> port answers -> search ready
+        live = _wait_for(f"{base_url}/healthz", started, timeout)
+        ready = _wait_for(f"{base_url}/readyz", started, timeout)
+        print(f"   live after {live}s, ready after {ready}s")
+
+        # 2. First request right at readiness (model may still be loading)
+        first = _timed_search(base_url, query)
+        print(f"   first /search: {first}")
+
+        # 3. Once the model is in: a new query, then a repeat (query / response caches)
+        if wait_for_model:
+            while time.perf_counter() - started < timeout:
+                _, readiness = _request(f"{base_url}/readyz")
+                if readiness and readiness.get("model_loaded"):
+                    break
+                time.sleep(0.1)
+        new_query = _timed_search(base_url, query + " review")
+        repeat = _timed_search(base_url, query + " review")
+        _, server_report = _request(f"{base_url}/readyz")
+
+        return {
+            "preload_model": preload,
+            "query": query,
+            "live_seconds": live,
+            "ready_seconds": ready,
+            "first_search": first,
+            "warm_search": new_query,
+            "repeat_search": repeat,
+            "server": server_report,
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup time and first-request latency report.")
+    parser.add_argument("--query", default="wireless headphones")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--no-preload", action="store_true", help="Boot with PRELOAD_MODEL=false")
+    parser.add_argument("--out", default=REPORT_FILE)
+    args = parser.parse_args()
+
+    print(f"Booting the API (PRELOAD_MODEL={not args.no_preload})...")
+    report = run_report(args.query, port=args.port, preload=not args.no_preload)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.out}")
@@ -0,0 +1,130 @@
+import json
+import math
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from src.config import config
+from src.cache import LRUCache
+from src import db
+
+
+class UserProfile:
+    """
+    Online profile of one user: weighted running price statistics (Welford)
+    and category affinity. Each observed cart add / purchase is O(1).
+    """
+
+    def __init__(self, user_id: int, events: int = 0, weight: float = 0.0, price_mean: float = 0.0,
+                 price_m2: float = 0.0, categories: Optional[Dict[int, float]] = None, version: int = 0):
+        self.user_id = user_id
+        self.events = events
+        self.weight = weight
+        self.price_mean = price_mean
+        self.price_m2 = price_m2
+        self.categories = categories or {}  # category_id -> accumulated weight
+        self.version = version
+
+    def observe(self, price: float, category_id, weight: float = 1.0):
+        if price is None or not math.isfinite(price) or price <= 0:
+            return
+        # Weighted Welford update
+        self.weight += weight
+        delta = price - self.price_mean
+        self.price_mean += weight / self.weight * delta
+        self.price_m2 += weight * delta * (price - self.price_mean)
+
+        if category_id is not None and not (isinstance(category_id, float) and math.isnan(category_id)):
+            key = int(category_id)
+            self.categories[key] = self.categories.get(key, 0.0) + weight
+
+        self.events += 1
+        self.version += 1
+
+    @property
+    def price_std(self) -> float:
+        return math.sqrt(self.price_m2 / self.weight) if self.weight else 0.0
+
+    def price_cap(self) -> Optional[float]:
+        """Personal upper price bound, once there is enough history to trust it."""
+        if self.events < config.PROFILE_MIN_EVENTS:
+            return None
+        return self.price_mean + config.PROFILE_CAP_STDS * self.price_std
+
+    def behavior_scores(self, prices: np.ndarray, category_ids: Optional[Iterable] = None) -> np.ndarray:
+        """0-1 score per candidate: closeness to the user's usual price plus category affinity."""
+        prices = np.asarray(prices, dtype=float)
+        if not self.events:
+            return np.zeros(len(prices))
+
+        # Floor the spread so a single observed price doesn't reject everything else
+        std = max(self.price_std, 0.1 * self.price_mean, 1e-6)
+        price_fit = np.exp(-0.5 * ((prices - self.price_mean) / std) ** 2)
+        if category_ids is None or not self.categories:
+            return price_fit
+
+        top = max(self.categories.values())
+        affinity = np.array([
+            self.categories.get(int(c), 0.0) / top if c == c else 0.0  # c != c for NaN
+            for c in category_ids
+        ])
+        return 0.5 * price_fit + 0.5 * affinity
+
+    def to_row(self) -> Dict:
+        return {
+            "user_id": self.user_id,
+            "events": self.events,
+            "weight": self.weight,
+            "price_mean": self.price_mean,
+            "price_m2": self.price_m2,
+            "categories": json.dumps(self.categories),
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict) -> "UserProfile":
+        return cls(
+            user_id=row["user_id"],
+            events=row["events"],
+            weight=row["weight"],
+            price_mean=row["price_mean"],
+            price_m2=row["price_m2"],
+            categories={int(k): v for k, v in json.loads(row["categories"]).items()},
+            version=row["version"],
+        )
+
+    def summary(self) -> Dict:
+        return {
+            "events": self.events,
+            "price_mean": round(self.price_mean, 2),
+            "price_std": round(self.price_std, 2),
+            "price_cap": self.price_cap(),
+            "top_categories": sorted(self.categories, key=self.categories.get, reverse=True)[:5],
+            "version": self.version,
+        }
+
+
+class UserProfileStore:
+    """In-memory LRU of UserProfiles, written through to SQLite on every update."""
+
+    def __init__(self, maxsize: int = None):
+        self.cache = LRUCache(maxsize or config.PROFILE_CACHE_SIZE)
+        self._lock = threading.Lock()  # Serializes read-modify-write of a profile
+
+    def get(self, user_id: int) -> UserProfile:
+        profile = self.cache.get(user_id)
+        if profile is None:
+            row = db.get_user_profile(user_id)
+            profile = UserProfile.from_row(row) if row else UserProfile(user_id)
+            self.cache.set(user_id, profile)
+        return profile
+
+    def record(self, user_id: int, items: Iterable[Tuple[float, int]], weight: float = 1.0) -> UserProfile:
+        """Folds (price, category_id) pairs into the user's profile and persists it."""
+        with self._lock:
+            profile = self.get(user_id)
+            for price, category_id in items:
+                profile.observe(price, category_id, weight)
+            db.save_user_profile(profile.to_row())
+        return profile
@@ -0,0 +1,258 @@
+import math
+import numpy as np
+import faiss
+from src.config import config
+
+# Supported values for Settings.INDEX_TYPE
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Settings.VECTOR_DTYPE -> FAISS storage for the vectors (IndexScalarQuantizer for fp16 / int8)
+VECTOR_CODES = {"float32": "Flat", "float16": "SQfp16", "int8": "SQ8"}
+
+
+def _default_nlist(n_vectors: int) -> int:
+    # Usual FAISS guidance: ~4*sqrt(N) lists, while keeping >= 39 training points per list
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def factory_string(index_type: str, n_vectors: int, dim: int, vector_dtype: str = None) -> str:
+    """Translates Settings.INDEX_TYPE / VECTOR_DTYPE values into a faiss.index_factory description."""
+    nlist = config.IVF_NLIST or _default_nlist(n_vectors)
+    vector_dtype = vector_dtype or config.VECTOR_DTYPE
+    if vector_dtype not in VECTOR_CODES:
+        raise ValueError(f"Unknown VECTOR_DTYPE '{vector_dtype}'. Expected one of {tuple(VECTOR_CODES)}.")
+    codes = VECTOR_CODES[vector_dtype]
+
+    if index_type == "flat":
+        return codes
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},{codes}"
+    if index_type == "ivf_pq":
+        if dim % config.PQ_M != 0:
+            raise ValueError(f"PQ_M={config.PQ_M} must divide the embedding dimension ({dim}).")
+        return f"IVF{nlist},PQ{config.PQ_M}"
+    if index_type == "hnsw":
+        return f"HNSW{config.HNSW_M},{codes}"
+
+    raise ValueError(f"Unknown INDEX_TYPE '{index_type}'. Expected one of {INDEX_TYPES}.")
+
+
+def build_index(embeddings: np.ndarray, index_type: str = None, ids: np.ndarray = None, vector_dtype: str = None):
+    """
+    Builds, trains and fills an inner-product index over L2-normalized embeddings.
+    With `ids`, searches return those stable vector ids, which lets incremental
+    builds add/remove rows in place. IVF indexes store the ids in their inverted
+    lists; the others are wrapped in IndexIDMap2.
+    """
+    index_type = index_type or config.INDEX_TYPE
+    n, d = embeddings.shape
+    description = factory_string(index_type, n, d, vector_dtype)
+
+    index = faiss.index_factory(d, description, faiss.METRIC_INNER_PRODUCT)
+
+    if index_type == "hnsw":
+        faiss.downcast_index(index).hnsw.efConstruction = config.HNSW_EF_CONSTRUCTION
+
+    if not index.is_trained:
+        # Train on a random sample; k-means cost grows with the training set size
+        rng = np.random.default_rng(0)
+        sample_size = min(n, config.INDEX_TRAIN_SAMPLE)
+        sample = embeddings[np.sort(rng.choice(n, sample_size, replace=False))]
+        index.train(np.ascontiguousarray(sample, dtype=np.float32))
+
+    if ids is not None:
+        # IDMap2 over IVF breaks on remove_ids: IVF keeps its internal ids while the id map is compacted
+        if not is_ivf(index):
+            index = faiss.IndexIDMap2(index)
+        index.add_with_ids(np.ascontiguousarray(embeddings, dtype=np.float32), np.asarray(ids, dtype=np.int64))
+    else:
+        index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+    apply_search_params(index)
+    return index
+
+
+def positions_lookup(vector_ids: np.ndarray) -> np.ndarray:
+    """Dense vector_id -> row position array (-1 for ids not in the catalog)."""
+    vector_ids = np.asarray(vector_ids, dtype=np.int64)
+    lookup = np.full(int(vector_ids.max()) + 2 if len(vector_ids) else 1, -1, dtype=np.int64)
+    lookup[vector_ids] = np.arange(len(vector_ids))
+    return lookup
+
+
+def to_positions(indices: np.ndarray, lookup: np.ndarray) -> np.ndarray:
+    """Maps ids returned by index.search to row positions, keeping -1 padding."""
+    if lookup is None:
+        return indices
+    safe = np.clip(indices, -1, len(lookup) - 1)  # Last slot is always -1
+    return lookup[safe]
+
+
+def is_ivf(index) -> bool:
+    return isinstance(faiss.downcast_index(index), faiss.IndexIVF)
+
+
+def is_id_mapped(index) -> bool:
+    """True when searches return stable vector ids (IndexIDMap / IndexIDMap2 / IVF) rather than row positions."""
+    return isinstance(faiss.downcast_index(index), (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexIVF))
+
+
+def supports_remove(index) -> bool:
+    """
+    True when remove_ids keeps every remaining vector's id intact: IVF on its own,
+    or IndexIDMap2 over flat storage (which compacts in step with the id map).
+    """
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return True
+    if isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+        return isinstance(inner, (faiss.IndexFlat, faiss.IndexScalarQuantizer))
+    return False
+
+
+def _inner_index(index):
+    """Unwraps IDMap-style wrappers down to the index holding nprobe / hnsw."""
+    inner = faiss.downcast_index(index)
+    while hasattr(inner, "index") and not hasattr(inner, "hnsw") and not hasattr(inner, "nprobe"):
+        inner = faiss.downcast_index(inner.index)
+    return inner
+
+
+def apply_search_params(index, nprobe: int = None, ef_search: int = None):
+    """Sets query-time knobs (nprobe for IVF, efSearch for HNSW). No-op for flat indexes."""
+    nprobe = nprobe or config.IVF_NPROBE
+    ef_search = ef_search or config.HNSW_EF_SEARCH
+
+    inner = _inner_index(index)
+    if hasattr(inner, "nprobe"):
+        inner.nprobe = nprobe
+    if hasattr(inner, "hnsw"):
+        inner.hnsw.efSearch = ef_search
+
+
+def id_selector(ids: np.ndarray, id_space: int):
+    """
+    IDSelectorBitmap accepting `ids` out of [0, id_space). Returns (selector, bitmap):
+    FAISS only borrows the bitmap, so keep it referenced while searching.
+    """
+    bits = np.zeros(id_space, dtype=bool)
+    bits[ids] = True
+    bitmap = np.packbits(bits, bitorder="little")
+    return faiss.IDSelectorBitmap(id_space, faiss.swig_ptr(bitmap)), bitmap
+
+
+def selector_params(index, selector, widen: int = 1):
+    """
+    SearchParameters restricting a search to `selector`. IVF / HNSW need their own
+    parameter classes, which also carry nprobe / efSearch (scaled by `widen`).
+    """
+    inner = _inner_index(index)
+    if hasattr(inner, "nprobe"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=min(inner.nprobe * widen, inner.nlist))
+    if hasattr(inner, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch * widen)
+    return faiss.SearchParameters(sel=selector)
+
+
+def exact_search(queries: np.ndarray, rows: np.ndarray, embeddings: np.ndarray, k: int):
+    """Brute-force top-k over a subset of rows. Returns (distances, positions), -1 padded to k."""
+    vectors = np.asarray(embeddings[rows], dtype=np.float32)
+    scores = np.asarray(queries, dtype=np.float32) @ vectors.T
+
+    top = min(k, len(rows))
+    distances = np.zeros((len(queries), k), dtype=np.float32)
+    positions = np.full((len(queries), k), -1, dtype=np.int64)
+    if top:
+        best = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+        order = np.take_along_axis(best, np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1, kind="stable"), axis=1)
+        distances[:, :top] = np.take_along_axis(scores, order, axis=1)
+        positions[:, :top] = rows[order]
+    return distances, positions
+
+
+def rescore(queries: np.ndarray, positions: np.ndarray, embeddings: np.ndarray, k: int):
+    """
+    Re-ranks candidate rows (-1 = padding) by their exact inner product with the
+    float32 embeddings. Returns the top-k (distances, positions), -1 padded.
+    """
+    safe = np.where(positions >= 0, positions, 0)
+    # Only the candidate rows are read, so mmap'd embeddings stay mostly on disk
+    vectors = np.asarray(embeddings[safe.ravel()], dtype=np.float32).reshape(*positions.shape, -1)
+    scores = np.einsum("qd,qcd->qc", np.asarray(queries, dtype=np.float32), vectors)
+    scores[positions < 0] = -np.inf
+
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    distances = np.take_along_axis(scores, order, axis=1)
+    positions = np.take_along_axis(positions, order, axis=1)
+    distances[positions < 0] = 0
+    return distances, positions
+
+
+def search(index, queries: np.ndarray, k: int, lookup: np.ndarray = None, embeddings: np.ndarray = None,
+           rescore_factor: int = None, params=None):
+    """
+    index.search returning row positions. With a rescore factor (and the float32
+    embeddings), k*factor candidates are fetched from the compressed index and
+    re-ranked exactly, which recovers most of the recall lost to quantization.
+    """
+    rescore_factor = config.RESCORE_FACTOR if rescore_factor is None else rescore_factor
+    if embeddings is None or rescore_factor < 1:
+        distances, indices = index.search(queries, k, params=params)
+        return distances, to_positions(indices, lookup)
+
+    _, indices = index.search(queries, k * rescore_factor, params=params)
+    return rescore(queries, to_positions(indices, lookup), embeddings, k)
+
+
+def filtered_search(index, queries: np.ndarray, k: int, allowed: np.ndarray, lookup: np.ndarray = None,
+                    embeddings: np.ndarray = None, row_ids: np.ndarray = None, rescore_factor: int = None):
+    """
+    Top-k among the rows where the boolean mask `allowed` is set. Small subsets
+    are scored exactly; otherwise the index is searched with an IDSelector, and
+    nprobe / efSearch are doubled while any query comes back short of k hits.
+    `row_ids` are the vector ids of each row when the index is ID-mapped.
+    """
+    rows = np.flatnonzero(allowed)
+    if embeddings is not None and len(rows) <= config.FILTER_EXACT_MAX_ROWS:
+        return exact_search(queries, rows, embeddings, k)
+
+    ids = rows if row_ids is None else row_ids[rows]
+    selector, bitmap = id_selector(ids, len(lookup) if lookup is not None else len(allowed))  # Keep bitmap alive
+    wanted = min(k, len(rows))
+    for attempt in range(config.FILTER_MAX_EXPANSIONS + 1):
+        params = selector_params(index, selector, widen=2 ** attempt)
+        distances, positions = search(index, queries, k, lookup, embeddings, rescore_factor, params)
+        if ((positions >= 0).sum(axis=1) >= wanted).all():
+            break
+    return distances, positions
+
+
+def compute_neighbours(index, embeddings: np.ndarray, k: int, batch_size: int = 4096, row_ids: np.ndarray = None,
+                       rows: np.ndarray = None):
+    """
+    Top-k neighbours of every row (excluding itself), searched in batches; only
+    of `rows` when given. `row_ids` are the vector ids of each row when the index
+    is ID-mapped. Returns (row positions int32, scores float16), both shaped
+    (len(rows) or N, k); missing slots are -1 / 0.
+    """
+    rows = np.arange(len(embeddings)) if rows is None else np.asarray(rows, dtype=np.int64)
+    n = len(rows)
+    lookup = positions_lookup(row_ids) if row_ids is not None else None
+    ids = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float16)
+
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        batch = np.ascontiguousarray(embeddings[rows[start:stop]], dtype=np.float32)
+        distances, indices = search(index, batch, k + 1, lookup, embeddings)
+
+        # Move each row's own id to the end (stable, so ranking is kept), then drop the extra column
+        order = np.argsort(indices == rows[start:stop, None], axis=1, kind="stable")[:, :k]
+        ids[start:stop] = np.take_along_axis(indices, order, axis=1)
+        scores[start:stop] = np.take_along_axis(distances, order, axis=1)
+
+        print(f"   neighbours {stop}/{n}", end="\r")
+    print()
+
+    scores[ids < 0] = 0
+    return ids, scores
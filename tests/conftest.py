@@ -0,0 +1,91 @@
+import hashlib
+import os
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The API resolves templates/static relative to the repo root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from src import db, generate_artifacts
+from src.config import config
+from src.data_loader import DataLoader
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    """A fresh, migrated SQLite database behind the module-level pool."""
+    test_pool = db.ConnectionPool(str(tmp_path / "test.db"), size=4)
+    monkeypatch.setattr(db, "_pool", test_pool)
+    db.init_db()
+    yield test_pool
+    test_pool.close_all()
+
+
+@pytest.fixture
+def user_id(pool):
+    return db.create_user_secure("shopper@example.com", "secret", "Standard Shopper")["id"]
+
+
+DIM = 16
+
+
+def _encode(texts):
+    """Deterministic stand-in for the embedding pipeline: one normalized random vector per text."""
+    vectors = np.stack([
+        np.random.default_rng(int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=8).digest(), "little"))
+        .standard_normal(DIM) for t in texts
+    ]).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+_encode.work_path = "unused.npy"
+
+
+def _catalog(asins, titles=None):
+    titles = titles or {}
+    return pd.DataFrame({
+        "asin": asins,
+        "title": [titles.get(asin, f"Product {asin}") for asin in asins],
+        "category_name": "Electronics",
+        "category_id": 1,
+        "price": np.linspace(10, 100, len(asins)),
+        "cost_price": np.linspace(7, 70, len(asins)),
+        "stars": 4.0,
+        "quality_score": 0.8,
+    })
+
+
+@pytest.fixture
+def build(tmp_path, monkeypatch):
+    """Runs generate_artifacts.generate() on a given catalog, with the encoder stubbed out."""
+    monkeypatch.chdir(tmp_path)  # startups_data.pkl is written to (and read from) the cwd
+    monkeypatch.setattr(config, "ARTIFACTS_DIR", str(tmp_path / "artifacts"))
+    monkeypatch.setattr(config, "BUILD_WORK_DIR", str(tmp_path / ".build"))
+    monkeypatch.setattr(config, "CLICKSTREAM_PATH", str(tmp_path / "no_clickstream.csv"))
+    monkeypatch.setattr(config, "INDEX_TYPE", "flat")
+    monkeypatch.setattr(config, "VECTOR_DTYPE", "float32")
+    monkeypatch.setattr(config, "NEIGHBOUR_K", 5)
+    monkeypatch.setattr(generate_artifacts, "_encoder", lambda: _encode)
+
+    def run(asins, incremental=False, titles=None):
+        monkeypatch.setattr(DataLoader, "load_amazon_catalog", staticmethod(lambda: _catalog(asins, titles)))
+        generate_artifacts.generate(write_pickle=True, incremental=incremental)
+
+    return run
+
+
+@pytest.fixture
+def engine(build):
+    """A ContentEngine over a 100-product flat bundle, with the stub encoder as its model."""
+    from src.content_engine import ContentEngine
+
+    build([f"A{i:04d}" for i in range(100)])
+    content_engine = ContentEngine()
+    content_engine.model = types.SimpleNamespace(encode=_encode)
+    return content_engine
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from src.config import config
+from src.content_engine import ContentEngine
+
+
+def _self_query_hits(engine):
+    """Rows whose own embedding finds them as the top hit."""
+    _, positions = engine._search(np.asarray(engine.embeddings, dtype=np.float32), k=1)
+    return int((positions[:, 0] == np.arange(len(engine.products))).sum())
+
+
+def test_pickle_after_delta_build_maps_ids_to_rows(build, tmp_path, monkeypatch):
+    asins = [f"A{i:04d}" for i in range(200)]
+    build(asins)
+    # Delete every third product and add a few: vector_id now has gaps and no longer equals the row
+    build([a for i, a in enumerate(asins) if i % 3] + [f"N{i:04d}" for i in range(10)], incremental=True)
+
+    bundle_engine = ContentEngine()
+    monkeypatch.setattr(config, "ARTIFACTS_DIR", str(tmp_path / "missing"))
+    pickle_engine = ContentEngine()  # No bundle: falls back to startups_data.pkl
+
+    assert pickle_engine.manifest == {}
+    assert not np.array_equal(pickle_engine.products.column("vector_id"), np.arange(len(pickle_engine.products)))
+    assert _self_query_hits(pickle_engine) == len(pickle_engine.products)
+    assert _self_query_hits(bundle_engine) == len(bundle_engine.products)
+
+    # /recommend's live fallback returns the true nearest products of a new row
+    pos = pickle_engine.get_position("N0003")
+    similarity = pickle_engine.embeddings @ pickle_engine.embeddings[pos]
+    similarity[pos] = -np.inf
+    expected = pickle_engine.products.records(np.argsort(-similarity)[:3], columns=["asin"])
+    results = pickle_engine.search_by_asin("N0003", k=3)
+    assert results["asin"].tolist() == [r["asin"] for r in expected]
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "ivf_pq", "hnsw"])
+def test_delta_build_with_deletions_keeps_labels(build, monkeypatch, index_type):
+    monkeypatch.setattr(config, "INDEX_TYPE", index_type)
+    monkeypatch.setattr(config, "PQ_M", 8)  # Must divide DIM
+    asins = [f"A{i:04d}" for i in range(400)]
+    build(asins)
+    build([a for i, a in enumerate(asins) if i % 7] + [f"N{i:04d}" for i in range(20)], incremental=True)
+
+    engine = ContentEngine()
+    hit_rate = _self_query_hits(engine) / len(engine.products)
+    # Exact storage finds every row; PQ codes / HNSW graphs are approximate
+    assert hit_rate >= (1.0 if index_type in ("flat", "ivf_flat") else 0.9)
+
+
+def test_idmap_wrapped_ivf_is_not_patched_in_place():
+    import faiss
+
+    from src import vector_index
+
+    vectors = np.random.default_rng(0).standard_normal((200, 16)).astype(np.float32)
+    ivf = faiss.index_factory(16, "IVF4,Flat", faiss.METRIC_INNER_PRODUCT)
+    ivf.train(vectors)
+    assert vector_index.supports_remove(ivf)
+    assert not vector_index.supports_remove(faiss.IndexIDMap2(ivf))  # Bundles built before IVF kept its own ids
+    assert vector_index.supports_remove(faiss.IndexIDMap2(faiss.IndexFlatIP(16)))
+    assert not vector_index.supports_remove(faiss.IndexIDMap2(faiss.IndexHNSWFlat(16, 8)))
+
+
+def test_delta_neighbours_and_postings_match_a_full_rebuild(build, tmp_path, monkeypatch):
+    from src import artifacts
+
+    asins = [f"A{i:04d}" for i in range(300)]
+    build(asins)
+    delta_asins = [a for i, a in enumerate(asins) if i % 5] + [f"N{i:04d}" for i in range(15)]
+    titles = {"A0001": "Wireless headphones WH-1000XM4", "A0002": "Desk lamp", "N0000": "Yoga mat"}
+    build(delta_asins, incremental=True, titles=titles)
+    delta_dir = str(tmp_path / "delta")
+    (tmp_path / "artifacts").rename(delta_dir)
+
+    build(delta_asins, titles=titles)  # Full rebuild of the same catalog
+    full_dir = str(tmp_path / "artifacts")
+
+    delta_ids, delta_scores = artifacts.load_neighbours(delta_dir)
+    full_ids, full_scores = artifacts.load_neighbours(full_dir)
+    np.testing.assert_array_equal(delta_ids, full_ids)
+    np.testing.assert_allclose(delta_scores.astype(np.float32), full_scores.astype(np.float32), atol=1e-3)
+
+    delta_lexical, full_lexical = artifacts.load_lexical(delta_dir), artifacts.load_lexical(full_dir)
+    for name in ("terms", "offsets", "doc_ids", "impacts", "tf", "lengths"):
+        np.testing.assert_array_equal(getattr(delta_lexical, name), getattr(full_lexical, name))
+    assert delta_lexical.search(["wh1000xm4 headphones"], 3)[1][0][0] == delta_asins.index("A0001")
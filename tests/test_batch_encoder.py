@@ -0,0 +1,77 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.batch_encoder import BatchEncoder
+from src.config import config
+
+QUERIES = ["desk lamp", "yoga mat", "headphones", "coffee grinder", "usb cable"]
+
+
+@pytest.fixture
+def calls(engine, monkeypatch):
+    """Records each search_vectors_for_texts call as (queries, k)."""
+    monkeypatch.setattr(config, "SEARCH_MODE", "semantic")
+    recorded = []
+    search = engine.search_vectors_for_texts
+
+    def recording_search(queries, k, filters=None):
+        recorded.append((list(queries), k))
+        return search(queries, k, filters)
+
+    monkeypatch.setattr(engine, "search_vectors_for_texts", recording_search)
+    return recorded
+
+
+def _search_all(encoder, requests):
+    async def run():
+        return await asyncio.gather(*(encoder.search(query, k) for query, k in requests), return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_concurrent_searches_share_one_call(engine, calls):
+    encoder = BatchEncoder(engine, max_batch_size=32, max_wait_ms=50)
+    requests = list(zip(QUERIES, [1, 3, 5, 2, 4]))
+
+    results = _search_all(encoder, requests)
+
+    assert calls == [(QUERIES, 5)]
+    assert encoder.stats()["batches"] == 1 and encoder.stats()["queries"] == len(QUERIES)
+    for (query, k), (distances, positions) in zip(requests, results):
+        expected_distances, expected_positions = engine.search_vectors_for_texts([query], k)
+        assert len(positions) == k
+        np.testing.assert_array_equal(positions, expected_positions[0])
+        np.testing.assert_allclose(distances, expected_distances[0], rtol=1e-6)
+
+
+def test_batches_are_capped_at_max_batch_size(engine, calls):
+    encoder = BatchEncoder(engine, max_batch_size=2, max_wait_ms=50)
+
+    results = _search_all(encoder, [(query, 3) for query in QUERIES])
+
+    assert [len(queries) for queries, _ in calls] == [2, 2, 1]
+    assert [query for queries, _ in calls for query in queries] == QUERIES
+    assert all(len(positions) == 3 for _, positions in results)
+
+
+def test_executor_error_reaches_every_caller(engine, calls, monkeypatch):
+    def failing_search(queries, k, filters=None):
+        calls.append((list(queries), k))
+        raise RuntimeError("index unavailable")
+
+    search = engine.search_vectors_for_texts
+    monkeypatch.setattr(engine, "search_vectors_for_texts", failing_search)
+    encoder = BatchEncoder(engine, max_batch_size=32, max_wait_ms=50)
+
+    async def run():
+        failed = await asyncio.gather(*(encoder.search(query, 3) for query in QUERIES), return_exceptions=True)
+        monkeypatch.setattr(engine, "search_vectors_for_texts", search)
+        recovered = await encoder.search("desk lamp", 3)  # The worker keeps serving after a failed batch
+        return failed, recovered
+
+    failed, (_, positions) = asyncio.run(run())
+
+    assert calls == [(QUERIES, 3), (["desk lamp"], 3)]
+    assert all(isinstance(e, RuntimeError) and str(e) == "index unavailable" for e in failed)
+    assert len(positions) == 3
@@ -0,0 +1,74 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src.behavior_analyzer import MAX_CATEGORY_ID, BehaviorAnalyzer
+
+
+def _event(session_id, order, price, category):
+    return {"session_id": session_id, "order": order, "price": price, "page_1_main_category": category}
+
+
+def test_distinct_categories_up_to_the_highest_bit():
+    analyzer = BehaviorAnalyzer()
+    analyzer.update([_event(1, 1, 10.0, 0), _event(1, 2, 20.0, MAX_CATEGORY_ID), _event(1, 3, 30.0, MAX_CATEGORY_ID)])
+
+    stats = analyzer.session_stats()
+    assert stats["distinct_cats"].tolist() == [2]
+    assert analyzer.category_mask[0] > 0
+
+
+@pytest.mark.parametrize("category", [-1, MAX_CATEGORY_ID + 1, 64, 1000])
+def test_out_of_range_category_is_rejected(category):
+    analyzer = BehaviorAnalyzer()
+    with pytest.raises(ValueError):
+        analyzer.update([_event(1, 1, 10.0, category)])
+    assert analyzer.events_seen == 0
+
+
+@pytest.mark.parametrize("category", [-1, MAX_CATEGORY_ID + 1])
+def test_events_endpoint_validates_category(category):
+    response = TestClient(api.app).post("/events", json={"events": [_event(1, 1, 10.0, category)]})
+    assert response.status_code == 422
+
+
+CLICKSTREAM_HEADER = "year;month;day;order;country;session ID;page 1 (main category);page 2 (clothing model);colour;location;model photography;price;price 2;page\n"
+
+
+def test_events_are_serialized_and_persisted(tmp_path, monkeypatch):
+    import asyncio
+
+    import httpx
+
+    from src import persona_rules
+    from src.config import config
+    from src.sales_agent import SalesAgent
+
+    clickstream = tmp_path / "clickstream.csv"
+    clickstream.write_text(CLICKSTREAM_HEADER + "".join(
+        f"2008;4;1;{order};29;{session};{1 + session % 4};A13;1;5;1;{20 + session * 3};2;1\n"
+        for session in range(1, 41) for order in (1, 2)
+    ))
+    rules_dir = str(tmp_path / "persona")
+    monkeypatch.setattr(config, "PERSONA_RULES_DIR", rules_dir)
+    analyzer = persona_rules.load_or_build(str(clickstream), rules_dir)
+    monkeypatch.setattr(api, "behavior_analyzer", analyzer)
+    monkeypatch.setattr(api, "sales_agent", SalesAgent(analyzer.get_rules()))
+
+    async def post_concurrently():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/events", json={"events": [_event(1000 + i, 1, 400.0, 2), _event(1000 + i, 2, 420.0, 3)]})
+                for i in range(20)
+            ))
+
+    responses = asyncio.run(post_concurrently())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert analyzer.events_seen == 80 + 40 and analyzer.sessions == 60
+    assert api.sales_agent.rules == analyzer.get_rules()
+
+    # A restart with the same clickstream file keeps the online events
+    restored = persona_rules.load_or_build(str(clickstream), rules_dir)
+    assert restored.events_seen == 120 and restored.get_rules() == analyzer.get_rules()
@@ -0,0 +1,97 @@
+import types
+
+import numpy as np
+import pytest
+
+from src import cache
+from src.cache import LRUCache, load_warm_set, normalize_query, save_warm_set
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A hand-driven monotonic clock for TTL tests."""
+    now = types.SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_ttl_expiry(clock):
+    lru = LRUCache(maxsize=4, ttl_seconds=10)
+    lru.set("a", 1)
+    lru.set("b", 2, ttl_seconds=30)
+
+    clock.value += 9
+    assert lru.get("a") == 1
+    clock.value += 2
+    assert lru.get("a") is None
+    assert "a" not in lru and "b" in lru
+    assert lru.items() == [("b", 2)]
+    clock.value += 20
+    assert lru.get("b", "gone") == "gone"
+
+
+def test_eviction_order_follows_recency():
+    lru = LRUCache(maxsize=3)
+    for key in "abc":
+        lru.set(key, key)
+    lru.get("a")  # "b" is now least recently used
+    assert "b" in lru  # Membership does not refresh recency
+
+    lru.set("d", "d")
+    lru.set("e", "e")
+
+    assert [k for k, _ in lru.items()] == ["a", "d", "e"]
+    assert len(lru) == 3
+    assert lru.evictions == 2
+
+
+def test_stats():
+    lru = LRUCache(maxsize=2)
+    assert lru.stats()["hit_rate"] == 0.0
+
+    lru.set("a", 1)
+    lru.get("a")
+    lru.get("a")
+    lru.get("missing")
+    lru.set("b", 2)
+    lru.set("c", 3)
+
+    assert lru.stats() == {
+        "size": 2, "maxsize": 2, "hits": 2, "misses": 1, "evictions": 1, "hit_rate": round(2 / 3, 4),
+    }
+
+
+def test_warm_set_round_trip(tmp_path):
+    path = str(tmp_path / "warm.npz")
+    source = LRUCache(maxsize=10)
+    for i in range(5):
+        source.set(normalize_query(f"  Query {i} "), np.full(4, i, dtype=np.float32))
+
+    save_warm_set(source, path, "model-a", limit=3)
+    target = LRUCache(maxsize=10)
+    load_warm_set(target, path, "model-a")
+
+    assert [k for k, _ in target.items()] == ["query 2", "query 3", "query 4"]
+    np.testing.assert_array_equal(target.get("query 4"), np.full(4, 4, dtype=np.float32))
+
+
+def test_warm_set_from_another_model_is_ignored(tmp_path):
+    path = str(tmp_path / "warm.npz")
+    source = LRUCache()
+    source.set("query", np.ones(4, dtype=np.float32))
+    save_warm_set(source, path, "model-a", limit=10)
+
+    target = LRUCache()
+    load_warm_set(target, path, "model-b")
+
+    assert len(target) == 0
+
+
+def test_warm_set_missing_or_empty(tmp_path):
+    path = str(tmp_path / "warm.npz")
+    save_warm_set(LRUCache(), path, "model-a", limit=10)  # Nothing to save: no file
+
+    target = LRUCache()
+    load_warm_set(target, path, "model-a")
+
+    assert len(target) == 0
@@ -0,0 +1,155 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api, db
+
+
+def _history(user_id):
+    with db.connection() as conn:
+        return [row["asin"] for row in conn.execute(
+            "SELECT asin FROM purchase_history WHERE user_id = ? ORDER BY id", (user_id,)
+        )]
+
+
+def _cart(user_id):
+    with db.connection() as conn:
+        return [row["asin"] for row in conn.execute(
+            "SELECT asin FROM cart_items WHERE user_id = ? ORDER BY id", (user_id,)
+        )]
+
+
+def test_checkout_empty_cart(user_id):
+    assert db.checkout(user_id) == []
+    assert _history(user_id) == []
+
+
+def test_checkout_moves_cart_in_order(user_id):
+    db.add_to_cart_many(user_id, ["B001", "B002", "B001"])
+
+    purchased = db.checkout(user_id)
+
+    assert [row["asin"] for row in purchased] == ["B001", "B002", "B001"]
+    assert all(row["id"] and row["purchased_at"] for row in purchased)
+    assert _history(user_id) == ["B001", "B002", "B001"]
+    assert _cart(user_id) == []
+
+
+def test_double_checkout_is_rejected(user_id):
+    db.add_to_cart_many(user_id, ["B001", "B002"])
+
+    assert len(db.checkout(user_id)) == 2
+    assert db.checkout(user_id) == []  # /checkout turns this into 400 "Cart is empty"
+    assert _history(user_id) == ["B001", "B002"]
+
+
+def test_concurrent_checkouts_buy_the_cart_once(user_id):
+    db.add_to_cart_many(user_id, [f"B{i:03d}" for i in range(50)])
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(db.checkout(user_id))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(len(r) for r in results) == [0, 0, 0, 50]
+    assert len(_history(user_id)) == 50
+
+
+def test_checkout_leaves_other_carts_alone(user_id):
+    other = db.create_user_secure("other@example.com", "secret", "Standard Shopper")["id"]
+    db.add_to_cart_many(user_id, ["B001"])
+    db.add_to_cart_many(other, ["B002"])
+
+    db.checkout(user_id)
+
+    assert _cart(other) == ["B002"]
+    assert _history(other) == []
+
+
+def test_buy_items_totals(user_id):
+    db.buy_items(user_id, ["B001", "B002", "B001"])
+    db.buy_item(user_id, "B003")
+
+    assert _history(user_id) == ["B001", "B002", "B001", "B003"]
+    assert db.get_user_by_email("shopper@example.com")["history"] == ["B003", "B001", "B002", "B001"]
+    assert _cart(user_id) == []
+
+
+def test_add_to_cart_many_empty_list(user_id):
+    db.add_to_cart_many(user_id, [])
+    assert _cart(user_id) == []
+
+
+class _Catalog:
+    """Just enough of ContentEngine for the cart endpoints' ASIN validation."""
+
+    def __init__(self, asins):
+        self.asins = set(asins)
+
+    def has_asin(self, asin):
+        return asin in self.asins
+
+
+@pytest.fixture
+def client(user_id, monkeypatch):
+    monkeypatch.setattr(api, "content_engine", _Catalog(["B001", "B002"]))
+    return TestClient(api.app)
+
+
+@pytest.mark.parametrize("path", ["/add_to_cart_bulk", "/buy_items"])
+def test_bulk_with_unknown_asins_writes_nothing(client, user_id, path):
+    response = client.post(path, json={"email": "shopper@example.com", "asins": ["B001", "NOPE", "B002", "GONE"]})
+
+    assert response.status_code == 404
+    assert "NOPE" in response.json()["detail"] and "GONE" in response.json()["detail"]
+    assert _cart(user_id) == []
+    assert _history(user_id) == []
+
+
+def test_bulk_unknown_user(client):
+    response = client.post("/add_to_cart_bulk", json={"email": "nobody@example.com", "asins": ["B001"]})
+    assert response.status_code == 404
+
+
+def test_failed_connect_does_not_leak_pool_slots(tmp_path, monkeypatch):
+    pool = db.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    real_connect = pool._connect
+
+    def failing_connect():
+        raise db.sqlite3.OperationalError("unable to open database file")
+
+    monkeypatch.setattr(pool, "_connect", failing_connect)
+    for _ in range(3):
+        with pytest.raises(db.sqlite3.OperationalError):
+            pool.acquire()
+
+    monkeypatch.setattr(pool, "_connect", real_connect)
+    conn = pool.acquire()  # Would block forever if the failures had used up the slot
+    assert conn.execute("SELECT 1").fetchone()[0] == 1
+    pool.release(conn)
+    pool.close_all()
+
+
+def test_exhausted_pool_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(db.config, "DB_POOL_TIMEOUT_SECONDS", 0.05)
+    pool = db.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    held = pool.acquire()
+
+    with pytest.raises(db.PoolTimeout, match="1 pooled connections"):
+        pool.acquire()
+
+    pool.release(held)
+    assert pool.acquire() is held  # The slot is still usable once returned
+    pool.close_all()
+
+
+def test_exhausted_pool_answers_503(client, pool, monkeypatch):
+    monkeypatch.setattr(db.config, "DB_POOL_TIMEOUT_SECONDS", 0.05)
+    pool.close_all()
+    monkeypatch.setattr(pool, "size", 0)  # Every slot taken, none will be returned
+
+    response = client.post("/add_to_cart_bulk", json={"email": "shopper@example.com", "asins": ["B001"]})
+
+    assert response.status_code == 503
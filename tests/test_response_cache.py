@@ -0,0 +1,120 @@
+import asyncio
+import types
+
+import pytest
+
+from src import api, cache, response_cache
+from src.response_cache import ResponseCache, SharedCacheTier
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """One hand-driven clock behind both tiers (monotonic for the LRU, wall time for SQLite)."""
+    now = types.SimpleNamespace(value=1000.0)
+    fake_time = types.SimpleNamespace(monotonic=lambda: now.value, time=lambda: now.value)
+    monkeypatch.setattr(cache, "time", fake_time)
+    monkeypatch.setattr(response_cache, "time", fake_time)
+    return now
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two ResponseCaches over one shared SQLite file, as two uvicorn workers would have."""
+    path = str(tmp_path / "shared_cache.db")
+    caches = [ResponseCache(maxsize=16, ttl_seconds=60, shared_path=path) for _ in range(2)]
+    yield caches
+    for c in caches:
+        c.close()
+
+
+def _rows(tier: SharedCacheTier) -> int:
+    return tier._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+def test_shared_hit_is_promoted_to_the_local_tier(workers):
+    first, second = workers
+
+    async def run():
+        await first.set("key", {"results": [1, 2]})
+        return await second.get("key"), await second.get("key")
+
+    assert asyncio.run(run()) == ({"results": [1, 2]}, {"results": [1, 2]})
+    assert second.shared_hits == 1  # The second read was served locally
+    assert second.local.hits == 1 and "key" in second.local
+    assert second.stats()["hit_rate"] == 1.0
+
+
+def test_miss_in_both_tiers(workers):
+    assert asyncio.run(workers[0].get("missing")) is None
+    assert workers[0].misses == 1
+
+
+def test_ttl_expiry_in_both_tiers(workers, clock):
+    first, second = workers
+
+    async def run():
+        await first.set("key", "value")
+        await second.get("key")  # Now held by both local tiers and the shared tier
+        clock.value += 59
+        fresh = [await first.get("key"), await second.get("key")]
+        clock.value += 2
+        return fresh, [await first.get("key"), await second.get("key")]
+
+    fresh, expired = asyncio.run(run())
+
+    assert fresh == ["value", "value"]
+    assert expired == [None, None]
+    assert first.shared.get("key") is None
+    assert first.misses == 1 and second.misses == 1
+
+
+def test_expired_rows_are_purged_every_1000_writes(tmp_path, clock):
+    tier = SharedCacheTier(str(tmp_path / "shared_cache.db"), ttl_seconds=60)
+    tier.set("old", "value")
+    clock.value += 61
+
+    for i in range(998):
+        tier.set(f"key{i}", i)
+    assert _rows(tier) == 999  # Expired, but not purged yet
+
+    tier.set("key998", 998)  # The 1000th write
+    assert _rows(tier) == 999
+    assert tier._conn.execute("SELECT 1 FROM response_cache WHERE key = 'old'").fetchone() is None
+    tier.close()
+
+
+def test_expired_rows_are_purged_on_open(tmp_path, clock):
+    path = str(tmp_path / "shared_cache.db")
+    tier = SharedCacheTier(path, ttl_seconds=60)
+    tier.set("old", "value")
+    tier.close()
+    clock.value += 61
+
+    reopened = SharedCacheTier(path, ttl_seconds=60)
+    assert _rows(reopened) == 0
+    reopened.close()
+
+
+def test_keys_change_with_build_events_and_profile_version(monkeypatch):
+    monkeypatch.setattr(api, "content_engine", types.SimpleNamespace(manifest={"build_id": "build-a"}))
+    monkeypatch.setattr(api, "behavior_analyzer", types.SimpleNamespace(events_seen=0))
+    profile = types.SimpleNamespace(user_id=7, version=3, events=5)
+
+    def key(**overrides):
+        return api.response_cache_key("recommend", "B001", "Standard Shopper", profile=overrides.get("profile", profile))
+
+    base = key()
+    assert key() == base
+
+    monkeypatch.setattr(api.content_engine, "manifest", {"build_id": "build-b"})
+    assert key() != base
+    monkeypatch.setattr(api.content_engine, "manifest", {"build_id": "build-a"})
+
+    monkeypatch.setattr(api.behavior_analyzer, "events_seen", 1)
+    assert key() != base
+    monkeypatch.setattr(api.behavior_analyzer, "events_seen", 0)
+
+    assert key(profile=types.SimpleNamespace(user_id=7, version=4, events=6)) != base
+    assert key(profile=types.SimpleNamespace(user_id=8, version=3, events=5)) != base
+    # Profiles without events don't personalize, so they share the anonymous entry
+    assert key(profile=types.SimpleNamespace(user_id=7, version=0, events=0)) == key(profile=None)
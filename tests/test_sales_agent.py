@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.config import config
+from src.sales_agent import SalesAgent
+
+RULES = {"Standard Shopper": {"mean": 50.0, "max": 100.0, "max_suggested_price": 120.0}}
+CONTEXT = {"asin": "B000", "title": "Desk Lamp", "price": 30.0}
+BENCHMARK_RULES = {
+    "Budget Conscious": {"mean": 30.0, "max": 40.0, "max_suggested_price": 48.0},
+    "Standard Shopper": {"mean": 50.0, "max": 60.0, "max_suggested_price": 72.0},
+    "Premium Shopper": {"mean": 70.0, "max": 80.0, "max_suggested_price": 96.0},
+}
+RECOMMENDATIONS = [
+    {"asin": "B001", "title": "LED Desk Lamp", "price": 45.0, "final_score": 0.9},
+    {"asin": "B002", "title": "Lamp Shade", "price": 12.0, "final_score": 0.7},
+]
+
+
+def test_inline_pitch_without_llm_is_the_template_pitch(monkeypatch):
+    monkeypatch.setattr(config, "GROQ_API_KEY", "")
+    agent = SalesAgent(RULES)
+
+    pitch = agent.inline_pitch(CONTEXT, RECOMMENDATIONS, "Standard Shopper")
+
+    assert "Desk Lamp" in pitch and "LED Desk Lamp" in pitch
+    assert agent.inline_pitch(CONTEXT, [], "Standard Shopper")
+
+
+def test_inline_pitch_with_llm_is_only_the_cached_pitch(monkeypatch):
+    monkeypatch.setattr(config, "GROQ_API_KEY", "test-key")
+    agent = SalesAgent(RULES)
+
+    assert agent.inline_pitch(CONTEXT, RECOMMENDATIONS, "Standard Shopper") is None
+    agent.pitch_cache.set(agent.pitch_key("B000", ["B001", "B002"], "Standard Shopper"), "Great pick!")
+    assert agent.inline_pitch(CONTEXT, RECOMMENDATIONS, "Standard Shopper") == "Great pick!"
+
+
+def test_rerank_cap_is_the_larger_of_upsell_and_persona_caps(monkeypatch):
+    monkeypatch.setattr(config, "GROQ_API_KEY", "")
+    agent = SalesAgent(RULES)
+    candidates = pd.DataFrame({
+        "asin": ["B001", "B002", "B003"],
+        "price": [100.0, 140.0, 200.0],
+        "cost_price": [70.0, 98.0, 140.0],
+        "similarity_score": [0.9, 0.8, 0.7],
+    })
+    current_price = 150.0 / config.MAX_UPSELL_RATIO  # Upsell cap 150 > persona cap 120
+
+    cap = agent.effective_price_cap(current_price, "Standard Shopper")
+    ranked = agent.rerank(candidates, current_price, "Standard Shopper")
+
+    assert cap == 150.0
+    assert sorted(ranked["asin"]) == ["B001", "B002"]  # 140 is above the persona cap but kept
+    assert agent.effective_price_cap(1.0, "Standard Shopper") == 120.0
+
+
+def legacy_rerank(rules, candidates: pd.DataFrame, current_price: float, persona: str, limit: int = None):
+    """The pre-vectorization rerank, kept verbatim as the reference."""
+    scored = []
+    p_rules = rules.get(persona, rules.get("Standard Shopper"))
+    max_price_suggestion = p_rules['max_suggested_price']
+    global_cap = current_price * config.MAX_UPSELL_RATIO
+
+    for _, row in candidates.iterrows():
+        if row['price'] > max(global_cap, max_price_suggestion):
+            continue
+        margin = row['price'] - row['cost_price']
+        margin_pct = (margin / row['price']) * 100
+        norm_profit = min(margin_pct / 80.0, 1.0)
+        norm_sim = row['similarity_score']
+        final_score = (
+            (norm_sim * config.SIMILARITY_WEIGHT) +
+            (norm_profit * config.MARGIN_WEIGHT)
+        )
+        row['final_score'] = final_score
+        scored.append(row)
+
+    sorted_df = pd.DataFrame(scored).sort_values(by='final_score', ascending=False)
+    if limit:
+        return sorted_df.head(limit)
+    return sorted_df
+
+
+def make_candidates(n: int, rng) -> pd.DataFrame:
+    price = rng.uniform(5, 150, n).round(2)
+    return pd.DataFrame({
+        "asin": [f"B{i:09d}" for i in range(n)],
+        "title": [f"Product {i}" for i in range(n)],
+        "price": price,
+        # Varying margins so the profit term actually contributes to ordering
+        "cost_price": price * rng.uniform(0.2, 0.9, n),
+        "similarity_score": rng.uniform(0, 1, n),
+    })
+
+
+@pytest.mark.parametrize("persona", sorted(BENCHMARK_RULES))
+@pytest.mark.parametrize("limit", [None, 1, 3, 50])
+@pytest.mark.parametrize("n", [1, 20, 500])
+def test_rerank_matches_legacy_iterrows(n, limit, persona):
+    candidates = make_candidates(n, np.random.default_rng(n))
+    current_price = candidates["price"].mean()
+
+    old = legacy_rerank(BENCHMARK_RULES, candidates, current_price, persona, limit)
+    new = SalesAgent(BENCHMARK_RULES).rerank(candidates, current_price, persona, limit)
+
+    assert old["asin"].tolist() == new["asin"].tolist()
+    assert np.allclose(old["final_score"].astype(float), new["final_score"])
+
+
+@pytest.mark.parametrize("limit", [None, 3])
+def test_rerank_ties_at_the_cutoff_keep_candidate_order(limit):
+    # Same margin everywhere, so similarity alone decides; four rows tie at 0.5
+    candidates = pd.DataFrame({
+        "asin": [f"B{i:03d}" for i in range(6)],
+        "price": 50.0,
+        "cost_price": 25.0,
+        "similarity_score": [0.5, 0.1, 0.5, 0.9, 0.5, 0.5],
+    })
+
+    old = legacy_rerank(BENCHMARK_RULES, candidates, 50.0, "Standard Shopper", limit)
+    new = SalesAgent(BENCHMARK_RULES).rerank(candidates, 50.0, "Standard Shopper", limit)
+
+    # The legacy quicksort leaves tie order unspecified; scores must agree, and ties keep candidate order
+    assert np.allclose(old["final_score"].astype(float), new["final_score"])
+    expected = ["B003", "B000", "B002", "B004", "B005", "B001"]
+    assert new["asin"].tolist() == expected[:limit]
+
+
+@pytest.mark.parametrize("limit", [None, 3])
+def test_rerank_empty_candidates(limit):
+    candidates = make_candidates(0, np.random.default_rng(0))
+
+    ranked = SalesAgent(BENCHMARK_RULES).rerank(candidates, 50.0, "Standard Shopper", limit)
+
+    # The legacy version raised KeyError here: an empty DataFrame has no final_score to sort by
+    assert ranked.empty
+    assert list(ranked.columns) == list(candidates.columns) + ["final_score"]
+
+
+@pytest.mark.parametrize("limit", [None, 3])
+def test_rerank_fully_filtered_candidates(limit):
+    candidates = make_candidates(20, np.random.default_rng(0)).assign(price=1000.0, cost_price=500.0)
+
+    ranked = SalesAgent(BENCHMARK_RULES).rerank(candidates, 50.0, "Standard Shopper", limit)
+
+    assert ranked.empty  # Every price is above max(75 upsell cap, 72 persona cap)
+    assert list(ranked.columns) == list(candidates.columns) + ["final_score"]
@@ -0,0 +1,86 @@
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api
+from src.behavior_analyzer import BehaviorAnalyzer
+from src.config import config
+from src.content_engine import ContentEngine
+from src.response_cache import ResponseCache
+from src.sales_agent import SalesAgent
+
+RULES = {"Standard Shopper": {"mean": 50.0, "max": 100.0, "max_suggested_price": 120.0}}
+
+
+@pytest.fixture
+def client(build, monkeypatch):
+    """The API over a small lexical-only bundle (BM25 needs no embedding model)."""
+    build([f"A{i:04d}" for i in range(60)])
+    monkeypatch.setattr(config, "SEARCH_MODE", "lexical")
+    monkeypatch.setattr(config, "GROQ_API_KEY", "")
+    monkeypatch.setattr(api, "content_engine", ContentEngine())
+    monkeypatch.setattr(api, "sales_agent", SalesAgent(RULES))
+    monkeypatch.setattr(api, "behavior_analyzer", BehaviorAnalyzer())
+    monkeypatch.setattr(api, "response_cache", ResponseCache(shared_path=""))
+    return TestClient(api.app)
+
+
+def _search(client, **body):
+    return client.post("/search", json={"query": "product", "page_size": 25, **body})
+
+
+def _cursor(payload: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decoded(cursor: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+
+
+def test_cursor_pages_through_the_ranked_list(client):
+    first = _search(client).json()
+    second = _search(client, cursor=first["next_cursor"]).json()
+    third = _search(client, cursor=second["next_cursor"]).json()
+
+    asins = [r["asin"] for page in (first, second, third) for r in page["results"]]
+    assert first["total"] == 60
+    assert len(asins) == 60 and len(set(asins)) == 60
+    assert third["next_cursor"] is None
+
+
+def test_cursor_follows_normalized_query(client):
+    first = _search(client).json()
+    assert _search(client, query="  PRODUCT ", cursor=first["next_cursor"]).status_code == 200
+
+
+@pytest.mark.parametrize("changes", [
+    {"query": "electronics"},
+    {"min_price": 20},
+    {"user_persona": "Premium Shopper"},
+])
+def test_cursor_reused_with_a_different_search_is_rejected(client, changes):
+    first = _search(client).json()
+    response = _search(client, cursor=first["next_cursor"], **changes)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", _cursor({"k": "x", "o": 1}), _cursor(["k", 1]), "e30"])
+def test_malformed_cursor_is_rejected(client, cursor):
+    assert _search(client, cursor=cursor).status_code == 400
+
+
+def test_cursor_pointing_at_another_cache_entry_is_rejected(client):
+    cursor = _decoded(_search(client).json()["next_cursor"])
+    api.response_cache.local.set("recommend-entry", {"context_product": {}, "recommendations": []})
+    other_search = _decoded(_search(client, query="electronics").json()["next_cursor"])
+
+    for list_key in ("recommend-entry", other_search["k"]):
+        response = _search(client, cursor=_cursor({**cursor, "k": list_key}))
+        assert response.status_code == 400
+
+
+def test_cursor_with_foreign_namespace_is_rejected(client):
+    cursor = _decoded(_search(client).json()["next_cursor"])
+    assert _search(client, cursor=_cursor({**cursor, "n": "recommend"})).status_code == 400
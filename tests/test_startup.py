@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src import api, executors
+from src.behavior_analyzer import BehaviorAnalyzer
+from src.config import config
+from src.startup import StartupTracker
+
+
+@pytest.fixture
+def gate():
+    return threading.Event()
+
+
+@pytest.fixture
+def app_client(pool, build, gate, monkeypatch):
+    """The API with a real startup; the persona-rules stage waits on `gate`."""
+    build([f"A{i:04d}" for i in range(50)])
+    monkeypatch.setattr(config, "PRELOAD_MODEL", False)
+    monkeypatch.setattr(config, "RESPONSE_CACHE_SHARED_PATH", "")
+    for name in ("warmup_task", "behavior_analyzer", "content_engine", "sales_agent", "profile_store", "response_cache"):
+        monkeypatch.setattr(api, name, None)
+    monkeypatch.setattr(api, "startup", StartupTracker())
+    monkeypatch.setattr(executors, "shutdown", lambda: None)  # The pools are shared with the other tests
+
+    def gated_analyzer():
+        assert gate.wait(10), "test never opened the gate"
+        return BehaviorAnalyzer()
+
+    monkeypatch.setattr(api, "_load_behavior_analyzer", gated_analyzer)
+    with TestClient(api.app) as client:
+        yield client
+        gate.set()  # Let a still-running warmup finish before shutdown
+
+
+def _wait_for(client, status_code, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = client.get("/readyz")
+        if response.status_code == status_code:
+            return response
+        time.sleep(0.02)
+    pytest.fail(f"/readyz never answered {status_code}")
+
+
+def test_readyz_is_503_during_warmup_and_healthz_is_200(app_client):
+    response = app_client.get("/readyz")
+
+    assert response.status_code == 503
+    assert response.json()["ready"] is False and response.json()["error"] is None
+    assert "database" in response.json()["stages"]
+    assert app_client.get("/healthz").status_code == 200
+    assert app_client.get("/stats").status_code == 503
+
+
+def test_readyz_is_200_with_stage_timings_once_ready(app_client, gate):
+    gate.set()
+
+    report = _wait_for(app_client, 200).json()
+
+    assert report["ready"] is True and report["ready_after_seconds"] is not None
+    assert set(report["stages"]) == {"database", "persona_rules", "content_engine", "sales_agent"}
+    assert all(seconds >= 0 for seconds in report["stages"].values())
+    assert report["model_loaded"] is False  # PRELOAD_MODEL is off
+    assert app_client.get("/healthz").status_code == 200
+
+
+def test_failed_warmup_keeps_readyz_503_with_the_error(app_client, gate, monkeypatch):
+    def broken_engine():
+        raise FileNotFoundError("no artifact bundle")
+
+    monkeypatch.setattr(api, "_load_content_engine", broken_engine)
+    gate.set()
+    deadline = time.monotonic() + 10
+    while api.startup.error is None and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    response = app_client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["error"] == "FileNotFoundError: no artifact bundle"
+    assert app_client.get("/healthz").status_code == 200
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from src.config import config
+from src.content_engine import ContentEngine
+
+# Minimum recall@10 against exact search, by index type (int8 codes included)
+RECALL_FLOOR = {"flat": 0.98, "ivf_flat": 0.95, "ivf_pq": 0.8, "hnsw": 0.95}
+# With RESCORE_FACTOR, only the candidate fetch is approximate
+RESCORED_FLOOR = 0.95
+
+# ivf_pq stores PQ codes whatever VECTOR_DTYPE says, so it is built once
+INDEX_CONFIGS = [
+    (index_type, vector_dtype)
+    for index_type in ("flat", "ivf_flat", "hnsw")
+    for vector_dtype in ("float32", "float16", "int8")
+] + [("ivf_pq", "float32")]
+
+
+def _queries(n=50):
+    queries = np.random.default_rng(1).standard_normal((n, 16)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _recall(engine, queries, k=10):
+    """Mean recall@k of engine._search, against brute force on the float32 embeddings."""
+    truth = np.argsort(-(queries @ np.asarray(engine.embeddings, dtype=np.float32).T), axis=1)[:, :k]
+    _, positions = engine._search(queries, k)
+    return np.mean([len(set(t) & set(p)) / k for t, p in zip(truth.tolist(), positions.tolist())])
+
+
+@pytest.mark.parametrize("index_type,vector_dtype", INDEX_CONFIGS)
+def test_recall_against_exact_search(build, monkeypatch, index_type, vector_dtype):
+    monkeypatch.setattr(config, "INDEX_TYPE", index_type)
+    monkeypatch.setattr(config, "VECTOR_DTYPE", vector_dtype)
+    monkeypatch.setattr(config, "PQ_M", 8)  # Must divide DIM
+    build([f"A{i:04d}" for i in range(1000)])
+    engine = ContentEngine()
+    queries = _queries()
+
+    monkeypatch.setattr(config, "RESCORE_FACTOR", 0)
+    recall = _recall(engine, queries)
+    monkeypatch.setattr(config, "RESCORE_FACTOR", 4)
+    rescored = _recall(engine, queries)
+
+    assert engine.manifest["index_type"] == index_type
+    assert engine.manifest["vector_dtype"] == vector_dtype
+    assert recall >= RECALL_FLOOR[index_type]
+    if index_type == "flat" and vector_dtype == "float32":
+        assert recall == 1.0
+    assert rescored >= max(recall, RESCORED_FLOOR)
+
+    # Rescored distances are exact float32 inner products, in descending order
+    distances, positions = engine._search(queries, 10)
+    exact = np.einsum("qd,qkd->qk", queries, np.asarray(engine.embeddings, dtype=np.float32)[positions])
+    np.testing.assert_allclose(distances, exact, rtol=1e-5, atol=1e-6)
+    assert (np.diff(distances, axis=1) <= 0).all()